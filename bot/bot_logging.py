@@ -0,0 +1,127 @@
+"""Module configuring the logging of the bot.
+
+Records are put on a queue by a `QueueHandler` on the event loop thread and are
+formatted as JSON and written by a `QueueListener` on a separate thread, so a slow
+stdout never blocks the bot."""
+
+import copy
+import json
+import logging
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# Attributes present on every `LogRecord`; everything else came from `extra`.
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects.
+
+    Values passed with `extra` (e.g. `event`, `guild_id`, `embed_id`, `duration_ms`)
+    are written as top-level keys.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key != "throttle":
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RepeatFilter(logging.Filter):  # pylint: disable=too-few-public-methods
+    """
+    Lets a repetitive record through at most once per `interval` seconds.
+
+    Only records logged with `extra={"throttle": True}` are limited. Records are
+    grouped by logger and message template, and the first record let through after
+    a quiet period carries the number of suppressed ones in `suppressed`.
+
+    Args:
+        interval (float): Minimum time between two records of the same kind.
+    """
+
+    def __init__(self, interval: float):
+        super().__init__()
+        self.interval = interval
+        self.last_emitted: dict[tuple[str, str], float] = {}
+        self.suppressed: dict[tuple[str, str], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "throttle", False):
+            return True
+        key = (record.name, str(record.msg))
+        now = time.monotonic()
+        if now - self.last_emitted.get(key, -self.interval) < self.interval:
+            self.suppressed[key] = self.suppressed.get(key, 0) + 1
+            return False
+        self.last_emitted[key] = now
+        suppressed = self.suppressed.pop(key, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """A `QueueHandler` that leaves formatting to the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return copy.copy(record)
+
+
+def parse_levels(levels: str) -> dict[str, str]:
+    """Parses per-module levels written as `logger:LEVEL, other.logger:LEVEL`."""
+    parsed = {}
+    for item in levels.split(","):
+        name, _, level = item.strip().partition(":")
+        if name and level:
+            parsed[name.strip()] = level.strip().upper()
+    return parsed
+
+
+def setup_logging(
+    level: str = "INFO", module_levels: str = "", repeat_interval: float = 60.0
+) -> QueueListener:
+    """Routes all logging through a queue to a JSON stdout handler on a
+    background thread.
+
+    Args:
+        level (str, optional): The root logging level. Default is "INFO".
+        module_levels (str, optional): Per-module levels, see `parse_levels`.
+        repeat_interval (float, optional): Minimum time in seconds between two
+        throttled records of the same kind. Default is 60.
+    Returns:
+        QueueListener: The started listener; stop it to flush pending records.
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(RepeatFilter(repeat_interval))
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+    for name, module_level in parse_levels(module_levels).items():
+        logging.getLogger(name).setLevel(module_level)
+    listener.start()
+    return listener
+
+
+def stop_logging(listener: Optional[QueueListener]) -> None:
+    """Stops the listener, writing out all records still in the queue."""
+    if listener is not None:
+        listener.stop()
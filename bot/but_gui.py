@@ -2,63 +2,40 @@
 Creator."""
 
 import datetime
+import json
+import logging
 from typing import List, Optional
 from contextlib import suppress
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from bot.config_creator import (
     save_to_config_ram,
-    read_from_config,
-    read_field_values_from_config,
+    read_templates_from_config_ram,
     reset_config_ram,
+    guild_config,
     save_values_from_ram_to_memory,
+    use_guild_config,
+    read_setting,
 )
+from bot.creator_sessions import SESSIONS
 from bot.embed_methods import EmbedEditingMethods
-from bot.message_syntax_functions import convert_string
+from bot.embed_updates import (
+    deploy_concurrency,
+    edit_group,
+    fetch_embed_group,
+    gather_limited,
+    start_auto_update,
+)
+from bot.help_text import help_fields
+from bot.interaction_deadline import InteractionDeadline, record_response
+from bot.render import DESCRIPTION_LIMIT, FIELD_VALUE_LIMIT
+from bot.scheduler import SCHEDULER
+from bot.syntax_explain import explain_for_guild, explanation_message
 
+logger = logging.getLogger(__name__)
 
-@tasks.loop(seconds=15)
-async def auto_update(
-    last_message: discord.message.Message, embed: discord.Embed, ctx: commands.Context
-):
-    """
-    Periodically updates the last sent embed. Looks for changes in embed description.
-
-    Loads the last message sent and its description.
-    Re-converts the text of its description to match the current state,
-    finally updates the message.
-
-    Args:
-        last_message (`discord.message.Message`): last sent message by bot,
-        created from the `EmbedCreator`.
-        embed (`discord.Embed`): An object from the `Discord.Embed` class that
-        will be used as the main embed.
-        ctx (discord.ext.commands.context.Context): necessary parameter when
-        accesing discoFrd server data; used by discord.ext.commands.
-    """
-    now = datetime.datetime.now()
-    print(f'Auto update started. {now.strftime("%d.%m.%Y - %H:%M:%S")}')
-    embed_description = read_from_config("embed_description")
-    if embed.fields is not None:
-        num_of_fields = len(embed.fields)
-        new_descriptions = []
-        old_descriptions = read_field_values_from_config(embed.fields)
-        for description in old_descriptions:
-            new_description = convert_string(ctx, description)
-            new_descriptions.append(new_description)
-        for i in range(0, num_of_fields):
-            embed.set_field_at(
-                i,
-                name=embed.fields[i].name,
-                value=new_descriptions[i],
-                inline=embed.fields[i].inline,
-            )
-    output_string = convert_string(ctx, embed_description)
-    embed.description = output_string
-    embed.set_footer(
-        text=f"""Last auto update: {now.strftime('%d.%m.%Y - %H:%M:%S')}"""
-    )
-    await last_message.edit(embed=embed)
+# Rough size of the view, its items and the editing helpers of a session.
+SESSION_OVERHEAD = 4096
 
 
 class FieldToRemove(discord.ui.View):
@@ -87,7 +64,7 @@ class FieldToRemove(discord.ui.View):
         self.children[0].placeholder = placeholder
         self.children[0].max_values = max_values
         self.children[0].options = options
-        self.values = Optional[List[str]]
+        self.values: Optional[List[str]] = None
         self.ephemeral = ephemeral
 
     @discord.ui.select()
@@ -96,6 +73,7 @@ class FieldToRemove(discord.ui.View):
     ):
         """Creates select object that inherits it's atributes from the class."""
         await interaction.response.defer(ephemeral=self.ephemeral)
+        record_response(interaction, "embed_creator.select")
         if self.ephemeral:
             await interaction.delete_original_response()
         else:
@@ -144,6 +122,7 @@ class ChannelSelectMenu(discord.ui.View):
     ):
         """Creates select object that inherits it's atributes from the class."""
         await interaction.response.defer(ephemeral=self.ephemeral)
+        record_response(interaction, "embed_creator.select_channels")
         if self.ephemeral:
             await interaction.delete_original_response()
         else:
@@ -159,14 +138,33 @@ class EmbedSurvey(discord.ui.Modal):
 
     Args:
         title (str): The title of the modal.
+        defer_on_submit (bool, optional): Whether the submission is deferred
+        right away. Otherwise it is left to `deadline`, to be answered with the
+        updated preview.
+        command (str, optional): The name the time to the first response of
+        the submission is recorded under.
     """
 
-    def __init__(self, title: str = "Default Title"):
+    def __init__(
+        self,
+        title: str = "Default Title",
+        defer_on_submit: bool = True,
+        command: str = "embed_creator.form",
+    ):
         self.title = title
+        self.submitted = False
+        self.defer_on_submit = defer_on_submit
+        self.command = command
+        self.deadline: Optional[InteractionDeadline] = None
         super().__init__()
 
     async def on_submit(self, interaction: discord.Interaction, /):
-        await interaction.response.defer(ephemeral=True)
+        self.deadline = InteractionDeadline(interaction, self.command)
+        if self.defer_on_submit:
+            await self.deadline.defer()
+        else:
+            self.deadline.arm()
+        self.submitted = True
         self.stop()
 
 
@@ -214,6 +212,14 @@ class EditSelectMenu(discord.ui.Select):
                 discord.SelectOption(
                     label="Color", description="Set a color for the embed"
                 ),
+                discord.SelectOption(
+                    label="Load Template",
+                    description="Set the description to a template from the library",
+                ),
+                discord.SelectOption(
+                    label="Save Template",
+                    description="Save a template to the library",
+                ),
             ],
         )
         self.embed, self.ctx, self.update_flag = new_embed, ctx, update_flag
@@ -227,28 +233,50 @@ class EditSelectMenu(discord.ui.Select):
             "Thumbnail": "edit_thumbnail",
             "Image": "edit_image",
             "Color": "edit_color",
+            "Save Template": "save_template",
         }
         selected_option = self.values[0]
 
-        embed_survey = EmbedSurvey()
-        select = FieldToRemove(
-            placeholder="Select a field to remove...",
-            options=[],
-            max_values=1,
-            ephemeral=True,
-        )
-        creator_methods = EmbedEditingMethods(
-            self.embed, self.ctx, embed_survey, self.update_flag
-        )
+        # A modal or select cannot be shown again once it has been closed, so
+        # only they are created per click; the editing methods live as long as
+        # the session.
+        creator_methods = self.view.creator_methods
+        select = None
+        if selected_option in ("Remove Field", "Load Template"):
+            select = FieldToRemove(
+                placeholder="Select a field to remove...",
+                options=[],
+                max_values=1,
+                ephemeral=True,
+            )
+            self.view.pending = select
+        else:
+            creator_methods.embed_survey = self.view.pending = EmbedSurvey(
+                defer_on_submit=False,
+                command=f"embed_creator.{options.get(selected_option, 'form')}",
+            )
         if selected_option == "Remove Field":
             await creator_methods.remove_field(interaction, select)
-            await interaction.message.edit(embed=self.embed)
+            if not self.view.is_finished():
+                await interaction.message.edit(embed=self.embed)
+        elif selected_option == "Load Template":
+            await creator_methods.load_template(interaction, select)
+            if not self.view.is_finished():
+                await interaction.message.edit(embed=self.embed)
         elif selected_option == "Add Field" and len(self.embed.fields) >= 5:
             await creator_methods.add_field(interaction)
             await interaction.message.edit(embed=self.embed)
         elif selected_option in options:
             await getattr(creator_methods, options[selected_option])(interaction)
-            if selected_option != "Remove Field" or len(self.embed.fields) < 5:
+            # The submitted modal is answered with the updated preview.
+            deadline = creator_methods.embed_survey.deadline
+            if self.view.is_finished():
+                if deadline is not None:
+                    await deadline.defer()
+                return
+            if deadline is not None:
+                await deadline.edit(embed=self.embed)
+            elif selected_option != "Remove Field" or len(self.embed.fields) < 5:
                 await interaction.edit_original_response(embed=self.embed)
 
 
@@ -271,31 +299,170 @@ class SendButton(discord.ui.Button):
 
     async def callback(self, interaction: discord.Interaction):
         channel_select_menu = ChannelSelectMenu(
-            "Select a channel to send this embed...", True, 1
+            "Select channels to send this embed...", True, 25
         )
         await interaction.response.send_message(
             view=channel_select_menu, ephemeral=True
         )
+        record_response(interaction, "embed_creator.send")
         await channel_select_menu.wait()
-        if channel_select_menu.values:
-            if not isinstance(
-                channel_select_menu.values[0],
+        channels = [
+            channel
+            for channel in channel_select_menu.values or []
+            if channel is not None
+            and not isinstance(
+                channel,
                 (discord.StageChannel, discord.ForumChannel, discord.CategoryChannel),
-            ):
-                embed_message = await channel_select_menu.values[0].send(
-                    embed=self.embed
-                )
-                embed_message_id = embed_message.id
-                embed_channel_id = channel_select_menu.values[0].id
-                save_to_config_ram(
-                    embed_channel_id=embed_channel_id, embed_message_id=embed_message_id
+            )
+        ]
+        if not channels:
+            return
+        # The templates do not depend on the channel, so every channel gets
+        # the embed rendered in the preview.
+        results = await gather_limited(
+            (channel.send(embed=self.embed) for channel in channels),
+            deploy_concurrency(),
+        )
+        messages = []
+        for channel, result in zip(channels, results):
+            if isinstance(result, Exception):
+                logger.warning(
+                    "Sending the embed to channel %s failed: %s",
+                    channel.id,
+                    result,
+                    extra={"event": "embed_group"},
                 )
-                await interaction.message.delete()  # type: ignore
-                save_values_from_ram_to_memory()
-                if auto_update.is_running():
-                    auto_update.restart(embed_message, self.embed, self.ctx)
-                else:
-                    auto_update.start(embed_message, self.embed, self.ctx)
+            else:
+                messages.append(result)
+        if not messages:
+            return
+        embed_message, group = messages[0], messages[1:]
+        self.view.stop()
+        save_to_config_ram(
+            embed_channel_id=embed_message.channel.id,
+            embed_message_id=embed_message.id,
+            embed_group=",".join(f"{m.channel.id}:{m.id}" for m in group) or "None",
+        )
+        await interaction.message.delete()  # type: ignore
+        save_values_from_ram_to_memory()
+        start_auto_update(embed_message, self.embed, self.ctx, group)
+
+
+def parse_schedule_time(text: str) -> Optional[float]:
+    """Parses a `YYYY-MM-DD HH:MM` local time into a Unix time.
+
+    Returns:
+        Optional[float]: The Unix time, or `None` if the text is empty.
+
+    Raises:
+        ValueError: If the text is not a valid time.
+    """
+    if not text.strip():
+        return None
+    parsed = datetime.datetime.strptime(text.strip(), "%Y-%m-%d %H:%M")
+    return parsed.timestamp()
+
+
+class ScheduleButton(discord.ui.Button):
+    """
+    Subclass of the `discord.ui.Button` class.
+    Used for creating a clickable button for publishing embed at a later time.
+
+    The templates are saved with the job and rendered when the embed is published.
+    Scheduled embeds are not auto updated.
+
+    Args:
+        new_embed (`discord.Embed`): An object from the `Discord.Embed` class that
+        will be used as the main embed.
+        ctx (`discord.ext.commands.Context`): necessary parameter when accesing
+        some discord server data. Used by internal methods.
+    """
+
+    def __init__(self, new_embed: discord.Embed, ctx: commands.Context):
+        self.embed = new_embed
+        self.ctx = ctx
+        super().__init__(label="Schedule Embed", style=discord.ButtonStyle.grey)
+
+    async def callback(self, interaction: discord.Interaction):
+        embed_survey = EmbedSurvey(
+            "Schedule Embed", command="embed_creator.schedule_form"
+        )
+        embed_survey.add_item(
+            discord.ui.TextInput(
+                label="Publish at",
+                placeholder="YYYY-MM-DD HH:MM",
+                max_length=16,
+            )
+        )
+        embed_survey.add_item(
+            discord.ui.TextInput(
+                label="Expire at",
+                placeholder="YYYY-MM-DD HH:MM (leave empty to keep the embed)",
+                max_length=16,
+                required=False,
+            )
+        )
+        embed_survey.add_item(
+            discord.ui.TextInput(
+                label="On expiry",
+                default="delete",
+                placeholder="delete or archive",
+                max_length=7,
+                required=False,
+            )
+        )
+        self.view.pending = embed_survey
+        await interaction.response.send_modal(embed_survey)
+        record_response(interaction, "embed_creator.schedule")
+        await embed_survey.wait()
+        if not embed_survey.submitted:
+            return
+        on_expiry = str(embed_survey.children[2]).strip().lower() or "delete"
+        try:
+            publish_at = parse_schedule_time(str(embed_survey.children[0]))
+            expire_at = parse_schedule_time(str(embed_survey.children[1]))
+        except ValueError:
+            await interaction.followup.send(
+                "Times must be written as `YYYY-MM-DD HH:MM`.", ephemeral=True
+            )
+            return
+        if publish_at is None or (expire_at is not None and expire_at <= publish_at):
+            await interaction.followup.send(
+                "The embed must expire after it is published.", ephemeral=True
+            )
+            return
+        if on_expiry not in ("delete", "archive"):
+            await interaction.followup.send(
+                "On expiry must be `delete` or `archive`.", ephemeral=True
+            )
+            return
+        channel_select_menu = ChannelSelectMenu(
+            "Select a channel to publish this embed in...", True, 1
+        )
+        await interaction.followup.send(view=channel_select_menu, ephemeral=True)
+        await channel_select_menu.wait()
+        if not channel_select_menu.values:
+            return
+        description, field_values = read_templates_from_config_ram(self.embed.fields)
+        job = SCHEDULER.add(
+            publish_at,
+            "publish",
+            channel_select_menu.values[0].guild_id,
+            channel_id=channel_select_menu.values[0].id,
+            embed=self.embed.to_dict(),
+            description=description,
+            field_values=field_values,
+            expire_at=expire_at,
+            on_expiry=on_expiry,
+        )
+        await interaction.followup.send(
+            f"Embed scheduled for <t:{int(publish_at)}:f> "
+            f"in {channel_select_menu.values[0].mention} (job {job.job_id}).",
+            ephemeral=True,
+        )
+        self.view.stop()
+        await interaction.message.delete()  # type: ignore
+        reset_config_ram()
 
 
 class UpdateButton(discord.ui.Button):
@@ -324,10 +491,12 @@ class UpdateButton(discord.ui.Button):
         super().__init__(label="Update Embed", style=discord.ButtonStyle.green)
 
     async def callback(self, interaction: discord.Interaction):
-        embed_message = await self.last_message.edit(embed=self.embed)
+        group = await fetch_embed_group(self.ctx.bot)
+        embed_message = await edit_group((self.last_message, *group), self.embed)
+        self.view.stop()
         await interaction.message.delete()  # type: ignore
         save_values_from_ram_to_memory()
-        auto_update.restart(embed_message, self.embed, self.ctx)
+        start_auto_update(embed_message, self.embed, self.ctx, group)
 
 
 class ResetButton(discord.ui.Button):
@@ -352,6 +521,39 @@ class ResetButton(discord.ui.Button):
         creator_methods.get_default_embed()
         reset_config_ram()
         await interaction.response.edit_message(embed=self.embed)
+        record_response(interaction, "embed_creator.reset")
+
+
+class ExplainButton(discord.ui.Button):
+    """
+    Subclass of the `discord.ui.Button` class.
+    Used for creating a clickable button explaining how the templates of the embed
+    are rendered, like `/syntax_explain`.
+
+    Args:
+        new_embed (`discord.Embed`): An object from the `Discord.Embed` class that
+        will be used as the main embed.
+        ctx (`discord.ext.commands.Context`): necessary parameter when accesing
+        some discord server data. Used by internal methods.
+    """
+
+    def __init__(self, new_embed: discord.Embed, ctx: commands.Context):
+        self.embed = new_embed
+        self.ctx = ctx
+        super().__init__(label="Explain Syntax", style=discord.ButtonStyle.grey)
+
+    async def callback(self, interaction: discord.Interaction):
+        description, field_values = read_templates_from_config_ram(self.embed.fields)
+        parts = [("description", description, DESCRIPTION_LIMIT)]
+        parts.extend(
+            (f"field {field.name}", template, FIELD_VALUE_LIMIT)
+            for field, template in zip(self.embed.fields, field_values)
+        )
+        explanation = explain_for_guild(self.ctx.guild, parts)
+        await interaction.response.send_message(
+            ephemeral=True, **explanation_message(explanation)
+        )
+        record_response(interaction, "embed_creator.explain")
 
 
 class CancelButton(discord.ui.Button):
@@ -372,6 +574,7 @@ class CancelButton(discord.ui.Button):
         super().__init__(label="Cancel Embed", style=discord.ButtonStyle.red)
 
     async def callback(self, interaction: discord.Interaction):
+        self.view.stop()
         await interaction.message.delete()  # type: ignore
         reset_config_ram()
 
@@ -388,7 +591,6 @@ class HelpSelect(discord.ui.Select):
 
     def __init__(self, help_embed: discord.Embed):
         self.help_embed = help_embed
-        self.flag: bool = False
 
         options = [
             discord.SelectOption(
@@ -405,74 +607,12 @@ class HelpSelect(discord.ui.Select):
         )
 
     async def callback(self, interaction: discord.Interaction):
-        selected_option = self.values[0]
-
-        if selected_option == "Commands":
-            content = """
-            \n
-            :small_orange_diamond:`!help | /help` - Info about the bot.
-
-            :small_orange_diamond:`!embed_creator | /embed_creator` - Embed Creator
-            (A tool for dynamic embed building).
-
-            :small_orange_diamond:`!embed_update | /embed_update` -
-            opens Embed Creator menu and lets you edit last send embed.
-
-            *For more in-depth information go to:
-            https://github.com/KNR-PW/discord-bot*
-            """
-            self.help_embed.add_field(name="Discord Commands", value=content)
-
-        else:
-            syntax1 = """
-            \n
-            The bot can convert relevant commands in text into valuable information
-            when you invoke `/embed_creator` or `!embed_creator` discord commands and
-            try to edit either embed description or add and edit a text field.
-            When typing the message, commands are recognized inside curly brackets `{}`.
-
-            :small_orange_diamond:`{list_members [...]}` -
-            Returns a list of members who have required roles.
-            In addition to roles, the text can include
-            the logical operators `and`/`or` and `not`.
-            """
-
-            syntax2 = """
-            :small_orange_diamond:`{count_members [...]}` - Works like list_members,
-            but instead of returning names, it returns a number.
-
-            :small_orange_diamond:`{member [...]}` - Returns **@Name**.
-
-            :small_orange_diamond:`{role [...]}` - Returns a single **@Role**.
-
-            :small_orange_diamond:`{text_channel [...]}` - Returns **#TextChannel**.
-
-            :small_orange_diamond:`{voice_channel [...]}` - Returns **@VoiceChannel**.
-
-            **In case of an incorrect argument name in the text, a missing argument,
-            or an argument that does not exist, the bot will return `[None]`**.
-
-            *For more in-depth information go to:
-            https://github.com/KNR-PW/discord-bot*
-
-            """
-            self.help_embed.add_field(name="Message Syntax", value=syntax1)
-            self.help_embed.add_field(name="** **", value=syntax2, inline=False)
-        if self.flag is False:
-            self.flag = True  # First time choosing option
-        else:
-            if len(self.help_embed.fields) == 2:
-                self.help_embed.remove_field(index=0)  # Clicking Twice Commands
-            elif len(self.help_embed.fields) == 3:
-                if self.help_embed.fields[0].name == "Message Syntax":
-                    self.help_embed.remove_field(index=0)
-                    self.help_embed.remove_field(index=0)
-                else:
-                    self.help_embed.remove_field(index=0)
-            else:  # Clicking Twice Message Syntax
-                self.help_embed.remove_field(index=0)
-                self.help_embed.remove_field(index=0)
+        # Only the selected section is shown, replacing the previous one.
+        self.help_embed.clear_fields()
+        for name, value in help_fields(self.values[0]):
+            self.help_embed.add_field(name=name, value=value, inline=False)
         await interaction.response.edit_message(embed=self.help_embed)
+        record_response(interaction, "help.select")
 
 
 class HelpMenu(discord.ui.View):
@@ -497,6 +637,10 @@ class EmbedCreator(discord.ui.View):
     It is intended to be used as a base class for creating a panel that allows users
     to create embeds in a specified Discord TextChannel.
 
+    Every panel is a session in `SESSIONS`. A session left idle for
+    `creator_session_timeout` seconds, or evicted to keep the number and memory
+    of sessions within their limits, is closed and its preview deleted.
+
     Args:
         new_embed (`discord.Embed`): An object from the `Discord.Embed` class that
         will be used as the main embed.
@@ -519,11 +663,81 @@ class EmbedCreator(discord.ui.View):
         self.ctx = ctx
         self.last_message = last_message if last_message is not None else None
         self.update_flag = update_flag if update_flag is not False else False
-        super().__init__()
+        self.message: Optional[discord.message.Message] = None
+        self.pending: Optional[discord.ui.View | discord.ui.Modal] = None
+        self.creator_methods = EmbedEditingMethods(
+            self.embed, self.ctx, update_flag=self.update_flag
+        )
+        super().__init__(timeout=float(read_setting("creator_session_timeout")))
         self.add_item(EditSelectMenu(self.embed, self.ctx, self.update_flag))
         if update_flag is False:
             self.add_item(SendButton(self.embed, self.ctx))
+            self.add_item(ScheduleButton(self.embed, self.ctx))
         else:
             self.add_item(UpdateButton(self.embed, self.ctx, self.last_message))
         self.add_item(ResetButton(self.embed, self.ctx))
+        self.add_item(ExplainButton(self.embed, self.ctx))
         self.add_item(CancelButton(self.embed, self.ctx))
+
+    async def interaction_check(self, _: discord.Interaction, /) -> bool:
+        SESSIONS.touch(self)
+        if self.ctx.guild:
+            use_guild_config(self.ctx.guild.id)
+        return True
+
+    def memory_usage(self) -> int:
+        """Returns the estimated number of bytes held by the session, dominated
+        by the text of the embed."""
+        return len(json.dumps(self.embed.to_dict())) + SESSION_OVERHEAD
+
+    def stop(self) -> None:
+        SESSIONS.discard(self)
+        super().stop()  # pylint: disable=no-member
+
+    async def close(self) -> None:
+        """Ends the session: releases a modal or select waiting for input,
+        deletes the preview and frees the draft if no other session is open."""
+        self.stop()
+        if self.pending is not None:
+            self.pending.stop()
+        self.clear_items()
+        if self.message is not None:
+            with suppress(discord.HTTPException):
+                await self.message.delete()
+        guild = self.ctx.guild
+        if guild is not None and not any(
+            isinstance(session, EmbedCreator) for session in SESSIONS.sessions(guild.id)
+        ):
+            with guild_config(guild.id):
+                reset_config_ram()
+
+    async def on_timeout(self) -> None:
+        await self.close()
+
+
+async def open_creator(
+    ctx: commands.Context,
+    new_embed: discord.Embed,
+    last_message: Optional[discord.message.Message] = None,
+    update_flag: bool = False,
+) -> EmbedCreator:
+    """
+    Sends the preview of an embed with the Embed Creator panel and registers
+    the session.
+
+    Args:
+        ctx (`discord.ext.commands.Context`): necessary parameter when accesing
+        some discord server data. Used by internal methods.
+        new_embed (`discord.Embed`): The embed to edit.
+        last_message (`discord.message.Message`, optional): The message to update
+        instead of sending a new one.
+        update_flag (`bool`, optional): Whether the last message is updated.
+    Returns:
+        EmbedCreator: The panel.
+    """
+    view = EmbedCreator(new_embed, ctx, last_message, update_flag)
+    view.message = await ctx.send(
+        content="**Preview of the embed:**", view=view, embed=new_embed
+    )
+    await SESSIONS.add(view, ctx.guild.id if ctx.guild else 0)
+    return view
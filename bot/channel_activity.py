@@ -0,0 +1,307 @@
+"""Module keeping rolling message statistics of text channels.
+
+Every channel has three fixed-size rings: messages per minute for the last hour,
+messages and posters per hour for the last day, and messages and posters per day
+for the last week. Posters are counted approximately with HyperLogLog sketches,
+so the memory of a channel does not depend on its traffic. A ring slot stores the
+minute, hour or day it belongs to and is reset when it is reused, so nothing has to
+be expired in the background.
+
+Checkpoints store the rings as little-endian fixed-width integers, with the
+typecodes of the stamps and counts in the header, so they load on any platform."""
+
+import logging
+import math
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Iterable, Optional
+import discord
+from discord.ext import tasks
+from bot.guild_index import mark_changed
+
+logger = logging.getLogger(__name__)
+
+SKETCH_BITS = 8
+SKETCH_SIZE = 1 << SKETCH_BITS
+_HASH_MASK = (1 << 64) - 1
+_RANK_BITS = 64 - SKETCH_BITS
+_CHECKPOINT_MAGIC = b"BCA2"
+# Magic number, number of channels and the typecodes of the stamps and counts.
+_CHECKPOINT_HEADER = struct.Struct("<4sI2s")
+_CHECKPOINT_TYPECODES = "qQ"
+
+
+def _mix(value: int) -> int:
+    """Spreads the bits of a member id over 64 bits (splitmix64 finalizer)."""
+    value = (value + 0x9E3779B97F4A7C15) & _HASH_MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _HASH_MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _HASH_MASK
+    return value ^ (value >> 31)
+
+
+def _little_endian(values: array) -> bytes:
+    """Returns the bytes of an array in little-endian order."""
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _read_array(typecode: str, data: memoryview) -> array:
+    """Reads an array stored in little-endian order."""
+    values = array(typecode, data.tobytes())
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def estimate_distinct(registers: bytes) -> int:
+    """Returns the HyperLogLog estimate of the number of distinct values.
+
+    Args:
+        registers (bytes): `SKETCH_SIZE` registers holding the highest rank seen.
+    Returns:
+        int: The estimated number of distinct values.
+    """
+    size = len(registers)
+    estimate = 0.7213 / (1 + 1.079 / size) * size * size
+    estimate /= sum(2.0**-register for register in registers)
+    zeros = registers.count(0)
+    if estimate <= 2.5 * size and zeros:
+        estimate = size * math.log(size / zeros)
+    return round(estimate)
+
+
+class ActivityRing:
+    """
+    Message counts and poster sketches of the last `length` periods.
+
+    Args:
+        length (int): Number of periods kept.
+        period (int): Length of a period in seconds.
+        sketches (bool, optional): Whether to keep poster sketches. Default is True.
+    """
+
+    def __init__(self, length: int, period: int, sketches: bool = True):
+        self.length = length
+        self.period = period
+        self.stamps = array("q", [-1]) * length
+        self.counts = array("Q", [0]) * length
+        self.registers = bytearray(length * SKETCH_SIZE if sketches else 0)
+
+    def _slot(self, key: int) -> Optional[int]:
+        """Returns the slot of the period `key`, resetting it if it held an older
+        period, or `None` if the period is too old to be kept."""
+        slot = key % self.length
+        if self.stamps[slot] > key:
+            return None
+        if self.stamps[slot] != key:
+            self.stamps[slot] = key
+            self.counts[slot] = 0
+            if self.registers:
+                start = slot * SKETCH_SIZE
+                end = start + SKETCH_SIZE
+                self.registers[start:end] = bytes(SKETCH_SIZE)
+        return slot
+
+    def add(self, timestamp: float, author_hash: int) -> None:
+        """Counts a message posted at `timestamp` by the author with the hash."""
+        slot = self._slot(int(timestamp // self.period))
+        if slot is None:
+            return
+        self.counts[slot] += 1
+        if self.registers:
+            register = slot * SKETCH_SIZE + (author_hash >> _RANK_BITS)
+            rank = _RANK_BITS - (author_hash & ((1 << _RANK_BITS) - 1)).bit_length() + 1
+            if rank > self.registers[register]:
+                self.registers[register] = rank
+
+    def _live_slots(self, now: float) -> Iterable[int]:
+        """Yields the slots belonging to the last `length` periods."""
+        oldest = int(now // self.period) - self.length + 1
+        for slot, stamp in enumerate(self.stamps):
+            if stamp >= oldest:
+                yield slot
+
+    def messages(self, now: float) -> int:
+        """Returns the number of messages in the window ending at `now`."""
+        return sum(self.counts[slot] for slot in self._live_slots(now))
+
+    def _sketch(self, slot: int) -> bytearray:
+        """Returns a copy of the poster sketch of the slot."""
+        start = slot * SKETCH_SIZE
+        end = start + SKETCH_SIZE
+        return self.registers[start:end]
+
+    def posters(self, now: float) -> int:
+        """Returns the estimated number of distinct authors in the window."""
+        sketches = [self._sketch(slot) for slot in self._live_slots(now)]
+        if not sketches:
+            return 0
+        merged = bytes(map(max, *sketches)) if len(sketches) > 1 else sketches[0]
+        return estimate_distinct(merged)
+
+    def to_bytes(self) -> bytes:
+        """Serializes the ring with little-endian fixed-width integers."""
+        return (
+            _little_endian(self.stamps)
+            + _little_endian(self.counts)
+            + bytes(self.registers)
+        )
+
+    def byte_size(self) -> int:
+        """Returns the length of the `to_bytes` output."""
+        return self.length * (self.stamps.itemsize + self.counts.itemsize) + len(
+            self.registers
+        )
+
+    def load(self, data: memoryview) -> int:
+        """Restores the ring from `to_bytes` output and returns the bytes read.
+
+        Args:
+            data (memoryview): The checkpoint, starting at the ring.
+        """
+        stamps_end = self.length * self.stamps.itemsize
+        counts_end = stamps_end + self.length * self.counts.itemsize
+        end = counts_end + len(self.registers)
+        self.stamps = _read_array("q", data[:stamps_end])
+        self.counts = _read_array("Q", data[stamps_end:counts_end])
+        self.registers = bytearray(data[counts_end:end])
+        return end
+
+
+class ChannelActivity:
+    """Rolling statistics of a single channel, about 9 KiB regardless of
+    traffic."""
+
+    def __init__(self):
+        self.minutes = ActivityRing(60, 60, sketches=False)
+        self.hours = ActivityRing(24, 3600)
+        self.days = ActivityRing(7, 86400)
+
+    def rings(self) -> tuple[ActivityRing, ...]:
+        """Returns the rings in serialization order."""
+        return (self.minutes, self.hours, self.days)
+
+    def add(self, timestamp: float, author_id: int) -> None:
+        """Counts a message."""
+        author_hash = _mix(author_id)
+        for ring in self.rings():
+            ring.add(timestamp, author_hash)
+
+
+class ActivityTracker:
+    """Rolling statistics of all channels the bot sees messages in."""
+
+    def __init__(self):
+        self.channels: dict[int, ChannelActivity] = {}
+
+    def record(self, channel_id: int, author_id: int, timestamp: float) -> None:
+        """Counts a message posted in a channel."""
+        activity = self.channels.get(channel_id)
+        if activity is None:
+            activity = self.channels[channel_id] = ChannelActivity()
+        activity.add(timestamp, author_id)
+
+    def messages(self, channel_id: int, window: str) -> int:
+        """Returns the number of messages in the last `1h`, `24h` or `7d`."""
+        activity = self.channels.get(channel_id)
+        if activity is None:
+            return 0
+        ring = {"1h": activity.minutes, "24h": activity.hours, "7d": activity.days}
+        return ring[window].messages(time.time())
+
+    def posters(self, channel_id: int, window: str) -> int:
+        """Returns the estimated number of distinct authors in the last `24h` or
+        `7d`."""
+        activity = self.channels.get(channel_id)
+        if activity is None:
+            return 0
+        ring = {"24h": activity.hours, "7d": activity.days}
+        return ring[window].posters(time.time())
+
+    def save(self, path: str) -> None:
+        """Writes all channels to a binary checkpoint, replacing it atomically."""
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as checkpoint:
+            checkpoint.write(
+                _CHECKPOINT_HEADER.pack(
+                    _CHECKPOINT_MAGIC,
+                    len(self.channels),
+                    _CHECKPOINT_TYPECODES.encode(),
+                )
+            )
+            for channel_id, activity in self.channels.items():
+                checkpoint.write(struct.pack("<Q", channel_id))
+                for ring in activity.rings():
+                    checkpoint.write(ring.to_bytes())
+        os.replace(temporary_path, path)
+
+    def load(self, path: str) -> bool:
+        """Restores channels from a checkpoint written by `save`. A checkpoint
+        of another format or size, e.g. truncated by a crash, is ignored as a
+        whole.
+
+        Returns:
+            bool: Whether the checkpoint existed and was read.
+        """
+        try:
+            with open(path, "rb") as checkpoint:
+                data = memoryview(checkpoint.read())
+        except FileNotFoundError:
+            return False
+        count = _read_checkpoint_header(data)
+        if count is None:
+            logger.warning(
+                "Ignoring unreadable activity checkpoint %s.",
+                path,
+                extra={"event": "activity_checkpoint"},
+            )
+            return False
+        offset = _CHECKPOINT_HEADER.size
+        channels = {}
+        for _ in range(count):
+            (channel_id,) = struct.unpack_from("<Q", data, offset)
+            offset += 8
+            activity = ChannelActivity()
+            for ring in activity.rings():
+                offset += ring.load(data[offset:])
+            channels[channel_id] = activity
+        self.channels.update(channels)
+        return True
+
+
+def _read_checkpoint_header(data: memoryview) -> Optional[int]:
+    """Returns the number of channels of a checkpoint, or `None` if it is not
+    a checkpoint of this format or its size does not match that number."""
+    if len(data) < _CHECKPOINT_HEADER.size:
+        return None
+    magic, count, typecodes = _CHECKPOINT_HEADER.unpack_from(data)
+    if magic != _CHECKPOINT_MAGIC or typecodes != _CHECKPOINT_TYPECODES.encode():
+        return None
+    channel_size = 8 + sum(ring.byte_size() for ring in ChannelActivity().rings())
+    if len(data) != _CHECKPOINT_HEADER.size + count * channel_size:
+        return None
+    return count
+
+
+TRACKER = ActivityTracker()
+
+
+def handle_message(message: discord.Message) -> None:
+    """Counts a guild message written by a user."""
+    if message.guild is None or message.author.bot:
+        return
+    TRACKER.record(
+        message.channel.id, message.author.id, message.created_at.timestamp()
+    )
+    mark_changed(message.guild.id, "activity")
+
+
+@tasks.loop(minutes=5)
+async def checkpoint_activity(path: str):
+    """Periodically writes the activity of all channels to `path`."""
+    TRACKER.save(path)
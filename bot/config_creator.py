@@ -1,14 +1,64 @@
-"""Helper module for creating the `config.ini` configuration file."""
+"""Helper module for creating the `config.ini` configuration file.
+
+Bot settings are always read from `config.ini`. The embed variables are read from
+the file in `CONFIG_FILE`, which is `config.ini` as well unless
+`guild_config_directory` is set, in which case every guild has its own file."""
 
 import configparser
+import contextvars
+import logging
 import os
+from contextlib import contextmanager
+from typing import Iterator
 from discord.embeds import EmbedProxy
-
-
-def check_for_config_file() -> None:
+from bot.metrics import CONFIG_IO_SECONDS, timed
+
+DEFAULT_SETTINGS = {
+    "metrics_port": "0",
+    "log_level": "INFO",
+    "log_levels": "",
+    "log_repeat_interval": "60",
+    "api_base_url": "",
+    "activity_checkpoint": "",
+    "history_directory": "",
+    "index_snapshot_directory": "",
+    "fuzzy_lookup": "false",
+    "presence_intent": "false",
+    "schedule_file": "",
+    "deploy_concurrency": "5",
+    "template_library": "templates.json",
+    "compiled_cache": "",
+    "creator_sessions": "10",
+    "creator_session_memory_kib": "512",
+    "creator_session_timeout": "900",
+    "guild_config_directory": "",
+    "shard_count": "",
+    "shard_ids": "",
+    "render_budget": "0.02",
+    "interaction_defer_threshold": "2",
+    "rest_token_placeholder": "...",
+    "rest_token_timeout": "3",
+    "rest_token_concurrency": "4",
+}
+
+logger = logging.getLogger(__name__)
+
+# The file with the embed variables of the guild being handled. Context variables
+# are per task, so commands and views of different guilds do not interfere.
+CONFIG_FILE: contextvars.ContextVar[str] = contextvars.ContextVar(
+    "config_file", default="config.ini"
+)
+
+
+def check_for_config_file(path: str = "config.ini") -> None:
     """Checks if `config.ini` exists. If not, creates a default version
-    of the `config.ini` file in the root directory."""
-    config_file_exists = os.path.exists("config.ini")
+    of the `config.ini` file in the root directory.
+
+    Args:
+        path (str, optional): The file to check. Files other than `config.ini`
+        hold the embed variables of a guild and have no `BotSettings` section.
+    """
+    config_file_exists = os.path.exists(path)
     if not config_file_exists:
         config = configparser.ConfigParser()
 
@@ -16,6 +66,7 @@ def check_for_config_file() -> None:
             "embed_channel_id": "None",
             "embed_message_id": "None",
             "embed_description": "None",
+            "embed_group": "None",
         }
 
         config["FieldsVariables"] = {
@@ -30,6 +81,7 @@ def check_for_config_file() -> None:
             "embed_channel_id": "None",
             "embed_message_id": "None",
             "embed_description": "None",
+            "embed_group": "None",
         }
 
         config["FieldsRAM"] = {
@@ -40,13 +92,66 @@ def check_for_config_file() -> None:
             "field_4_value": "None",
         }
 
-        with open("config.ini", "w", encoding="utf-8") as configfile:
+        if path == "config.ini":
+            config["BotSettings"] = DEFAULT_SETTINGS
+
+        with open(path, "w", encoding="utf-8") as configfile:
             config.write(configfile)
-            print("\nCreated new config.ini file.\n")
+            logger.info("Created new %s file.", path, extra={"event": "config"})
     else:
-        print("\nFound exisisting config file.\n")
+        logger.info("Found exisisting config file.", extra={"event": "config"})
+
+
+def guild_config_path(guild_id: int) -> str:
+    """Returns the file with the embed variables of a guild, creating it
+    if needed. Without `guild_config_directory` all guilds share `config.ini`.
+
+    Args:
+        guild_id (int): The id of the guild.
+    """
+    directory = read_setting("guild_config_directory")
+    if not directory:
+        return "config.ini"
+    path = os.path.join(directory, f"{guild_id}.ini")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        check_for_config_file(path)
+    return path
+
+
+def use_guild_config(guild_id: int) -> None:
+    """Makes the current task read and write the embed variables of a guild."""
+    CONFIG_FILE.set(guild_config_path(guild_id))
+
 
+@contextmanager
+def guild_config(guild_id: int) -> Iterator[None]:
+    """Reads and writes the embed variables of a guild inside the `with` block."""
+    token = CONFIG_FILE.set(guild_config_path(guild_id))
+    try:
+        yield
+    finally:
+        CONFIG_FILE.reset(token)
 
+
+@timed(CONFIG_IO_SECONDS)
+def read_setting(setting: str) -> str:
+    """Reads a bot setting from the `BotSettings` section of the `config.ini` file.
+
+    Settings missing from older `config.ini` files fall back to the defaults.
+
+    Args:
+        setting (str): A key of the `BotSettings` section.
+
+    Returns:
+        str: The value of the setting.
+    """
+    config = configparser.ConfigParser()
+    config.read("config.ini")
+    return config.get("BotSettings", setting, fallback=DEFAULT_SETTINGS[setting])
+
+
+@timed(CONFIG_IO_SECONDS)
 def read_from_config(variable: str) -> str:
     """Reads specified value corresponding to the key from the `config.ini` file.
 
@@ -58,23 +163,46 @@ def read_from_config(variable: str) -> str:
         str: A value read from `MessageVariables` section from `config.ini`.
     """
     config = configparser.ConfigParser()
-    config.read("config.ini")
+    config.read(CONFIG_FILE.get())
     value = config["MessageVariables"][variable]
     return value
 
 
+@timed(CONFIG_IO_SECONDS)
+def read_embed_group() -> list[tuple[int, int]]:
+    """Reads the other messages of the last sent embed from the `embed_group` key
+    of the `MessageVariables` section of the `config.ini` file.
+
+    The key holds `channel_id:message_id` pairs separated by commas and is missing
+    from older `config.ini` files.
+
+    Returns:
+        list[tuple[int, int]]: Pairs of channel and message ids.
+    """
+    config = configparser.ConfigParser()
+    config.read(CONFIG_FILE.get())
+    value = config.get("MessageVariables", "embed_group", fallback="None")
+    if value == "None":
+        return []
+    return [
+        (int(channel_id), int(message_id))
+        for channel_id, message_id in (pair.split(":") for pair in value.split(","))
+    ]
+
+
+@timed(CONFIG_IO_SECONDS)
 def create_config_ram() -> None:
     """Resets RAM values of `config.ini` file, then copies internal values from
     memory sections to the ram sections."""
     config = configparser.ConfigParser()
-    config.read("config.ini")
+    config.read(CONFIG_FILE.get())
 
     reset_section(config, "MessageRAM")
     reset_section(config, "FieldsRAM")
     copy_section(config, "MessageVariables", "MessageRAM")
     copy_section(config, "FieldsVariables", "FieldsRAM")
 
-    with open("config.ini", "w", encoding="utf-8") as configfile:
+    with open(CONFIG_FILE.get(), "w", encoding="utf-8") as configfile:
         config.write(configfile)
 
 
@@ -104,6 +232,7 @@ def copy_section(
         config[destination_section][key] = value
 
 
+@timed(CONFIG_IO_SECONDS)
 def save_to_config_ram(**variables: dict[str, str]) -> None:
     """Saves specified varables to `config.ini` file.
 
@@ -117,14 +246,15 @@ def save_to_config_ram(**variables: dict[str, str]) -> None:
         dict[str, str]
     """
     config = configparser.ConfigParser()
-    config.read("config.ini")
+    config.read(CONFIG_FILE.get())
     for key, value in variables.items():
         config["MessageRAM"][key] = str(value)
 
-    with open("config.ini", "w", encoding="utf-8") as configfile:
+    with open(CONFIG_FILE.get(), "w", encoding="utf-8") as configfile:
         config.write(configfile)
 
 
+@timed(CONFIG_IO_SECONDS)
 def read_field_values_from_config(fields: list[EmbedProxy]) -> list[str]:
     """Reads all fields' values from `FieldsVariables` section of `config.ini` file.
     Saves them into a list.
@@ -137,7 +267,7 @@ def read_field_values_from_config(fields: list[EmbedProxy]) -> list[str]:
         list[str]: A list containing all fields' values.
     """
     config = configparser.ConfigParser()
-    config.read("config.ini")
+    config.read(CONFIG_FILE.get())
     old_descriptions = []
 
     values = [f"field_{i}_value" for i in range(len(fields))]
@@ -148,6 +278,41 @@ def read_field_values_from_config(fields: list[EmbedProxy]) -> list[str]:
     return old_descriptions
 
 
+@timed(CONFIG_IO_SECONDS)
+def read_templates_from_config_ram(fields: list[EmbedProxy]) -> tuple[str, list[str]]:
+    """Reads the description and field templates of the embed being edited
+    from the `MessageRAM` and `FieldsRAM` sections of the `config.ini` file.
+
+    Args:
+        fields (list[discord.embeds.EmbedProxy]): A list of fields in the
+        `discord.Embed` object.
+
+    Returns:
+        tuple[str, list[str]]: The description template and the field templates.
+    """
+    config = configparser.ConfigParser()
+    config.read(CONFIG_FILE.get())
+    description = config["MessageRAM"]["embed_description"]
+    field_values = [config["FieldsRAM"][f"field_{i}_value"] for i in range(len(fields))]
+    return description, field_values
+
+
+@timed(CONFIG_IO_SECONDS)
+def read_saved_templates() -> list[str]:
+    """Reads the description and field templates of the last sent embed from
+    the `MessageVariables` and `FieldsVariables` sections of the `config.ini` file.
+
+    Returns:
+        list[str]: The templates that are set.
+    """
+    config = configparser.ConfigParser()
+    config.read(CONFIG_FILE.get())
+    templates = [config["MessageVariables"]["embed_description"]]
+    templates.extend(value for _, value in config.items("FieldsVariables"))
+    return [template for template in templates if template != "None"]
+
+
+@timed(CONFIG_IO_SECONDS)
 def add_field_value_to_config_ram(fields: list[EmbedProxy], description: str) -> None:
     """Saves newly created field component to the `config.ini` file.
 
@@ -157,16 +322,17 @@ def add_field_value_to_config_ram(fields: list[EmbedProxy], description: str) ->
         description (str): Description of the last added field.
     """
     config = configparser.ConfigParser()
-    config.read("config.ini")
+    config.read(CONFIG_FILE.get())
     field_num = int(len(fields) - 1)
     key = f"field_{field_num}_value"
 
     config["FieldsRAM"][key] = str(description)
 
-    with open("config.ini", "w", encoding="utf-8") as configfile:
+    with open(CONFIG_FILE.get(), "w", encoding="utf-8") as configfile:
         config.write(configfile)
 
 
+@timed(CONFIG_IO_SECONDS)
 def remove_field_from_config_ram(field_number: int, fields: list[EmbedProxy]) -> None:
     """Removes selected field value from the `config.ini` file.
 
@@ -187,7 +353,7 @@ def remove_field_from_config_ram(field_number: int, fields: list[EmbedProxy]) ->
         `discord.Embed` object.
     """
     config = configparser.ConfigParser()
-    config.read("config.ini")
+    config.read(CONFIG_FILE.get())
 
     value_to_remove = f"field_{field_number}_value"
 
@@ -205,24 +371,26 @@ def remove_field_from_config_ram(field_number: int, fields: list[EmbedProxy]) ->
             field_dict[key] = field_dict[next_key]
             field_dict[next_key] = "None"
 
-    with open("config.ini", "w", encoding="utf-8") as configfile:
+    with open(CONFIG_FILE.get(), "w", encoding="utf-8") as configfile:
         config.write(configfile)
 
 
+@timed(CONFIG_IO_SECONDS)
 def reset_config_ram() -> None:
     """Sets all values of the `MessageRAM`and `FieldsRAM` sections in the `config.ini`
     file to "None".
     """
     config = configparser.ConfigParser()
-    config.read("config.ini")
+    config.read(CONFIG_FILE.get())
 
     reset_section(config, "MessageRAM")
     reset_section(config, "FieldsRAM")
 
-    with open("config.ini", "w", encoding="utf-8") as configfile:
+    with open(CONFIG_FILE.get(), "w", encoding="utf-8") as configfile:
         config.write(configfile)
 
 
+@timed(CONFIG_IO_SECONDS)
 def save_values_from_ram_to_memory() -> None:
     """Saves RAM sections' values to the memory sections in the `config.ini` file.
 
@@ -230,12 +398,12 @@ def save_values_from_ram_to_memory() -> None:
     Afterwards sets all the values in RAM sections to "None".
     """
     config = configparser.ConfigParser()
-    config.read("config.ini")
+    config.read(CONFIG_FILE.get())
 
     copy_section(config, "MessageRAM", "MessageVariables")
     copy_section(config, "FieldsRAM", "FieldsVariables")
     reset_section(config, "MessageRAM")
     reset_section(config, "FieldsRAM")
 
-    with open("config.ini", "w", encoding="utf-8") as configfile:
+    with open(CONFIG_FILE.get(), "w", encoding="utf-8") as configfile:
         config.write(configfile)
@@ -0,0 +1,106 @@
+"""Module keeping track of open Embed Creator sessions.
+
+The sessions of every guild are kept in least-recently-used order and moved to
+the end whenever they are interacted with. When a guild has more sessions than
+allowed, or their estimated memory use is over the cap, its least recently used
+sessions are closed, which deletes their preview and releases the waiters of
+their modals."""
+
+import logging
+from collections import OrderedDict
+from typing import Optional, Protocol
+
+logger = logging.getLogger(__name__)
+
+
+class Session(Protocol):
+    """An open session, e.g. an `EmbedCreator` view."""
+
+    def memory_usage(self) -> int:
+        """Returns the estimated number of bytes held by the session."""
+
+    async def close(self) -> None:
+        """Closes the session and cleans up its messages."""
+
+
+class SessionRegistry:
+    """
+    Open sessions of every guild in least-recently-used order. The limits apply
+    to each guild separately, so a busy guild cannot close the sessions of
+    another.
+
+    Args:
+        max_sessions (int, optional): Maximum number of open sessions of a guild.
+        max_bytes (int, optional): Maximum estimated memory of the sessions of
+        a guild.
+    """
+
+    def __init__(self, max_sessions: int = 10, max_bytes: int = 512 * 1024):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.guilds: dict[int, OrderedDict[int, Session]] = {}
+        self.guild_of: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.guild_of)
+
+    def sessions(self, guild_id: int) -> list[Session]:
+        """Returns the open sessions of a guild, least recently used first."""
+        return list(self.guilds.get(guild_id, {}).values())
+
+    async def add(self, session: Session, guild_id: int) -> None:
+        """Registers a new session of a guild, closing the least recently used
+        sessions of the guild if its limits are exceeded."""
+        self.guilds.setdefault(guild_id, OrderedDict())[id(session)] = session
+        self.guild_of[id(session)] = guild_id
+        await self.enforce_limits(guild_id)
+
+    def touch(self, session: Session) -> None:
+        """Marks a session as the most recently used of its guild."""
+        guild_id = self.guild_of.get(id(session))
+        if guild_id is not None:
+            self.guilds[guild_id].move_to_end(id(session))
+
+    def discard(self, session: Session) -> None:
+        """Forgets a session that was finished or closed."""
+        guild_id = self.guild_of.pop(id(session), None)
+        if guild_id is None:
+            return
+        sessions = self.guilds[guild_id]
+        del sessions[id(session)]
+        if not sessions:
+            del self.guilds[guild_id]
+
+    def memory_usage(self, guild_id: Optional[int] = None) -> int:
+        """Returns the estimated memory of the sessions of a guild, or of all
+        sessions, in bytes."""
+        if guild_id is not None:
+            return sum(session.memory_usage() for session in self.sessions(guild_id))
+        return sum(
+            session.memory_usage()
+            for sessions in self.guilds.values()
+            for session in sessions.values()
+        )
+
+    async def enforce_limits(self, guild_id: int) -> None:
+        """Closes the least recently used sessions of a guild until its limits
+        are met. The newest session is always kept."""
+        sessions = self.guilds.get(guild_id, OrderedDict())
+        while len(sessions) > 1 and (
+            len(sessions) > self.max_sessions
+            or self.memory_usage(guild_id) > self.max_bytes
+        ):
+            _, session = sessions.popitem(last=False)
+            del self.guild_of[id(session)]
+            logger.info(
+                "Closing the least recently used Embed Creator session.",
+                extra={
+                    "event": "session_evicted",
+                    "guild_id": guild_id,
+                    "sessions": len(sessions),
+                },
+            )
+            await session.close()
+
+
+SESSIONS = SessionRegistry()
@@ -7,9 +7,12 @@ from bot.config_creator import (
     save_to_config_ram,
     read_from_config,
     add_field_value_to_config_ram,
+    read_templates_from_config_ram,
     remove_field_from_config_ram,
 )
-from bot.message_syntax_functions import convert_string
+from bot.interaction_deadline import record_response
+from bot.message_syntax_functions import convert_string, suggest_corrections
+from bot.template_library import LIBRARY, MAX_NAME_LENGTH
 
 
 class EmbedEditingMethods:
@@ -38,6 +41,12 @@ class EmbedEditingMethods:
         self.embed_survey = embed_survey
         self.update_flag = update_flag if update_flag is not False else False
 
+    @property
+    def guild_id(self) -> int:
+        """The id of the guild whose template library is used, 0 outside
+        a guild."""
+        return self.ctx.guild.id if self.ctx.guild else 0
+
     def get_default_embed(self):
         """Sets embed back to default state"""
         self.embed.title = "Title"
@@ -49,6 +58,36 @@ class EmbedEditingMethods:
         if bool(self.embed.image):
             self.embed.set_image(url=None)
 
+    async def show_survey(self, interaction: discord.Interaction) -> bool:
+        """Shows the survey modal and waits until it is closed.
+
+        Returns:
+            bool: Whether the modal was submitted, rather than closed because
+            the session ended.
+        """
+        await interaction.response.send_modal(self.embed_survey)
+        record_response(interaction, "embed_creator.menu")
+        await self.embed_survey.wait()
+        return getattr(self.embed_survey, "submitted", True)
+
+    async def defer_if_slow(self, template: str) -> None:
+        """Defers the submitted survey if rendering the template could miss
+        the interaction deadline, see `bot.interaction_deadline`."""
+        deadline = getattr(self.embed_survey, "deadline", None)
+        if deadline is not None:
+            await deadline.defer_if_slow((template,))
+
+    async def send_suggestions(
+        self, interaction: discord.Interaction, template: str
+    ) -> None:
+        """Lists names in the template that were not found, with similar names
+        from the server, as an ephemeral followup."""
+        hints = suggest_corrections(self.ctx, template)
+        if hints:
+            await interaction.followup.send(
+                "Some names were not found:\n" + "\n".join(hints), ephemeral=True
+            )
+
     async def edit_author(self, interaction: discord.Interaction):
         """Edits the embed's author (name, icon_url, url)."""
         if self.embed_survey is None:
@@ -79,8 +118,8 @@ class EmbedEditingMethods:
                 required=False,
             )
         )
-        await interaction.response.send_modal(self.embed_survey)
-        await self.embed_survey.wait()
+        if not await self.show_survey(interaction):
+            return
         try:
             self.embed.set_author(
                 name=str(self.embed_survey.children[0]),
@@ -128,15 +167,17 @@ class EmbedEditingMethods:
                     max_length=4000,
                 )
             )
-        await interaction.response.send_modal(self.embed_survey)
-        await self.embed_survey.wait()
+        if not await self.show_survey(interaction):
+            return
         new_embed_description = self.embed_survey.children[1]
         save_to_config_ram(embed_description=str(new_embed_description))
+        await self.defer_if_slow(str(new_embed_description))
         output_string = convert_string(self.ctx, str(self.embed_survey.children[1]))
         self.embed.title, self.embed.description = (
             str(self.embed_survey.children[0]),
             output_string,
         )
+        await self.send_suggestions(interaction, str(new_embed_description))
 
     async def edit_thumbnail(self, interaction: discord.Interaction) -> None:
         """Edits the embed's thumbnail."""
@@ -151,8 +192,8 @@ class EmbedEditingMethods:
                 required=False,
             )
         )
-        await interaction.response.send_modal(self.embed_survey)
-        await self.embed_survey.wait()
+        if not await self.show_survey(interaction):
+            return
         self.embed.set_thumbnail(url=str(self.embed_survey.children[0]))
 
     async def edit_image(self, interaction: discord.Interaction) -> None:
@@ -168,8 +209,8 @@ class EmbedEditingMethods:
                 required=False,
             )
         )
-        await interaction.response.send_modal(self.embed_survey)
-        await self.embed_survey.wait()
+        if not await self.show_survey(interaction):
+            return
         self.embed.set_image(url=str(self.embed_survey.children[0]))
 
     async def edit_color(self, interaction: discord.Interaction) -> None:
@@ -184,8 +225,8 @@ class EmbedEditingMethods:
                 max_length=20,
             )
         )
-        await interaction.response.send_modal(self.embed_survey)
-        await self.embed_survey.wait()
+        if not await self.show_survey(interaction):
+            return
         try:
             color = discord.Colour.from_str(str(self.embed_survey.children[0]))
         except ValueError:
@@ -202,9 +243,11 @@ class EmbedEditingMethods:
         if select is None:
             return
         if not self.embed.fields:
-            return await interaction.response.send_message(
+            await interaction.response.send_message(
                 "There are no fields to remove.", ephemeral=True
             )
+            record_response(interaction, "embed_creator.menu")
+            return
         field_options = []
         for index, field in enumerate(self.embed.fields):
             field_options.append(
@@ -212,6 +255,7 @@ class EmbedEditingMethods:
             )
         select.children[0].options = field_options
         await interaction.response.send_message(view=select, ephemeral=True)
+        record_response(interaction, "embed_creator.menu")
         await select.wait()
 
         if vals := select.values:
@@ -224,9 +268,11 @@ class EmbedEditingMethods:
         if self.embed_survey is None:
             return
         if len(self.embed.fields) >= 5:
-            return await interaction.response.send_message(
+            await interaction.response.send_message(
                 "You can not add more than 5 fields.", ephemeral=True
             )
+            record_response(interaction, "embed_creator.menu")
+            return
         self.embed_survey.title = "Add a New Field"
         self.embed_survey.add_item(
             discord.ui.TextInput(
@@ -251,8 +297,9 @@ class EmbedEditingMethods:
             )
         )
 
-        await interaction.response.send_modal(self.embed_survey)
-        await self.embed_survey.wait()
+        if not await self.show_survey(interaction):
+            return
+        await self.defer_if_slow(str(self.embed_survey.children[1]))
         output_string = convert_string(self.ctx, str(self.embed_survey.children[1]))
         try:
             inline = False
@@ -277,3 +324,67 @@ class EmbedEditingMethods:
                 add_field_value_to_config_ram(
                     self.embed.fields, str(self.embed_survey.children[1])
                 )
+            await self.send_suggestions(interaction, str(self.embed_survey.children[1]))
+
+    async def save_template(self, interaction: discord.Interaction) -> None:
+        """Saves a template, by default the embed's description, to the library."""
+        if self.embed_survey is None:
+            return
+        description, _ = read_templates_from_config_ram(self.embed.fields)
+        self.embed_survey.title = "Save Template to Library"
+        self.embed_survey.add_item(
+            discord.ui.TextInput(
+                label="Template Name",
+                max_length=MAX_NAME_LENGTH,
+                placeholder="Name to select the template by",
+            )
+        )
+        self.embed_survey.add_item(
+            discord.ui.TextInput(
+                label="Template",
+                default=description if description != "None" else None,
+                placeholder="Text with commands in curly brackets",
+                style=discord.TextStyle.paragraph,
+                max_length=4000,
+            )
+        )
+        if not await self.show_survey(interaction):
+            return
+        try:
+            LIBRARY.store(
+                self.guild_id,
+                str(self.embed_survey.children[0]),
+                str(self.embed_survey.children[1]),
+            )
+        except ValueError as error:
+            await interaction.followup.send(str(error), ephemeral=True)
+        else:
+            await self.send_suggestions(interaction, str(self.embed_survey.children[1]))
+
+    async def load_template(
+        self, interaction: discord.Interaction, select: discord.ui.View
+    ) -> None:
+        """Sets the embed's description to a template from the library."""
+        if select is None:
+            return
+        if not LIBRARY.templates(self.guild_id):
+            await interaction.response.send_message(
+                "There are no templates in the library.", ephemeral=True
+            )
+            record_response(interaction, "embed_creator.menu")
+            return
+        select.children[0].placeholder = "Select a template..."
+        select.children[0].options = [
+            discord.SelectOption(label=name) for name in LIBRARY.names(self.guild_id)
+        ]
+        await interaction.response.send_message(view=select, ephemeral=True)
+        record_response(interaction, "embed_creator.menu")
+        await select.wait()
+
+        if vals := select.values:
+            template = LIBRARY.get(self.guild_id, vals[0])
+            if template is None:
+                return
+            save_to_config_ram(embed_description=template)
+            self.embed.description = convert_string(self.ctx, template)
+            await self.send_suggestions(interaction, template)
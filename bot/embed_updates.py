@@ -0,0 +1,429 @@
+"""Module rendering the managed embeds and keeping them up to date.
+
+Every guild has its own auto update loop. An embed sent to several channels
+forms a group that is rendered once per tick, with the edits sent to all of its
+messages concurrently.
+
+A render works on a snapshot of the guild index taken when it starts, so all
+numbers of an embed describe the same moment, while gateway events keep being
+applied to the live index between its templates."""
+
+import asyncio
+import copy
+import datetime
+import logging
+import time
+from typing import Awaitable, Iterable, Optional, Sequence
+import discord
+from discord.ext import commands, tasks
+from bot.config_creator import (
+    read_embed_group,
+    read_field_values_from_config,
+    read_from_config,
+    read_setting,
+    use_guild_config,
+)
+from bot.guild_index import GuildIndex, get_guild_index, mark_changed
+from bot.history import RECORDING
+from bot.message_syntax_functions import (
+    render_template,
+    rest_tokens,
+    template_dependencies,
+)
+from bot.metrics import (
+    EMBED_EDITS,
+    EMBED_RENDER_SECONDS,
+    LAST_TICK_SECONDS,
+    RENDER_WINDOW,
+    SCHEDULER_LAG_SECONDS,
+)
+from bot.rest_tokens import REST_VALUES
+from bot.startup_profile import PROFILE
+
+logger = logging.getLogger(__name__)
+
+_last_rendered: dict[int, dict] = {}
+_last_stamps: dict[int, tuple] = {}
+_render_seconds: dict[int, float] = {}
+AUTO_UPDATE_SECONDS = 15.0
+# The auto update loop of every guild with a managed embed.
+AUTO_UPDATES: dict[Optional[int], tasks.Loop] = {}
+
+
+async def gather_limited(calls: Iterable[Awaitable], limit: int) -> list:
+    """
+    Awaits the calls concurrently, at most `limit` at a time, so sending to many
+    channels does not burst into the rate limits.
+
+    Args:
+        calls (Iterable[Awaitable]): The calls to await, e.g. message edits.
+        limit (int): Maximum number of calls awaited at the same time.
+    Returns:
+        list: The results in order; a call that failed gives its exception.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def limited(call: Awaitable):
+        async with semaphore:
+            return await call
+
+    return await asyncio.gather(
+        *(limited(call) for call in calls), return_exceptions=True
+    )
+
+
+def deploy_concurrency() -> int:
+    """Returns the maximum number of channels sent to or edited at once."""
+    return max(int(read_setting("deploy_concurrency")), 1)
+
+
+async def edit_group(
+    messages: Sequence[discord.message.Message], embed: discord.Embed
+) -> discord.message.Message:
+    """
+    Edits all messages of an embed group with the same embed.
+
+    A failed edit of one message does not stop the others and is logged.
+
+    Args:
+        messages (Sequence[`discord.message.Message`]): The messages showing
+        the embed, the first one being the main message of the group.
+        embed (`discord.Embed`): The embed to show.
+    Returns:
+        `discord.message.Message`: The edited main message.
+    Raises:
+        discord.HTTPException: If editing the main message failed.
+    """
+    results = await gather_limited(
+        (message.edit(embed=embed) for message in messages), deploy_concurrency()
+    )
+    for message, result in zip(messages, results):
+        if isinstance(result, Exception):
+            logger.warning(
+                "Editing an embed message failed: %s",
+                result,
+                extra={"event": "embed_group", "embed_id": message.id},
+            )
+    if isinstance(results[0], Exception):
+        raise results[0]
+    return results[0]
+
+
+async def fetch_embed_group(client: discord.Client) -> list[discord.message.Message]:
+    """
+    Fetches the other messages of the last sent embed saved in `config.ini`.
+
+    Messages that no longer exist are left out.
+
+    Args:
+        client (`discord.Client`): The bot.
+    Returns:
+        list[`discord.message.Message`]: The messages found.
+    """
+
+    async def fetch(channel_id: int, message_id: int) -> discord.message.Message:
+        channel = client.get_channel(channel_id) or await client.fetch_channel(
+            channel_id
+        )
+        return await channel.fetch_message(message_id)  # type: ignore
+
+    results = await gather_limited(
+        (fetch(*ids) for ids in read_embed_group()), deploy_concurrency()
+    )
+    return [result for result in results if isinstance(result, discord.Message)]
+
+
+async def refresh_rest_tokens(guild: discord.Guild, templates: Sequence[str]) -> int:
+    """
+    Fetches the values of the REST tokens in the templates that are older than
+    their time to live.
+
+    The fetches run concurrently, at most `rest_token_concurrency` at a time,
+    each limited to `rest_token_timeout` seconds. Tokens whose fetch did not
+    finish keep showing their last value.
+
+    Args:
+        guild (`discord.Guild`): The guild the templates are rendered in.
+        templates (Sequence[str]): The templates of the embed.
+    Returns:
+        int: The number of tokens whose value changed.
+    """
+    stale = [
+        ((guild.id, token.token_type.name, token.argument), token)
+        for token in rest_tokens(templates)
+        if not REST_VALUES.is_fresh(
+            (guild.id, token.token_type.name, token.argument), token.token_type.ttl
+        )
+    ]
+    if not stale:
+        return 0
+    results = await gather_limited(
+        (
+            REST_VALUES.fetch(key, token.token_type.fetcher(guild, token.parsed))
+            for key, token in stale
+        ),
+        max(int(read_setting("rest_token_concurrency")), 1),
+    )
+    changed = sum(result is True for result in results)
+    if changed:
+        mark_changed(guild.id, "rest")
+    return changed
+
+
+def render_embed(
+    embed: discord.Embed,
+    ctx: commands.Context,
+    embed_description: str,
+    field_values: list[str],
+) -> None:
+    """
+    Converts the description and field templates and writes the results to the
+    embed.
+
+    Args:
+        embed (`discord.Embed`): The embed to be updated.
+        ctx (discord.ext.commands.context.Context): necessary parameter when
+        accesing discord server data; used by discord.ext.commands.
+        embed_description (str): The template of the embed description.
+        field_values (list[str]): The templates of the embed fields, in order.
+    """
+    guild = getattr(ctx, "guild", None)
+    index = get_guild_index(guild) if guild else None
+    for i, (field, template) in enumerate(zip(embed.fields, field_values)):
+        embed.set_field_at(
+            i,
+            name=field.name,
+            value=render_template(index, template),
+            inline=field.inline,
+        )
+    embed.description = render_template(index, embed_description)
+
+
+async def render_cycle(
+    embed: discord.Embed,
+    index: Optional[GuildIndex],
+    embed_description: str,
+    field_values: list[str],
+) -> float:
+    """
+    Works like `render_embed` against a snapshot, letting other tasks run after
+    every template, so a large embed does not hold back gateway events. Values
+    with a history, e.g. `{count_trend}`, are recorded.
+
+    Args:
+        embed (`discord.Embed`): The embed to be updated.
+        index (`GuildIndex`): The snapshot to render against, or `None`
+        outside a guild.
+        embed_description (str): The template of the embed description.
+        field_values (list[str]): The templates of the embed fields, in order.
+    Returns:
+        float: The seconds spent rendering, without the time of other tasks.
+    """
+    busy = 0.0
+    recording = RECORDING.set(True)
+    try:
+        for i, (field, template) in enumerate(zip(embed.fields, field_values)):
+            start = time.perf_counter()
+            value = render_template(index, template)
+            embed.set_field_at(i, name=field.name, value=value, inline=field.inline)
+            busy += time.perf_counter() - start
+            await asyncio.sleep(0)
+        start = time.perf_counter()
+        embed.description = render_template(index, embed_description)
+        return busy + time.perf_counter() - start
+    finally:
+        RECORDING.reset(recording)
+
+
+def render_stamp(
+    embed: discord.Embed,
+    index: Optional[GuildIndex],
+    embed_description: str,
+    field_values: list[str],
+) -> Optional[tuple]:
+    """
+    Returns a value that changes whenever rendering the embed could give
+    a different result, or `None` outside a guild.
+
+    Args:
+        embed (`discord.Embed`): The embed to be updated.
+        index (`GuildIndex`): The index of the guild the embed is rendered for.
+        embed_description (str): The template of the embed description.
+        field_values (list[str]): The templates of the embed fields, in order.
+    Returns:
+        tuple: The templates, field names and versions of the guild state
+        the templates depend on.
+    """
+    if index is None:
+        return None
+    templates = (embed_description, *field_values)
+    return (
+        id(embed),
+        templates,
+        tuple(field.name for field in embed.fields),
+        index.dependency_stamp(template_dependencies(templates)),
+    )
+
+
+async def refresh_message(  # pylint: disable=too-many-arguments
+    last_message: discord.message.Message,
+    embed: discord.Embed,
+    ctx: commands.Context,
+    embed_description: str,
+    field_values: list[str],
+    *,
+    group: Sequence[discord.message.Message] = (),
+) -> str:
+    """
+    Renders the embed templates and edits the message if the result changed.
+
+    Gateway events only record which kind of guild state changed, so a burst of
+    events (e.g. presence updates) results in at most one render per tick.
+    If nothing the templates depend on changed since the previous tick,
+    the render is skipped as well. The templates are rendered against
+    a snapshot of the guild index, see `render_cycle`.
+
+    Args:
+        last_message (`discord.message.Message`): The message showing the embed.
+        embed (`discord.Embed`): The embed to be updated.
+        ctx (discord.ext.commands.context.Context): necessary parameter when
+        accesing discord server data; used by discord.ext.commands.
+        embed_description (str): The template of the embed description.
+        field_values (list[str]): The templates of the embed fields, in order.
+        group (Sequence[`discord.message.Message`], optional): Other messages
+        showing the same embed. They get the same render, so it is done once.
+    Returns:
+        str: "sent" if the message was edited, "skipped" otherwise.
+    """
+    guild = getattr(ctx, "guild", None)
+    index = get_guild_index(guild) if guild else None
+    stamp = render_stamp(embed, index, embed_description, field_values)
+    if stamp is not None and _last_stamps.get(last_message.id) == stamp:
+        EMBED_EDITS.inc(result="skipped")
+        return "skipped"
+    now = datetime.datetime.now()
+    if index is None:
+        render_time = await render_cycle(embed, None, embed_description, field_values)
+    else:
+        try:
+            render_time = await render_cycle(
+                embed, index.snapshot(), embed_description, field_values
+            )
+        finally:
+            index.release()
+    EMBED_RENDER_SECONDS.observe(render_time, guild=str(guild.id if guild else 0))
+    _render_seconds[last_message.id] = render_time
+    RENDER_WINDOW.observe(render_time)
+    PROFILE.mark("first_render", final=True)
+    rendered = copy.deepcopy(embed.to_dict())
+    rendered.pop("footer", None)
+    if _last_rendered.get(last_message.id) == rendered:
+        result = "skipped"
+    else:
+        embed.set_footer(
+            text=f"""Last auto update: {now.strftime('%d.%m.%Y - %H:%M:%S')}"""
+        )
+        await edit_group((last_message, *group), embed)
+        _last_rendered[last_message.id] = rendered
+        result = "sent"
+    if stamp is not None:
+        _last_stamps[last_message.id] = stamp
+    EMBED_EDITS.inc(result=result)
+    return result
+
+
+async def auto_update_tick(
+    last_message: discord.message.Message,
+    embed: discord.Embed,
+    ctx: commands.Context,
+    group: Sequence[discord.message.Message] = (),
+):
+    """
+    Periodically updates the last sent embed. Looks for changes in embed description.
+
+    Loads the last message sent and its description.
+    Re-converts the text of its description to match the current state,
+    finally updates the message. The edit is skipped when the rendered content
+    did not change since the previous one.
+
+    Tokens that need REST data are fetched first, see `refresh_rest_tokens`.
+
+    Every guild has its own loop. A guild whose render takes longer than
+    `render_budget` of the interval is updated less often, so one huge server
+    cannot take the time of the others.
+
+    Args:
+        last_message (`discord.message.Message`): last sent message by bot,
+        created from the `EmbedCreator`.
+        embed (`discord.Embed`): An object from the `Discord.Embed` class that
+        will be used as the main embed.
+        ctx (discord.ext.commands.context.Context): necessary parameter when
+        accesing discoFrd server data; used by discord.ext.commands.
+        group (Sequence[`discord.message.Message`], optional): Other messages
+        showing the same embed, sent to several channels at once.
+    """
+    guild_id = ctx.guild.id if ctx.guild else None
+    loop = AUTO_UPDATES[guild_id]
+    if guild_id is not None:
+        use_guild_config(guild_id)
+    scheduled = loop.next_iteration - datetime.timedelta(seconds=loop.seconds)
+    SCHEDULER_LAG_SECONDS.observe(
+        max((discord.utils.utcnow() - scheduled).total_seconds(), 0.0)
+    )
+    tick_start = time.perf_counter()
+    embed_description = read_from_config("embed_description")
+    field_values = read_field_values_from_config(embed.fields)
+    if ctx.guild:
+        await refresh_rest_tokens(ctx.guild, (embed_description, *field_values))
+    result = await refresh_message(
+        last_message, embed, ctx, embed_description, field_values, group=group
+    )
+    tick_time = time.perf_counter() - tick_start
+    LAST_TICK_SECONDS.set(tick_time)
+    render_time = _render_seconds.get(last_message.id, 0.0)
+    interval = max(
+        AUTO_UPDATE_SECONDS, render_time / float(read_setting("render_budget"))
+    )
+    if abs(interval - loop.seconds) >= 1.0:
+        loop.change_interval(seconds=interval)
+    logger.info(
+        "Auto update finished.",
+        extra={
+            "event": "auto_update",
+            "guild_id": guild_id,
+            "embed_id": last_message.id,
+            "edit": result,
+            "duration_ms": round(tick_time * 1000, 2),
+            "interval_s": round(interval, 1),
+            "throttle": True,
+        },
+    )
+
+
+def auto_update(guild_id: Optional[int]) -> tasks.Loop:
+    """Returns the auto update loop of a guild, creating it if needed."""
+    loop = AUTO_UPDATES.get(guild_id)
+    if loop is None:
+        loop = tasks.loop(seconds=AUTO_UPDATE_SECONDS)(auto_update_tick)
+        AUTO_UPDATES[guild_id] = loop
+    return loop
+
+
+def start_auto_update(
+    last_message: discord.message.Message,
+    embed: discord.Embed,
+    ctx: commands.Context,
+    group: Sequence[discord.message.Message] = (),
+) -> None:
+    """Starts, or restarts with the new message, the auto update of the guild
+    of `ctx`. The arguments are those of `auto_update_tick`."""
+    loop = auto_update(ctx.guild.id if ctx.guild else None)
+    if loop.is_running():
+        loop.restart(last_message, embed, ctx, group)
+    else:
+        loop.start(last_message, embed, ctx, group)
+
+
+def running_auto_updates() -> int:
+    """Returns the number of guilds with a running auto update."""
+    return sum(loop.is_running() for loop in AUTO_UPDATES.values())
@@ -0,0 +1,88 @@
+"""Module containing the trigram index used for fuzzy, case-insensitive name lookup.
+
+Every name is split into lowercase trigrams and each trigram keeps the set of keys
+whose names contain it. A query only looks at keys sharing one of its rarer
+trigrams, so a lookup does not scan all names, and candidates are ranked by the
+Jaccard similarity of their trigram sets."""
+
+import heapq
+from typing import Hashable
+
+
+def trigrams(name: str) -> set[str]:
+    """Returns the lowercase trigrams of a name, padded to include its start and
+    end."""
+    padded = f"  {name.lower()} "
+    return {"".join(chars) for chars in zip(padded, padded[1:], padded[2:])}
+
+
+class TrigramIndex:
+    """An incrementally updated trigram index of names."""
+
+    def __init__(self):
+        self.names: dict[Hashable, str] = {}
+        self.postings: dict[str, set] = {}
+
+    def copy(self) -> "TrigramIndex":
+        """Returns an independent copy of the index."""
+        duplicate = TrigramIndex()
+        duplicate.names = dict(self.names)
+        duplicate.postings = {gram: set(keys) for gram, keys in self.postings.items()}
+        return duplicate
+
+    def add(self, key: Hashable, name: str) -> None:
+        """Indexes a name under `key`, replacing the previous name of the key."""
+        if key in self.names:
+            self.remove(key)
+        self.names[key] = name
+        for trigram in trigrams(name):
+            self.postings.setdefault(trigram, set()).add(key)
+
+    def remove(self, key: Hashable) -> None:
+        """Removes the name of `key` from the index."""
+        name = self.names.pop(key, None)
+        if name is None:
+            return
+        for trigram in trigrams(name):
+            keys = self.postings.get(trigram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[trigram]
+
+    def search(
+        self, query: str, limit: int = 3, min_score: float = 0.0
+    ) -> list[tuple[float, Hashable]]:
+        """Returns the keys with names most similar to the query.
+
+        Trigrams shared by more than a tenth of all names are only used when
+        the query has no rarer ones, which keeps the candidate set small.
+
+        Args:
+            query (str): The name to look up.
+            limit (int, optional): Maximum number of results. Default is 3.
+            min_score (float, optional): Minimum similarity, from 0 to 1.
+        Returns:
+            list: Pairs of (similarity, key), most similar first.
+        """
+        query_trigrams = trigrams(query)
+        postings = sorted(
+            (self.postings[gram] for gram in query_trigrams if gram in self.postings),
+            key=len,
+        )
+        if not postings:
+            return []
+        common = max(64, len(self.names) // 10)
+        candidates: set = set()
+        for keys in postings:
+            if len(keys) > common and candidates:
+                break
+            candidates.update(keys)
+        scored = []
+        for key in candidates:
+            name_trigrams = trigrams(self.names[key])
+            shared = len(query_trigrams & name_trigrams)
+            score = shared / (len(query_trigrams) + len(name_trigrams) - shared)
+            if score >= min_score:
+                scored.append((score, key))
+        return heapq.nlargest(limit, scored, key=lambda item: item[0])
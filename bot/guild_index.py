@@ -0,0 +1,741 @@
+"""Module containing the compact guild index used by the message syntax engine."""
+
+import asyncio
+import copy
+import logging
+import sys
+import time
+from array import array
+from typing import Iterable, Optional
+import discord
+from bot.fuzzy import TrigramIndex
+
+logger = logging.getLogger(__name__)
+
+# Dependencies on the wall clock, e.g. of tokens counting the last 24 hours.
+CLOCK_DEPENDENCIES = {"minute": 60, "hour": 3600}
+# Members reconciled between two yields to the event loop.
+RECONCILE_BATCH = 1000
+# Containers changed in place by gateway events, copied before their first change
+# after a snapshot.
+COPY_ON_WRITE = (
+    "member_ids",
+    "mentions",
+    "names",
+    "display_names",
+    "member_roles",
+    "online",
+    "online_by_role",
+    "slot_by_id",
+    "slot_by_name",
+    "free_slots",
+    "voice_channel_of",
+    "voice_occupancy",
+    "versions",
+    "trigrams",
+)
+
+
+def is_online(member: discord.Member) -> bool:
+    """Returns whether the member is shown as online, idle or do not disturb."""
+    return getattr(member, "status", discord.Status.offline) != discord.Status.offline
+
+
+class GuildIndex:  # pylint: disable=too-many-instance-attributes,R0904
+    """
+    A compact, render-only copy of the guild cache.
+
+    Members are stored in parallel arrays addressed by a slot number: the member id,
+    the precomputed mention string, the name used by `{member [...]}` and the display
+    name. Role membership is kept in a CSR layout (`role_offsets` + `role_slots`),
+    so all members of a role are a single contiguous slice of an integer array.
+    The CSR part is rebuilt lazily after membership changes, everything else is
+    updated incrementally from gateway events.
+
+    Presence is kept as an online flag per slot and a number of online members per
+    role, both updated in O(roles of the member) on every presence change. Presence
+    changes do not invalidate cached role expressions. Without `presence_tracking`,
+    e.g. when the bot does not receive presence updates, the online flags are
+    stale and the online tokens do not render.
+
+    Voice occupancy is a member -> voice channel mapping with a member count per
+    channel, updated in O(1) on every voice state change.
+
+    With `fuzzy_lookup` enabled, names that do not match exactly are resolved to
+    the most similar name using trigram indexes of member, role and channel names.
+    They are built on first use and then updated together with the names.
+
+    Every kind of change (`members`, `roles`, `channels`, `presence`, `voice`)
+    has its own
+    counter in `versions`, so renders can tell whether anything they depend on
+    changed since the previous one.
+
+    An index loaded from a snapshot (see `bot.index_snapshot`) is not
+    `authoritative` until it has been reconciled with the live member cache.
+
+    Renders work on a `snapshot` of the index, which shares its containers.
+    The index copies a shared container before changing it, so events keep being
+    applied while a render is in progress without the render seeing them.
+
+    Args:
+        guild_id (int): The id of the indexed guild.
+    """
+
+    fuzzy_lookup = False
+    fuzzy_threshold = 0.5
+    presence_tracking = True
+
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self.version = 0
+        self.versions: dict[str, int] = {}
+        self.member_ids = array("Q")
+        self.mentions: list[str] = []
+        self.names: list[str] = []
+        self.display_names: list[str] = []
+        self.member_roles: list[array] = []
+        self.online = bytearray()
+        self.online_by_role: dict[int, int] = {}
+        self.slot_by_id: dict[int, int] = {}
+        self.slot_by_name: dict[str, int] = {}
+        self.free_slots: list[int] = []
+        self.role_names: dict[int, str] = {}
+        self.role_by_name: dict[str, int] = {}
+        self.text_channels: dict[str, int] = {}
+        self.voice_channels: dict[str, int] = {}
+        self.voice_channel_of: dict[int, int] = {}
+        self.voice_occupancy: dict[int, int] = {}
+        self.role_offsets = array("L", [0])
+        self.role_slots = array("L")
+        self.role_rows: dict[int, int] = {}
+        self.csr_dirty = True
+        self.member_bytes = 0
+        self.query_cache: dict[str, tuple[int, object]] = {}
+        self.query_cache_version = 0
+        self.trigrams: Optional[dict[str, TrigramIndex]] = None
+        self.authoritative = True
+        # Containers shared with a snapshot, and the number of snapshots in use.
+        self.shared: set[str] = set()
+        self.snapshots = 0
+
+    @classmethod
+    def from_guild(cls, guild: discord.Guild) -> "GuildIndex":
+        """Builds a complete index from the guild cache.
+
+        Args:
+            guild (`discord.Guild`): A guild with its member cache populated.
+        Returns:
+            GuildIndex: A new index of the guild.
+        """
+        index = cls(guild.id)
+        index.refresh_roles(guild.roles)
+        index.refresh_channels(guild.text_channels, guild.voice_channels)
+        for member in guild.members:
+            index.add_member(member)
+        for channel in guild.voice_channels:
+            for member in channel.members:
+                index.set_voice_channel(member.id, channel.id)
+        return index
+
+    def snapshot(self) -> "GuildIndex":
+        """Returns a copy of the index to render against, in O(1).
+
+        The copy shares all containers with the index until the index changes
+        them, so only the parts changed while the copy is in use are duplicated.
+        The copy itself must not be changed, and is given back with `release`
+        once the render finished."""
+        if self.csr_dirty:
+            self.rebuild_csr()
+        frozen = copy.copy(self)
+        frozen.shared = set()
+        frozen.snapshots = 0
+        self.shared = set(COPY_ON_WRITE)
+        self.snapshots += 1
+        return frozen
+
+    def release(self) -> None:
+        """Marks a snapshot as no longer used. Once no snapshot is in use, the
+        index changes its containers in place again."""
+        self.snapshots = max(self.snapshots - 1, 0)
+        if not self.snapshots:
+            self.shared = set()
+
+    def _own(self, *attributes: str) -> None:
+        """Copies the containers still shared with a snapshot before they are
+        changed."""
+        for attribute in self.shared.intersection(attributes):
+            self.shared.discard(attribute)
+            value = getattr(self, attribute)
+            if attribute == "trigrams" and value is not None:
+                value = {kind: index.copy() for kind, index in value.items()}
+            else:
+                value = copy.copy(value)
+            setattr(self, attribute, value)
+
+    def add_member(self, member: discord.Member) -> None:
+        """Adds a member to the index, or refreshes it if it is already indexed."""
+        slot = self.slot_by_id.get(member.id)
+        if slot is not None:
+            self.update_member(member)
+            return
+        self._own(*COPY_ON_WRITE)
+        name = str(member)
+        role_ids = array("Q", (role.id for role in member.roles))
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.member_ids[slot] = member.id
+            self.mentions[slot] = member.mention
+            self.names[slot] = name
+            self.display_names[slot] = member.display_name
+            self.member_roles[slot] = role_ids
+            self.online[slot] = is_online(member)
+        else:
+            slot = len(self.member_ids)
+            self.member_ids.append(member.id)
+            self.mentions.append(member.mention)
+            self.names.append(name)
+            self.display_names.append(member.display_name)
+            self.member_roles.append(role_ids)
+            self.online.append(is_online(member))
+        if self.online[slot]:
+            self._count_online(role_ids, 1)
+        self.slot_by_id[member.id] = slot
+        self.slot_by_name.setdefault(name, slot)
+        if self.trigrams is not None:
+            self.trigrams["members"].add(slot, name)
+        self.member_bytes += self._slot_bytes(slot)
+        self.csr_dirty = True
+        self.version += 1
+        self.touch("members")
+
+    def remove_member(self, member_id: int) -> None:
+        """Removes a member from the index. The freed slot is reused later."""
+        if member_id not in self.slot_by_id:
+            return
+        self._own(*COPY_ON_WRITE)
+        slot = self.slot_by_id.pop(member_id)
+        if self.slot_by_name.get(self.names[slot]) == slot:
+            del self.slot_by_name[self.names[slot]]
+        self.member_bytes -= self._slot_bytes(slot)
+        if self.online[slot]:
+            self._count_online(self.member_roles[slot], -1)
+            self.online[slot] = 0
+        self.member_ids[slot] = 0
+        self.mentions[slot] = ""
+        self.names[slot] = ""
+        self.display_names[slot] = ""
+        self.member_roles[slot] = array("Q")
+        self.free_slots.append(slot)
+        if self.trigrams is not None:
+            self.trigrams["members"].remove(slot)
+        self.set_voice_channel(member_id, None)
+        self.csr_dirty = True
+        self.version += 1
+        self.touch("members")
+
+    def update_member(self, member: discord.Member) -> None:
+        """Refreshes names and roles of an already indexed member."""
+        slot = self.slot_by_id.get(member.id)
+        if slot is None:
+            self.add_member(member)
+            return
+        self._own("display_names", "member_roles")
+        self.member_bytes -= self._slot_bytes(slot)
+        self.rename_member(slot, str(member))
+        self.display_names[slot] = member.display_name
+        role_ids = array("Q", (role.id for role in member.roles))
+        if role_ids != self.member_roles[slot]:
+            if self.online[slot]:
+                self._count_online(self.member_roles[slot], -1)
+                self._count_online(role_ids, 1)
+            self.member_roles[slot] = role_ids
+            self.csr_dirty = True
+        self.member_bytes += self._slot_bytes(slot)
+        self.version += 1
+        self.touch("members")
+
+    def rename_member(self, slot: int, name: str) -> None:
+        """Changes the name used by `{member [...]}` of the member in `slot`."""
+        if name == self.names[slot]:
+            return
+        self._own("names", "slot_by_name", "trigrams")
+        if self.slot_by_name.get(self.names[slot]) == slot:
+            del self.slot_by_name[self.names[slot]]
+        self.names[slot] = name
+        self.slot_by_name.setdefault(name, slot)
+        if self.trigrams is not None:
+            self.trigrams["members"].add(slot, name)
+        self.version += 1
+        self.touch("members")
+
+    def set_presence(self, member_id: int, online: bool) -> None:
+        """Marks an indexed member as online or offline."""
+        slot = self.slot_by_id.get(member_id)
+        if slot is None or bool(self.online[slot]) == online:
+            return
+        self._own("online")
+        self.online[slot] = online
+        self._count_online(self.member_roles[slot], 1 if online else -1)
+        self.touch("presence")
+
+    def _count_online(self, role_ids: Iterable[int], change: int) -> None:
+        """Adds `change` to the online counters of the roles."""
+        self._own("online_by_role")
+        for role_id in role_ids:
+            self.online_by_role[role_id] = self.online_by_role.get(role_id, 0) + change
+
+    def online_count(self, role_id: int) -> int:
+        """Returns the number of online members with the role."""
+        return self.online_by_role.get(role_id, 0)
+
+    def set_voice_channel(self, member_id: int, channel_id: Optional[int]) -> None:
+        """Moves a member to a voice channel, or out of voice with `None`."""
+        if self.voice_channel_of.get(member_id) == channel_id:
+            return
+        self._own("voice_channel_of", "voice_occupancy")
+        previous = self.voice_channel_of.pop(member_id, None)
+        if previous is not None:
+            self.voice_occupancy[previous] -= 1
+            if not self.voice_occupancy[previous]:
+                del self.voice_occupancy[previous]
+        if channel_id is not None:
+            self.voice_channel_of[member_id] = channel_id
+            self.voice_occupancy[channel_id] = (
+                self.voice_occupancy.get(channel_id, 0) + 1
+            )
+        self.touch("voice")
+
+    def refresh_roles(self, roles: Iterable[discord.Role]) -> None:
+        """Rebuilds role names. The first role with a given name wins, like in
+        `discord.utils.get`."""
+        self.role_names = {}
+        self.role_by_name = {}
+        for role in roles:
+            self.role_names[role.id] = role.name
+            self.role_by_name.setdefault(role.name, role.id)
+        if self.trigrams is not None:
+            self._own("trigrams")
+            self.trigrams["roles"] = self._build_trigrams("roles")
+        self.csr_dirty = True
+        self.version += 1
+        self.touch("roles")
+
+    def refresh_channels(
+        self,
+        text_channels: Iterable[discord.abc.GuildChannel],
+        voice_channels: Iterable[discord.abc.GuildChannel],
+    ) -> None:
+        """Rebuilds text and voice channel names."""
+        self.text_channels = {}
+        self.voice_channels = {}
+        for channel in text_channels:
+            self.text_channels.setdefault(channel.name, channel.id)
+        for channel in voice_channels:
+            self.voice_channels.setdefault(channel.name, channel.id)
+        if self.trigrams is not None:
+            self._own("trigrams")
+            self.trigrams["text_channels"] = self._build_trigrams("text_channels")
+            self.trigrams["voice_channels"] = self._build_trigrams("voice_channels")
+        self.version += 1
+        self.touch("channels")
+
+    def reconcile_member(self, member: discord.Member) -> bool:
+        """Brings an indexed member in line with the live cache.
+
+        Returns:
+            bool: Whether anything about the member changed.
+        """
+        slot = self.slot_by_id.get(member.id)
+        if slot is None:
+            self.add_member(member)
+            return True
+        changed = False
+        if (
+            self.names[slot] != str(member)
+            or self.display_names[slot] != member.display_name
+            or self.member_roles[slot] != array("Q", (role.id for role in member.roles))
+        ):
+            self.update_member(member)
+            changed = True
+        online = is_online(member)
+        if bool(self.online[slot]) != online:
+            self.set_presence(member.id, online)
+            changed = True
+        return changed
+
+    def reconcile_voice(self, voice_channels: Iterable) -> int:
+        """Brings the voice occupancy in line with the live cache.
+
+        Returns:
+            int: The number of members moved.
+        """
+        live = {
+            member.id: channel.id
+            for channel in voice_channels
+            for member in channel.members
+        }
+        moved = 0
+        for member_id in set(self.voice_channel_of) | set(live):
+            if self.voice_channel_of.get(member_id) != live.get(member_id):
+                self.set_voice_channel(member_id, live.get(member_id))
+                moved += 1
+        return moved
+
+    def touch(self, *dependencies: str) -> None:
+        """Records a change of the given kinds of guild state."""
+        self._own("versions")
+        for dependency in dependencies:
+            self.versions[dependency] = self.versions.get(dependency, 0) + 1
+
+    def dependency_stamp(self, dependencies: Iterable[str]) -> tuple:
+        """Returns the versions of the given kinds of guild state; the stamp changes
+        whenever any of them changes. Clock dependencies change every minute
+        or hour."""
+        now = time.time()
+        return tuple(
+            (
+                int(now // CLOCK_DEPENDENCIES[dependency])
+                if dependency in CLOCK_DEPENDENCIES
+                else self.versions.get(dependency, 0)
+            )
+            for dependency in sorted(dependencies)
+        )
+
+    def rebuild_csr(self) -> None:
+        """Rebuilds the role -> member slots CSR arrays from per-member roles."""
+        buckets: dict[int, list[int]] = {role_id: [] for role_id in self.role_names}
+        for slot, role_ids in enumerate(self.member_roles):
+            for role_id in role_ids:
+                bucket = buckets.get(role_id)
+                if bucket is not None:
+                    bucket.append(slot)
+        offsets = array("L", [0])
+        slots = array("L")
+        rows: dict[int, int] = {}
+        for row, (role_id, bucket) in enumerate(buckets.items()):
+            rows[role_id] = row
+            slots.extend(bucket)
+            offsets.append(len(slots))
+        self.role_offsets, self.role_slots, self.role_rows = offsets, slots, rows
+        self.csr_dirty = False
+
+    def role_members(self, role_id: int) -> array:
+        """Returns member slots of the role as a contiguous slice of the CSR."""
+        if self.csr_dirty:
+            self.rebuild_csr()
+        row = self.role_rows.get(role_id)
+        if row is None:
+            return array("L")
+        start, end = self.role_offsets[row], self.role_offsets[row + 1]
+        return self.role_slots[start:end]
+
+    def role_count(self, role_id: int) -> int:
+        """Returns the number of members with the role without copying its slots."""
+        if self.csr_dirty:
+            self.rebuild_csr()
+        row = self.role_rows.get(role_id)
+        if row is None:
+            return 0
+        return self.role_offsets[row + 1] - self.role_offsets[row]
+
+    def all_members(self) -> set[int]:
+        """Returns slots of all indexed members."""
+        return set(self.slot_by_id.values())
+
+    def _build_trigrams(self, kind: str) -> TrigramIndex:
+        """Builds the trigram index of `members`, `roles`, `text_channels` or
+        `voice_channels` names."""
+        trigram_index = TrigramIndex()
+        if kind == "members":
+            names = {slot: self.names[slot] for slot in self.slot_by_id.values()}
+        elif kind == "roles":
+            names = self.role_names
+        else:
+            channels = getattr(self, kind)
+            names = {channel_id: name for name, channel_id in channels.items()}
+        for key, name in names.items():
+            trigram_index.add(key, name)
+        return trigram_index
+
+    def trigram_index(self, kind: str) -> TrigramIndex:
+        """Returns the trigram index of a kind of names, building all of them on
+        first use."""
+        if self.trigrams is None:
+            self.trigrams = {
+                name_kind: self._build_trigrams(name_kind)
+                for name_kind in ("members", "roles", "text_channels", "voice_channels")
+            }
+        return self.trigrams[kind]
+
+    def _find(self, kind: str, exact: dict[str, int], name: str) -> Optional[int]:
+        """Looks a name up exactly, then fuzzily if `fuzzy_lookup` is enabled."""
+        key = exact.get(name)
+        if key is None and self.fuzzy_lookup:
+            matches = self.trigram_index(kind).search(name, 1, self.fuzzy_threshold)
+            if matches:
+                key = matches[0][1]
+        return key
+
+    def has_name(self, kind: str, name: str) -> bool:
+        """Returns whether a name of the given kind matches exactly."""
+        exact = {
+            "members": self.slot_by_name,
+            "roles": self.role_by_name,
+            "text_channels": self.text_channels,
+            "voice_channels": self.voice_channels,
+        }
+        return name in exact[kind]
+
+    def suggest(self, kind: str, name: str, limit: int = 3) -> list[str]:
+        """Returns the names of the given kind most similar to `name`."""
+        trigram_index = self.trigram_index(kind)
+        return [
+            trigram_index.names[key]
+            for _, key in trigram_index.search(name, limit, min_score=0.2)
+        ]
+
+    def find_role(self, role_name: str) -> Optional[int]:
+        """Returns the id of the role with the given name."""
+        return self._find("roles", self.role_by_name, role_name)
+
+    def find_text_channel(self, channel_name: str) -> Optional[int]:
+        """Returns the id of the text channel with the given name."""
+        return self._find("text_channels", self.text_channels, channel_name)
+
+    def find_voice_channel(self, channel_name: str) -> Optional[int]:
+        """Returns the id of the voice channel with the given name."""
+        return self._find("voice_channels", self.voice_channels, channel_name)
+
+    def role_mention(self, role_id: int) -> str:
+        """Returns the mention string of the role, like `discord.Role.mention`."""
+        if role_id == self.guild_id:
+            return "@everyone"
+        return f"<@&{role_id}>"
+
+    def find_member(self, member_name: str) -> Optional[int]:
+        """Returns the slot of the member with the given name."""
+        return self._find("members", self.slot_by_name, member_name)
+
+    def cached_query(self, expression: str) -> Optional[object]:
+        """Returns the cached result of a role expression, if the index did not
+        change since it was computed."""
+        cached = self.query_cache.get(expression)
+        if cached is None or cached[0] != self.version:
+            return None
+        return cached[1]
+
+    def cache_query(self, expression: str, result: object) -> None:
+        """Caches the result of a role expression for the current index version.
+
+        The cache is shared with snapshots, so every result is stored with the
+        version it was computed for. Results of older versions are dropped."""
+        if self.query_cache_version != self.version:
+            for stale in [
+                key
+                for key, (version, _) in self.query_cache.items()
+                if version < self.version
+            ]:
+                del self.query_cache[stale]
+            self.query_cache_version = self.version
+        self.query_cache[expression] = (self.version, result)
+
+    def _slot_bytes(self, slot: int) -> int:
+        """Returns the size of the strings and role array of a single slot."""
+        return (
+            sys.getsizeof(self.mentions[slot])
+            + sys.getsizeof(self.names[slot])
+            + sys.getsizeof(self.display_names[slot])
+            + sys.getsizeof(self.member_roles[slot])
+        )
+
+    def memory_usage(self) -> int:
+        """Returns an estimate of the memory taken by the index, in bytes.
+
+        Per-member strings are accounted incrementally, so the estimate is cheap
+        enough to be read on every stats request."""
+        size = sys.getsizeof(self.member_ids) + self.member_bytes
+        size += sys.getsizeof(self.role_offsets) + sys.getsizeof(self.role_slots)
+        size += sys.getsizeof(self.online)
+        for container in (
+            self.mentions,
+            self.names,
+            self.display_names,
+            self.member_roles,
+        ):
+            size += sys.getsizeof(container)
+        for mapping in (
+            self.slot_by_id,
+            self.slot_by_name,
+            self.role_names,
+            self.role_by_name,
+            self.role_rows,
+            self.online_by_role,
+            self.text_channels,
+            self.voice_channels,
+            self.voice_channel_of,
+            self.voice_occupancy,
+        ):
+            size += sys.getsizeof(mapping)
+        return size
+
+    def bytes_per_member(self) -> float:
+        """Returns the average index memory per member, in bytes."""
+        return self.memory_usage() / max(len(self.slot_by_id), 1)
+
+
+_INDEXES: dict[int, GuildIndex] = {}
+
+
+def get_guild_index(guild: discord.Guild) -> GuildIndex:
+    """Returns the index of the guild, building it from the guild cache if needed.
+
+    Args:
+        guild (`discord.Guild`): The guild to be indexed.
+    Returns:
+        GuildIndex: The index of the guild.
+    """
+    index = _INDEXES.get(guild.id)
+    if index is None:
+        index = GuildIndex.from_guild(guild)
+        _INDEXES[guild.id] = index
+    return index
+
+
+def register_guild_index(index: GuildIndex) -> None:
+    """Makes an index, e.g. one loaded from a snapshot, the index of its guild."""
+    _INDEXES[index.guild_id] = index
+
+
+def guild_indexes() -> list[GuildIndex]:
+    """Returns the indexes of all guilds."""
+    return list(_INDEXES.values())
+
+
+async def reconcile_guild_index(guild: discord.Guild) -> GuildIndex:
+    """Makes the index of a guild match the live cache, requesting the members
+    first if the guild is not chunked yet.
+
+    An index loaded from a snapshot keeps serving renders meanwhile and only
+    the differences are applied, in batches that let other tasks run.
+    Other indexes are rebuilt.
+
+    Args:
+        guild (`discord.Guild`): The guild.
+    Returns:
+        GuildIndex: The authoritative index of the guild.
+    """
+    if not guild.chunked:
+        await guild.chunk()
+    index = _INDEXES.get(guild.id)
+    if index is None or index.authoritative:
+        return rebuild_guild_index(guild)
+    started = time.perf_counter()
+    changed = 0
+    for position, member in enumerate(guild.members, 1):
+        changed += index.reconcile_member(member)
+        if position % RECONCILE_BATCH == 0:
+            await asyncio.sleep(0)
+    # Checked against the cache, not the list above, as members may have joined
+    # while reconciling.
+    removed = [
+        member_id
+        for member_id in index.slot_by_id
+        if guild.get_member(member_id) is None
+    ]
+    for member_id in removed:
+        index.remove_member(member_id)
+    index.refresh_roles(guild.roles)
+    index.refresh_channels(guild.text_channels, guild.voice_channels)
+    moved = index.reconcile_voice(guild.voice_channels)
+    index.authoritative = True
+    logger.info(
+        "Guild index is authoritative.",
+        extra={
+            "event": "index_authoritative",
+            "guild_id": guild.id,
+            "changed": changed,
+            "removed": len(removed),
+            "voice_moved": moved,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        },
+    )
+    return index
+
+
+def rebuild_guild_index(guild: discord.Guild) -> GuildIndex:
+    """Drops the current index of the guild and builds a new one."""
+    _INDEXES[guild.id] = GuildIndex.from_guild(guild)
+    return _INDEXES[guild.id]
+
+
+def indexes_memory_usage() -> int:
+    """Returns the estimated memory taken by all guild indexes, in bytes."""
+    return sum(index.memory_usage() for index in _INDEXES.values())
+
+
+def handle_member_join(member: discord.Member) -> None:
+    """Adds a new member to the index of its guild."""
+    index = _INDEXES.get(member.guild.id)
+    if index is not None:
+        index.add_member(member)
+
+
+def handle_member_remove(member: discord.Member) -> None:
+    """Removes a member that left from the index of its guild."""
+    index = _INDEXES.get(member.guild.id)
+    if index is not None:
+        index.remove_member(member.id)
+
+
+def handle_member_update(member: discord.Member) -> None:
+    """Refreshes nickname and roles of a member."""
+    index = _INDEXES.get(member.guild.id)
+    if index is not None:
+        index.update_member(member)
+
+
+def handle_user_update(user: discord.User) -> None:
+    """Refreshes the username of a user in every index containing it."""
+    for index in _INDEXES.values():
+        slot = index.slot_by_id.get(user.id)
+        if slot is None:
+            continue
+        index.member_bytes -= sys.getsizeof(index.names[slot])
+        index.rename_member(slot, str(user))
+        index.member_bytes += sys.getsizeof(index.names[slot])
+
+
+def handle_roles_change(guild: discord.Guild) -> None:
+    """Refreshes role names after a role was created, edited or deleted."""
+    index = _INDEXES.get(guild.id)
+    if index is not None:
+        index.refresh_roles(guild.roles)
+
+
+def handle_channels_change(guild: discord.Guild) -> None:
+    """Refreshes channel names after a channel was created, edited or deleted."""
+    index = _INDEXES.get(guild.id)
+    if index is not None:
+        index.refresh_channels(guild.text_channels, guild.voice_channels)
+
+
+def handle_presence_update(member: discord.Member) -> None:
+    """Refreshes the online flag of a member after a presence change."""
+    index = _INDEXES.get(member.guild.id)
+    if index is not None:
+        index.set_presence(member.id, is_online(member))
+
+
+def mark_changed(guild_id: int, *dependencies: str) -> None:
+    """Records a change of guild state kept outside the index, e.g. activity."""
+    index = _INDEXES.get(guild_id)
+    if index is not None:
+        index.touch(*dependencies)
+
+
+def handle_voice_state_update(member: discord.Member) -> None:
+    """Moves a member between voice channels in the occupancy table."""
+    index = _INDEXES.get(member.guild.id)
+    if index is not None:
+        channel = member.voice.channel if member.voice else None
+        index.set_voice_channel(member.id, channel.id if channel else None)
@@ -0,0 +1,103 @@
+"""Module containing the text of the `help` menu.
+
+Every section is a list of entries, packed into as many embed fields as needed
+to keep each field within the field value limit of Discord."""
+
+from bot.render import FIELD_VALUE_LIMIT
+
+MORE_INFO = (
+    "*For more in-depth information go to: https://github.com/KNR-PW/discord-bot*"
+)
+
+COMMANDS = [
+    ":small_orange_diamond:`!help | /help` - Info about the bot.",
+    ":small_orange_diamond:`!embed_creator | /embed_creator` - Embed Creator "
+    "(A tool for dynamic embed building).",
+    ":small_orange_diamond:`!embed_update | /embed_update` - "
+    "opens Embed Creator menu and lets you edit last send embed.",
+    ":small_orange_diamond:`!template_export | /template_export` - Sends the "
+    "template library of the server as a file.",
+    ":small_orange_diamond:`!template_import | /template_import` - Adds the "
+    "templates of an exported library file to the library of the server.",
+    ":small_orange_diamond:`!template_delete | /template_delete` - Deletes "
+    "a template from the library of the server.",
+    ":small_orange_diamond:`!guild_snapshot | /guild_snapshot` - Sends "
+    "the roles, channels and members of the server for offline rendering.",
+    ":small_orange_diamond:`!bot_stats | /bot_stats` - Render timings "
+    "and cache statistics of the bot.",
+    ":small_orange_diamond:`!syntax_explain | /syntax_explain` - Shows "
+    "how a template is parsed, evaluated and rendered.",
+    MORE_INFO,
+]
+
+SYNTAX = [
+    "The bot can convert relevant commands in text into valuable information "
+    "when you invoke `/embed_creator` or `!embed_creator` discord commands and "
+    "try to edit either embed description or add and edit a text field. "
+    "When typing the message, commands are recognized inside curly brackets `{}`.",
+    ":small_orange_diamond:`{list_members [...]}` - "
+    "Returns a list of members who have required roles. "
+    "In addition to roles, the text can include "
+    "the logical operators `and`/`or` and `not`.",
+    ":small_orange_diamond:`{count_members [...]}` - Works like list_members, "
+    "but instead of returning names, it returns a number.",
+    ":small_orange_diamond:`{count_trend [...]}` - Works like count_members, "
+    "and adds the change over the last week and a sparkline.",
+    ":small_orange_diamond:`{online_members [...]}`, `{count_online [...]}` - "
+    "Work like list_members and count_members, but only for members who are "
+    "online, idle or do not disturb. Need the `presence_intent` setting.",
+    ":small_orange_diamond:`{role_counts [...]}` - Returns a table with the "
+    "number of members of each role, e.g. `{role_counts A, B by count}` or "
+    "`{role_counts prefix:Team}`.",
+    ":small_orange_diamond:`{member [...]}` - Returns **@Name**.",
+    ":small_orange_diamond:`{role [...]}` - Returns a single **@Role**.",
+    ":small_orange_diamond:`{text_channel [...]}` - Returns **#TextChannel**.",
+    ":small_orange_diamond:`{voice_channel [...]}` - Returns **@VoiceChannel**.",
+    ":small_orange_diamond:`{voice_occupancy [...]}` - Returns the number of "
+    "members in a voice channel. `{voice_total}` counts the members in all "
+    "voice channels.",
+    ":small_orange_diamond:`{messages_1h [...]}`, `{messages_24h [...]}`, "
+    "`{messages_7d [...]}` - Return the number of messages posted in a text "
+    "channel in the last hour, day or week.",
+    ":small_orange_diamond:`{active_posters_24h [...]}`, "
+    "`{active_posters_7d [...]}` - Return the approximate number of members "
+    "who posted in a text channel in the last day or week.",
+    ":small_orange_diamond:`{pinned_count [...]}` - Returns the number of "
+    "pinned messages in a text channel.",
+    ":small_orange_diamond:`{last_message_time [...]}` - Returns the time of "
+    "the last message in a text channel.",
+    ":small_orange_diamond:`{event_attendees [...]}` - Returns the number of "
+    "members interested in a scheduled event.",
+    "**In case of an incorrect argument name in the text, a missing argument, "
+    "or an argument that does not exist, the bot will return `[None]`**.",
+    MORE_INFO,
+]
+
+SECTIONS = {
+    "Commands": ("Discord Commands", COMMANDS),
+    "Message Syntax": ("Message Syntax", SYNTAX),
+}
+
+
+def help_fields(section: str) -> list[tuple[str, str]]:
+    """Returns the (name, value) fields of a section of the help menu.
+
+    Entries are separated by blank lines and never split between fields. The
+    first field is named after the section, the others have an empty name.
+
+    Args:
+        section (str): The option selected in the help menu.
+    Returns:
+        list: The fields, each value at most `FIELD_VALUE_LIMIT` characters.
+    """
+    title, entries = SECTIONS[section]
+    values = [entries[0]]
+    for entry in entries[1:]:
+        if len(values[-1]) + 2 + len(entry) <= FIELD_VALUE_LIMIT:
+            values[-1] += "\n\n" + entry
+        else:
+            values.append(entry)
+    return [
+        (title if number == 0 else "** **", value)
+        for number, value in enumerate(values)
+    ]
@@ -0,0 +1,184 @@
+"""Module keeping the history of values rendered by the auto update.
+
+Values are downsampled to one sample per hour (the last value of the hour). The last
+week of samples is kept in memory in fixed-size arrays; finished hours are appended
+to a per-series file of fixed-width records, which is trimmed to `RETENTION_HOURS`
+records. Loading a series reads only the last week from the end of its file."""
+
+import hashlib
+import os
+import struct
+import time
+from array import array
+from contextvars import ContextVar
+from typing import Optional
+
+RECORD = struct.Struct("<Id")
+WEEK_HOURS = 7 * 24
+# One more slot than hours in a week, so the value of a week ago is kept.
+SLOTS = WEEK_HOURS + 1
+RETENTION_HOURS = 366 * 24
+SPARK_CHARACTERS = "▁▂▃▄▅▆▇█"
+
+# Whether the values rendered now are recorded. Only the auto update sets it, so
+# previews and explanations of a template do not add samples.
+RECORDING: ContextVar[bool] = ContextVar("RECORDING", default=False)
+
+
+class Series:
+    """
+    Hourly samples of a single value.
+
+    Args:
+        path (str): The file of the series, or `None` to keep it in memory only.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.hours = array("q", [-1]) * SLOTS
+        self.values = array("d", [0.0]) * SLOTS
+        self.current_hour = -1
+        # The hour of the last record in the file.
+        self.written_hour = -1
+        if path is not None:
+            self._load_tail()
+
+    def _store(self, hour: int, value: float) -> None:
+        """Puts the sample of an hour into the in-memory week."""
+        slot = hour % SLOTS
+        if self.hours[slot] <= hour:
+            self.hours[slot] = hour
+            self.values[slot] = value
+
+    def _load_tail(self) -> None:
+        """Reads the samples of the last week from the end of the file."""
+        try:
+            with open(self.path, "rb") as series_file:  # type: ignore
+                series_file.seek(0, os.SEEK_END)
+                size = series_file.tell() - series_file.tell() % RECORD.size
+                series_file.seek(max(size - SLOTS * RECORD.size, 0))
+                data = series_file.read(min(size, SLOTS * RECORD.size))
+        except FileNotFoundError:
+            return
+        for hour, value in RECORD.iter_unpack(data):
+            self._store(hour, value)
+            self.written_hour = max(self.written_hour, hour)
+
+    def record(self, value: float, now: float) -> None:
+        """Records the current value. The previous hour is written to disk when
+        the first value of a new hour arrives."""
+        hour = int(now // 3600)
+        if hour != self.current_hour and self.current_hour >= 0:
+            self.flush()
+        self.current_hour = hour
+        self._store(hour, value)
+
+    def flush(self) -> None:
+        """Appends the sample of the current hour to the file.
+
+        An hour that is already the last record, e.g. written on shutdown before
+        a restart within the same hour, is overwritten instead of repeated."""
+        if self.path is None or self.current_hour < max(self.written_hour, 0):
+            return
+        record = RECORD.pack(self.current_hour, self.values[self.current_hour % SLOTS])
+        if self.current_hour == self.written_hour:
+            with open(self.path, "r+b") as series_file:
+                series_file.seek(0, os.SEEK_END)
+                size = series_file.tell() - series_file.tell() % RECORD.size
+                series_file.seek(size - RECORD.size)
+                series_file.write(record)
+            return
+        with open(self.path, "ab") as series_file:
+            series_file.write(record)
+            size = series_file.tell()
+        self.written_hour = self.current_hour
+        if size > 2 * RETENTION_HOURS * RECORD.size:
+            self._trim()
+
+    def _trim(self) -> None:
+        """Rewrites the file with only the last `RETENTION_HOURS` samples."""
+        with open(self.path, "rb") as series_file:  # type: ignore
+            series_file.seek(-RETENTION_HOURS * RECORD.size, os.SEEK_END)
+            data = series_file.read()
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "wb") as series_file:
+            series_file.write(data)
+        os.replace(temporary_path, self.path)  # type: ignore
+
+    def value_at(self, hour: int, oldest: Optional[int] = None) -> Optional[float]:
+        """Returns the last value recorded at or before `hour` and not before
+        `oldest` (default: a week before the current hour), or `None` if there
+        is none."""
+        if oldest is None:
+            oldest = self.current_hour - WEEK_HOURS
+        for past_hour in range(hour, max(oldest, 0) - 1, -1):
+            slot = past_hour % SLOTS
+            if self.hours[slot] == past_hour:
+                return self.values[slot]
+        return None
+
+    def week(self, points: int = 8, hour: Optional[int] = None) -> list[float]:
+        """Returns `points` values evenly spaced over the week before `hour`
+        (default: the current hour), oldest first, leaving out the points before
+        the first sample."""
+        last_hour = self.current_hour if hour is None else hour
+        step = WEEK_HOURS // (points - 1)
+        values = []
+        for point in range(points):
+            hour = last_hour - (points - 1 - point) * step
+            value = self.value_at(hour, last_hour - WEEK_HOURS)
+            if value is not None:
+                values.append(value)
+        return values
+
+
+def sparkline(values: list[float]) -> str:
+    """Renders values as a line of block characters."""
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    if high == low:
+        return SPARK_CHARACTERS[0] * len(values)
+    scale = (len(SPARK_CHARACTERS) - 1) / (high - low)
+    return "".join(SPARK_CHARACTERS[round((v - low) * scale)] for v in values)
+
+
+class HistoryStore:
+    """
+    All recorded series, created on first use.
+
+    Args:
+        directory (str, optional): Where series files are kept. Empty keeps
+        the history in memory only.
+    """
+
+    def __init__(self, directory: str = ""):
+        self.directory = directory
+        self.series: dict[tuple[int, str], Series] = {}
+
+    def get(self, guild_id: int, key: str) -> Series:
+        """Returns the series of a guild identified by `key`, e.g. a role
+        expression."""
+        series = self.series.get((guild_id, key))
+        if series is None:
+            path = None
+            if self.directory:
+                os.makedirs(self.directory, exist_ok=True)
+                digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+                path = os.path.join(self.directory, f"{guild_id}-{digest}.bin")
+            series = self.series[(guild_id, key)] = Series(path)
+        return series
+
+    def record(self, guild_id: int, key: str, value: float) -> Series:
+        """Records the current value of a series and returns the series."""
+        series = self.get(guild_id, key)
+        series.record(value, time.time())
+        return series
+
+    def flush(self) -> None:
+        """Writes the current hour of every series to disk."""
+        for series in self.series.values():
+            series.flush()
+
+
+HISTORY = HistoryStore()
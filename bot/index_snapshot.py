@@ -0,0 +1,276 @@
+"""Module saving guild indexes to compact binary snapshots and loading them back.
+
+A snapshot holds the rendering data of one guild: the member id array, the
+online flags, the roles of every member in CSR form, string tables of member,
+role and channel names, and the voice occupancy. Arrays are stored as packed
+machine integers, so loading maps the file with `mmap` and copies every array
+in a single step instead of parsing it item by item. Mention strings are not
+stored, they are derived from the member ids.
+
+Layout (little-endian): a header, then for every slot the member id (`Q`) and
+online flag (`B`), the end offsets of the member roles (`I`) and role
+ids (`Q`), the member names and display names, the role ids and names, the text
+and voice channel ids and names, and (member id, channel id) voice pairs.
+A string table is its end offsets (`I`) followed by the UTF-8 bytes."""
+
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Iterable
+from discord.ext import tasks
+from bot.guild_index import GuildIndex, guild_indexes
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"BGI1"
+_HEADER = struct.Struct("<4sQIIIII")
+
+
+def _encode_strings(strings: Iterable[str]) -> bytes:
+    """Encodes strings as a string table."""
+    encoded = [string.encode() for string in strings]
+    offsets = array("I")
+    end = 0
+    for data in encoded:
+        end += len(data)
+        offsets.append(end)
+    return _to_little_endian(offsets) + b"".join(encoded)
+
+
+def _to_little_endian(values: array) -> bytes:
+    """Returns the bytes of an array in little-endian order."""
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class _Reader:
+    """Reads arrays and string tables from a mapped snapshot."""
+
+    def __init__(self, data: memoryview):
+        self.data = data
+        self.offset = _HEADER.size
+
+    def take(self, size: int) -> memoryview:
+        """Reads the next `size` bytes.
+
+        Raises:
+            ValueError: If the snapshot ends before them.
+        """
+        end = self.offset + size
+        if end > len(self.data):
+            raise ValueError("Truncated guild index snapshot.")
+        section = self.data[self.offset : end]  # noqa: E203
+        self.offset = end
+        return section
+
+    def array(self, typecode: str, count: int) -> array:
+        """Reads `count` items of an array."""
+        values = array(typecode)
+        values.frombytes(self.take(count * values.itemsize))
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+    def strings(self, count: int) -> list[str]:
+        """Reads a string table of `count` strings."""
+        offsets = self.array("I", count)
+        blob = bytes(self.take(offsets[-1] if count else 0))
+        strings = []
+        start = 0
+        for end in offsets:
+            strings.append(blob[start:end].decode())
+            start = end
+        return strings
+
+
+def save_index_snapshot(index: GuildIndex, path: str) -> None:
+    """Writes the snapshot of an index, replacing the file atomically.
+
+    Args:
+        index (`GuildIndex`): The index to save.
+        path (str): The snapshot file.
+    """
+    role_offsets = array("I", [0])
+    role_ids = array("Q")
+    for roles in index.member_roles:
+        role_ids.extend(roles)
+        role_offsets.append(len(role_ids))
+    role_items = list(index.role_names.items())
+    text_items = list(index.text_channels.items())
+    voice_items = list(index.voice_channels.items())
+    voice_pairs = array("Q")
+    for member_id, channel_id in index.voice_channel_of.items():
+        voice_pairs.extend((member_id, channel_id))
+    parts = [
+        _HEADER.pack(
+            SNAPSHOT_MAGIC,
+            index.guild_id,
+            len(index.member_ids),
+            len(role_items),
+            len(text_items),
+            len(voice_items),
+            len(index.voice_channel_of),
+        ),
+        _to_little_endian(index.member_ids),
+        bytes(index.online),
+        _to_little_endian(role_offsets[1:]),
+        _to_little_endian(role_ids),
+        _encode_strings(index.names),
+        _encode_strings(index.display_names),
+        _to_little_endian(array("Q", (role_id for role_id, _ in role_items))),
+        _encode_strings(name for _, name in role_items),
+        _to_little_endian(array("Q", (channel_id for _, channel_id in text_items))),
+        _encode_strings(name for name, _ in text_items),
+        _to_little_endian(array("Q", (channel_id for _, channel_id in voice_items))),
+        _encode_strings(name for name, _ in voice_items),
+        _to_little_endian(voice_pairs),
+    ]
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as snapshot_file:
+        snapshot_file.writelines(parts)
+    os.replace(temporary_path, path)
+
+
+def load_index_snapshot(path: str) -> GuildIndex:
+    """Loads an index from a snapshot. The index is not authoritative until
+    it is reconciled with the live cache.
+
+    Args:
+        path (str): The snapshot file.
+    Returns:
+        GuildIndex: The index.
+
+    Raises:
+        ValueError: If the file is not a guild index snapshot.
+    """
+    with open(path, "rb") as snapshot_file, mmap.mmap(
+        snapshot_file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as mapped:
+        data = memoryview(mapped)
+        try:
+            return _read_index(data)
+        finally:
+            data.release()
+
+
+def _read_index(data: memoryview) -> GuildIndex:
+    """Builds an index from the bytes of a snapshot."""
+    if len(data) < _HEADER.size:
+        raise ValueError("Not a guild index snapshot.")
+    magic, guild_id, slots, roles, texts, voices, in_voice = _HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Not a guild index snapshot.")
+    fixed_size = (
+        _HEADER.size
+        + slots * (8 + 1 + 4 + 4 + 4)
+        + (roles + texts + voices) * (8 + 4)
+        + in_voice * 16
+    )
+    if fixed_size > len(data):
+        raise ValueError("Truncated guild index snapshot.")
+    reader = _Reader(data)
+    index = GuildIndex(guild_id)
+    index.authoritative = False
+    _read_members(reader, index, slots)
+    index.refresh_roles(_read_named(reader, roles))
+    index.refresh_channels(_read_named(reader, texts), _read_named(reader, voices))
+    voice_pairs = reader.array("Q", 2 * in_voice)
+    for position in range(0, len(voice_pairs), 2):
+        index.set_voice_channel(voice_pairs[position], voice_pairs[position + 1])
+    if reader.offset != len(data):
+        raise ValueError("Guild index snapshot has trailing data.")
+    return index
+
+
+def _read_members(reader: _Reader, index: GuildIndex, slots: int) -> None:
+    """Reads the member slots and rebuilds the lookups derived from them."""
+    index.member_ids = reader.array("Q", slots)
+    index.online = bytearray(reader.take(slots))
+    role_ends = reader.array("I", slots)
+    all_role_ids = reader.array("Q", role_ends[-1] if slots else 0)
+    start = 0
+    for end in role_ends:
+        index.member_roles.append(all_role_ids[start:end])
+        start = end
+    index.names = reader.strings(slots)
+    index.display_names = reader.strings(slots)
+    for slot, member_id in enumerate(index.member_ids):
+        if not member_id:
+            index.mentions.append("")
+            index.free_slots.append(slot)
+            continue
+        index.mentions.append(f"<@{member_id}>")
+        index.slot_by_id[member_id] = slot
+        index.slot_by_name.setdefault(index.names[slot], slot)
+        if index.online[slot]:
+            index._count_online(  # pylint: disable=protected-access
+                index.member_roles[slot], 1
+            )
+        index.member_bytes += index._slot_bytes(  # pylint: disable=protected-access
+            slot
+        )
+    index.touch("members", "presence")
+
+
+def _read_named(reader: _Reader, count: int) -> list["_Named"]:
+    """Reads the ids and names of roles or channels."""
+    ids = reader.array("Q", count)
+    return [
+        _Named(object_id, name) for object_id, name in zip(ids, reader.strings(count))
+    ]
+
+
+class _Named:  # pylint: disable=too-few-public-methods
+    """A role or channel with just an id and a name."""
+
+    def __init__(self, object_id: int, name: str):
+        self.id = object_id
+        self.name = name
+
+
+def save_index_snapshots(directory: str, indexes: Iterable[GuildIndex]) -> int:
+    """Writes the snapshots of all authoritative indexes to a directory.
+
+    Returns:
+        int: The number of snapshots written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    written = 0
+    for index in indexes:
+        if index.authoritative:
+            save_index_snapshot(
+                index, os.path.join(directory, f"{index.guild_id}.index")
+            )
+            written += 1
+    return written
+
+
+def load_index_snapshots(directory: str) -> list[GuildIndex]:
+    """Loads all snapshots of a directory, skipping unreadable ones."""
+    if not directory or not os.path.isdir(directory):
+        return []
+    indexes = []
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith(".index"):
+            continue
+        path = os.path.join(directory, file_name)
+        try:
+            indexes.append(load_index_snapshot(path))
+        except (ValueError, struct.error, UnicodeDecodeError):
+            logger.warning(
+                "Ignoring unreadable guild index snapshot %s.",
+                path,
+                extra={"event": "index_snapshot"},
+            )
+    return indexes
+
+
+@tasks.loop(minutes=10)
+async def checkpoint_indexes(directory: str):
+    """Periodically writes the snapshots of all authoritative indexes."""
+    save_index_snapshots(directory, guild_indexes())
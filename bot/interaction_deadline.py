@@ -0,0 +1,149 @@
+"""Module keeping interactions within Discord's deadline for the first response.
+
+Discord shows "This interaction failed" if an interaction is not answered within
+3 seconds of being created. An `InteractionDeadline` tracks the age of an
+interaction and defers it, so the answer can follow later by editing the
+original response, when:
+
+- a render is predicted to end after `interaction_defer_threshold` seconds,
+  from the average time every token of the templates took so far, or
+- the interaction is still unanswered when the threshold passes.
+
+Otherwise the answer is sent as the first response, saving a request. The time
+to the first response is recorded per command, under stable names such as
+`embed_creator` or `embed_creator.edit_message`; interactions answered without
+an `InteractionDeadline` are recorded with `record_response`."""
+
+import asyncio
+import logging
+from typing import Iterable, Optional
+import discord
+from bot.config_creator import read_setting
+from bot.message_syntax_functions import compile_template
+from bot.metrics import INTERACTION_DEFERS, INTERACTION_RESPONSE_SECONDS, TOKEN_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Seconds assumed per unit of token cost for tokens not rendered yet.
+UNKNOWN_COST_SECONDS = 0.01
+
+
+def interaction_age(interaction: discord.Interaction) -> float:
+    """Returns the seconds since the interaction was created."""
+    age = discord.utils.utcnow() - interaction.created_at
+    return max(age.total_seconds(), 0.0)
+
+
+def record_response(interaction: discord.Interaction, command: str) -> None:
+    """Records the time to the first response of an interaction that was just
+    answered.
+
+    Args:
+        interaction (`discord.Interaction`): The answered interaction.
+        command (str): The name the response time is recorded under.
+    """
+    INTERACTION_RESPONSE_SECONDS.observe(interaction_age(interaction), command=command)
+
+
+def predict_render_seconds(templates: Iterable[str]) -> float:
+    """Predicts the time rendering the templates takes, from the average time
+    of every token so far, or its cost for tokens not rendered yet."""
+    predicted = 0.0
+    for template in templates:
+        for segment in compile_template(template):
+            if isinstance(segment, str):
+                continue
+            mean = TOKEN_SECONDS.mean(token=segment.token_type.name)
+            predicted += (
+                mean
+                if mean is not None
+                else segment.token_type.cost * UNKNOWN_COST_SECONDS
+            )
+    return predicted
+
+
+class InteractionDeadline:
+    """
+    An interaction and the time left for its first response.
+
+    Args:
+        interaction (`discord.Interaction`): The interaction to answer.
+        command (str): The name the response time is recorded under.
+    """
+
+    def __init__(self, interaction: discord.Interaction, command: str):
+        self.interaction = interaction
+        self.command = command
+        self.threshold = float(read_setting("interaction_defer_threshold"))
+        self.lock = asyncio.Lock()
+        self.watchdog: Optional[asyncio.Task] = None
+
+    def age(self) -> float:
+        """Returns the seconds since the interaction was created."""
+        return interaction_age(self.interaction)
+
+    def arm(self) -> None:
+        """Defers the interaction once the threshold passes, unless it was
+        answered by then."""
+        self.watchdog = asyncio.create_task(self._defer_at_threshold())
+
+    async def _defer_at_threshold(self) -> None:
+        await asyncio.sleep(max(self.threshold - self.age(), 0.0))
+        await self.defer("deadline")
+
+    def _disarm(self) -> None:
+        if self.watchdog is not None and self.watchdog is not asyncio.current_task():
+            self.watchdog.cancel()
+
+    def _record(self, reason: Optional[str] = None) -> None:
+        age = self.age()
+        INTERACTION_RESPONSE_SECONDS.observe(age, command=self.command)
+        if reason is not None:
+            INTERACTION_DEFERS.inc(reason=reason)
+            logger.info(
+                "Deferred an interaction to meet the deadline.",
+                extra={
+                    "event": "interaction_deferred",
+                    "command": self.command,
+                    "reason": reason,
+                    "age_ms": round(age * 1000, 1),
+                },
+            )
+
+    async def defer(self, reason: str = "requested") -> None:
+        """Defers the interaction, unless it was already answered."""
+        async with self.lock:
+            if self.interaction.response.is_done():
+                return
+            self._disarm()
+            await self.interaction.response.defer()
+            self._record(reason)
+
+    async def defer_if_slow(self, templates: Iterable[str]) -> bool:
+        """Defers the interaction if rendering the templates is predicted to end
+        after the threshold.
+
+        Returns:
+            bool: Whether the interaction was deferred.
+        """
+        if self.interaction.response.is_done():
+            return False
+        if self.age() + predict_render_seconds(templates) < self.threshold:
+            return False
+        await self.defer("predicted")
+        return True
+
+    async def edit(self, **kwargs) -> None:
+        """Edits the message the interaction came from: as the first response
+        if it was not answered yet, otherwise through the original response.
+
+        Args:
+            **kwargs: The arguments of `discord.InteractionResponse.edit_message`.
+        """
+        async with self.lock:
+            self._disarm()
+            if self.interaction.response.is_done():
+                await self.interaction.edit_original_response(**kwargs)
+                return
+            await self.interaction.response.edit_message(**kwargs)
+            self._record()
@@ -1,10 +1,24 @@
 """Module containing functions for converting text inside the Embed Creator
 messages."""
 
-import discord
-
-
-def find_single_member(ctx, member_name: str) -> str:
+import hashlib
+import time
+from functools import lru_cache, partial
+from typing import Any, Awaitable, Callable, Iterable, NamedTuple, Optional
+from bot.channel_activity import TRACKER
+from bot.guild_index import GuildIndex, get_guild_index
+from bot.history import HISTORY, RECORDING, sparkline
+from bot.metrics import LOOKUP_CACHE, TOKEN_SECONDS
+from bot.query_plan import trace_step
+from bot.rest_tokens import (
+    REST_VALUES,
+    fetch_event_attendees,
+    fetch_last_message_time,
+    fetch_pinned_count,
+)
+
+
+def find_single_member(index: GuildIndex, member_name: str) -> str:
     """Takes the string and returns the corresponding member from the discord server.
 
     The full nickname must be provided and may or may not include the hashtag and
@@ -12,99 +26,163 @@ def find_single_member(ctx, member_name: str) -> str:
     discord nickname system.
 
     Args:
-        ctx (`discord.ext.commands.context.Context`): necessary parameter when
-        accesing discord server data; used by discord.ext.commands.
+        index (`GuildIndex`): The index of the guild to search in.
         member_name (str): A string representing a member to be searched for.
     Returns:
         str: A string with the mentioned username from the discord server.
     """
-    guild = ctx.guild
-    if guild:
-        members = guild.members
-        for member in members:
-            if str(member) == member_name:
-                username = member.mention
-                return username
-    username = "[None]"
-    return username
-
-
-def find_single_role(ctx, rolename: str) -> str:
+    slot = index.find_member(member_name)
+    if slot is not None:
+        return index.mentions[slot]
+    return "[None]"
+
+
+def find_single_role(index: GuildIndex, rolename: str) -> str:
     """Takes the string and returns the corresponding role from the discord server.
 
     Args:
-        ctx (`discord.ext.commands.context.Context`): necessary parameter when
-        accesing discord server data; used by discord.ext.commands.
+        index (`GuildIndex`): The index of the guild to search in.
         rolename (str): A string representing a role to be searched for.
     Returns:
         str: A string with the mentioned role name from the discord server.
     """
-    discord_role = discord.utils.get(ctx.guild.roles, name=f"{rolename}")
-    if discord_role is not None:
-        discord_role = discord_role.mention
-    else:
-        discord_role = "[None]"
-    return discord_role
+    role_id = index.find_role(rolename)
+    if role_id is not None:
+        return index.role_mention(role_id)
+    return "[None]"
 
 
-def find_single_text_channel(ctx, channel_name: str) -> str:
+def find_single_text_channel(index: GuildIndex, channel_name: str) -> str:
     """Takes the string and returns the corresponding text channel from the
     discord server.
 
     Args:
-        ctx (`discord.ext.commands.context.Context`): necessary parameter when
-        accesing discord server data; used by discord.ext.commands.
+        index (`GuildIndex`): The index of the guild to search in.
         channel_name (str): A string representing a text channel name
         to be searched for.
     Returns:
         str: A string with the text channel from the discord server.
     """
-    discord_channel = discord.utils.get(ctx.guild.text_channels, name=f"{channel_name}")
-    if discord_channel is not None:
-        return f"<#{discord_channel.id}>"
+    channel_id = index.find_text_channel(channel_name)
+    if channel_id is not None:
+        return f"<#{channel_id}>"
     return "[None]"
 
 
-def find_single_voice_channel(ctx, channel_name: str) -> str:
+def find_single_voice_channel(index: GuildIndex, channel_name: str) -> str:
     """Takes the string and returns the corresponding voice channel from the
     discord server.
 
     Args:
-        ctx (`discord.ext.commands.context.Context`): necessary parameter when
-        accesing discord server data; used by discord.ext.commands.
+        index (`GuildIndex`): The index of the guild to search in.
         channel_name (str): A string representing a voice channel name
         to be searched for.
     Returns:
         str: A string with the voice channel from the discord server.
     """
-    discord_channel = discord.utils.get(
-        ctx.guild.voice_channels, name=f"{channel_name}"
-    )
-    if discord_channel is not None:
-        return f"<#{discord_channel.id}>"
+    channel_id = index.find_voice_channel(channel_name)
+    if channel_id is not None:
+        return f"<#{channel_id}>"
     return "[None]"
 
 
-def search_for_roles(ctx, separated_names_from_str: list, list_for_names: list) -> list:
-    """Take the list of names and return the list of discord roles.
+def voice_occupancy(index: GuildIndex, channel_name: str) -> str:
+    """Returns the number of members connected to a voice channel.
+
+    Args:
+        index (`GuildIndex`): The index of the guild to search in.
+        channel_name (str): A string representing a voice channel name.
+    Returns:
+        str: A string containing final parsed message.
+    """
+    channel_id = index.find_voice_channel(channel_name)
+    if channel_id is None:
+        return "[None]"
+    return str(index.voice_occupancy.get(channel_id, 0))
+
+
+def voice_total(index: GuildIndex, _: str) -> str:
+    """Returns the number of members connected to any voice channel.
+
+    Args:
+        index (`GuildIndex`): The index of the guild to search in.
+    Returns:
+        str: A string containing final parsed message.
+    """
+    return str(len(index.voice_channel_of))
+
+
+def channel_messages(index: GuildIndex, channel_name: str, window: str) -> str:
+    """Returns the number of messages posted in a text channel in the last
+    `1h`, `24h` or `7d`.
+
+    Args:
+        index (`GuildIndex`): The index of the guild to search in.
+        channel_name (str): A string representing a text channel name.
+        window (str): The time window.
+    Returns:
+        str: A string containing final parsed message.
+    """
+    channel_id = index.find_text_channel(channel_name)
+    if channel_id is None:
+        return "[None]"
+    return str(TRACKER.messages(channel_id, window))
+
+
+def channel_posters(index: GuildIndex, channel_name: str, window: str) -> str:
+    """Returns the approximate number of members who posted in a text channel
+    in the last `24h` or `7d`.
+
+    Args:
+        index (`GuildIndex`): The index of the guild to search in.
+        channel_name (str): A string representing a text channel name.
+        window (str): The time window.
+    Returns:
+        str: A string containing final parsed message.
+    """
+    channel_id = index.find_text_channel(channel_name)
+    if channel_id is None:
+        return "[None]"
+    return str(TRACKER.posters(channel_id, window))
+
+
+def rest_value(index: GuildIndex, argument: str, token: str) -> str:
+    """Returns the last fetched result of a token that needs REST data, or the
+    placeholder if it was not fetched yet.
+
+    Args:
+        index (`GuildIndex`): The index of the guild the token is rendered in.
+        argument (str): The argument of the token.
+        token (str): The name of the token.
+    Returns:
+        str: A string containing final parsed message.
+    """
+    return REST_VALUES.get((index.guild_id, token, argument))
+
+
+def search_for_roles(
+    index: GuildIndex, separated_names_from_str: list, list_for_names: list
+) -> list:
+    """Take the list of names and return the list of discord role ids.
 
     Each name in the list of names is checked for occurrence in the discord server.
     If at least one of the names isn't matched to the roles available
     in the discord server, it returns an empty string, otherwise, a new list of matched
-    roles is generated.
+    role ids is generated.
 
     Args:
-        ctx (`discord.ext.commands.context.Context`): necessary parameter when
-        accesing discord server data; used by discord.ext.commands.
+        index (`GuildIndex`): The index of the guild to search in.
         separated_names_from_str (list): A list of names to be checked for
         compatibility.
     Returns:
-        list: A list of discord roles or an empty list.
+        list: A list of discord role ids or an empty list.
     """
     for role_name in separated_names_from_str:
-        role = discord.utils.get(ctx.guild.roles, name=role_name)
-        if role is not None:
-            list_for_names.append(role)
+        start = time.perf_counter()
+        role_id = index.find_role(role_name)
+        trace_step("resolve", role_name, int(role_id is not None), start)
+        if role_id is not None:
+            list_for_names.append(role_id)
         else:
             list_for_names.clear()
             return list_for_names
@@ -112,14 +190,14 @@ def search_for_roles(ctx, separated_names_from_str: list, list_for_names: list)
 
 
 def create_set_of_roles(
-    ctx,
+    index: GuildIndex,
     message_core_str: str,
     roles: list,
     not_roles: list,
     only_nots_in_str: bool,
 ) -> set:
     """Gets a list of roles and, based on met criteria,
-    passes matching members into a set.
+    passes matching member slots into a set.
 
     Checks the first part of the initial string, split by the "not" operator,
     to see if it contains "and" or " "or" operators. If not, it checks if there was
@@ -129,58 +207,79 @@ def create_set_of_roles(
     Finally, it removes members whose roles had the "not" operator in the message.
 
     Args:
-        ctx (`discord.ext.commands.context.Context`): necessary parameter when
-        accesing discord server data; used by discord.ext.commands.
+        index (`GuildIndex`): The index of the guild to search in.
         message_core_str (str) : A string that may contain roles and logical operators
-        roles (list): A list of roles that may contain "and" or "or" operators.
-        not_roles (list): A list of roles with a "not" operator.
+        roles (list): A list of role ids that may contain "and" or "or" operators.
+        not_roles (list): A list of role ids with a "not" operator.
         only_nots_in_str (bool): A flag that tells if the initial message consists
         solely of "not" operators followed by roles.
     Returns:
-        set: A set of discord server members.
+        set: A set of member slots in the guild index.
     """
     members: set = set()
+    start = time.perf_counter()
     if " and " in message_core_str:
         for role in roles:
             if not members:  # start if members is empty
-                members.update(role.members)
+                members.update(index.role_members(role))
+                trace_step("start", role, len(members), start)
             else:
-                members &= set(role.members)
+                members.intersection_update(index.role_members(role))
+                trace_step("and", role, len(members), start)
+            start = time.perf_counter()
     elif " or " in message_core_str:
         for role in roles:
-            members.update(role.members)
+            members.update(index.role_members(role))
+            trace_step("or", role, len(members), start)
+            start = time.perf_counter()
     elif only_nots_in_str is False:  # only one positive role
         role = roles[0]
-        members.update(role.members)
+        members.update(index.role_members(role))
+        trace_step("start", role, len(members), start)
     else:  # only negative roles
-        members = set(ctx.guild.members)
+        members = index.all_members()
+        trace_step("all members", "", len(members), start)
 
     for not_role in not_roles:
-        members -= set(not_role.members)
+        start = time.perf_counter()
+        members.difference_update(index.role_members(not_role))
+        trace_step("not", not_role, len(members), start)
     return members
 
 
-def role_searching_core(ctx, message_core_str: str) -> set | str:
-    """Analyzes the message, breaks it down into smaller fragments,
-    and creates a list of roles.
+class RoleExpression(NamedTuple):
+    """A role expression split into role names by its logical operators.
+
+    Attributes:
+        text (str): The whole expression, used as the lookup cache key.
+        message_core_str (str): The part before the first "not" operator.
+        role_names (list): Names joined by "and" or "or"; empty if only_nots.
+        not_role_names (list): Names following "not", or `None` without "not".
+        only_nots (bool): Whether the expression consists solely of "not" operators.
+    """
+
+    text: str
+    message_core_str: str
+    role_names: list
+    not_role_names: Optional[list]
+    only_nots: bool
+
+
+def parse_role_expression(message_core_str: str) -> RoleExpression:
+    """Splits a role expression into role names using the logical operators.
 
     Splits a text message into potential roles using the logical "not" operators
-    as a dividing line. Calls a subfunction and checks if any roles presenton the
-    server are next to "not". Then it does the same for the "and" or "or" operators.
-    Creates role lists for each operator. If there are any errors in the message,
-    it returns a text message. In the last step, it calls a subfunction that creates
-    the final list of all roles corresponding to the logical sentence.
+    as a dividing line, then does the same for the "and" or "or" operators.
+    Parsing does not touch the guild, so the result is cached with the template.
 
     Args:
-        ctx (`discord.ext.commands.context.Context`): necessary parameter when
-        accesing discord server data; used by discord.ext.commands.
         message_core_str (str): A string that may contain roles and logical operators
     Returns:
-        set: A set of discord server members.
-        str: A string containing final parsed message.
+        RoleExpression: The names of the roles next to each operator.
     """
+    text = message_core_str
     only_nots_in_str = False
-    roles: list = []
+    not_role_names_list = None
     if "not " in message_core_str:
         if message_core_str.startswith("not "):
             role_names_str = message_core_str.replace(" ", "")
@@ -194,142 +293,685 @@ def role_searching_core(ctx, message_core_str: str) -> set | str:
         else:
             # two types of operations
             role_names_list = message_core_str.split(" not ")
-            only_nots_in_str = False
             not_role_names_list = [
                 role for role in role_names_list[1:] if " not " not in role
             ]
-        not_roles: list = []
-        not_roles = search_for_roles(ctx, not_role_names_list, not_roles)
-        if not not_roles:
-            final_converted_str = "[None]"
-            return final_converted_str
         message_core_str = role_names_list[0]
-    else:
-        not_roles = []
 
+    role_names_list = []
     if only_nots_in_str is False:
         role_names_list = (
             message_core_str.split(" and ")
             if " and " in message_core_str
             else message_core_str.split(" or ")
         )
-        roles = []
-        roles = search_for_roles(ctx, role_names_list, roles)
-        if not roles:
-            final_converted_str = "[None]"
-            return final_converted_str
+    return RoleExpression(
+        text, message_core_str, role_names_list, not_role_names_list, only_nots_in_str
+    )
+
+
+def evaluate_role_expression(
+    index: GuildIndex, expression: RoleExpression
+) -> set | str:
+    """Resolves the role names of a parsed expression and creates the set of
+    matching members.
 
-    members = create_set_of_roles(
-        ctx, message_core_str, roles, not_roles, only_nots_in_str
+    If any of the roles is missing from the server, it returns a text message.
+
+    Args:
+        index (`GuildIndex`): The index of the guild to search in.
+        expression (RoleExpression): The parsed role expression.
+    Returns:
+        set: A set of member slots in the guild index.
+        str: A string containing final parsed message.
+    """
+    not_roles: list = []
+    if expression.not_role_names is not None:
+        not_roles = search_for_roles(index, expression.not_role_names, not_roles)
+        if not not_roles:
+            return "[None]"
+    roles: list = []
+    if expression.only_nots is False:
+        roles = search_for_roles(index, expression.role_names, roles)
+        if not roles:
+            return "[None]"
+    return create_set_of_roles(
+        index, expression.message_core_str, roles, not_roles, expression.only_nots
     )
-    return members
 
 
-def count_members(ctx, message_core_str: str) -> str:
-    """Gets a string. Returns either a string with a number of members or a message.
+def role_searching_core(index: GuildIndex, expression: RoleExpression) -> set | str:
+    """Returns the members matching a role expression, answering repeated
+    expressions from the cache of the guild index.
 
-    Calls a subfunction. Checks whether the returned variable is a string or a list.
-    If it's the latter, it combines the list's items into one string.
-    Finally, it returns the resulting string.
+    Args:
+        index (`GuildIndex`): The index of the guild to search in.
+        expression (RoleExpression): The parsed role expression.
+    Returns:
+        set: A set of member slots in the guild index.
+        str: A string containing final parsed message.
+    """
+    start = time.perf_counter()
+    cached = index.cached_query(expression.text)
+    if cached is not None:
+        LOOKUP_CACHE.inc(result="hit")
+        trace_step("cached", expression.text, len(cached), start)
+        return cached
+    LOOKUP_CACHE.inc(result="miss")
+    result = evaluate_role_expression(index, expression)
+    index.cache_query(expression.text, result)
+    return result
+
+
+def count_members(index: GuildIndex, expression: RoleExpression) -> str:
+    """Gets a role expression. Returns either a string with a number of members
+    or a message.
 
     Args:
-        ctx (`discord.ext.commands.context.Context`): necessary parameter when
-        accesing discord server data; used by discord.ext.commands.
-        message_core_str (str): A string that may contain roles and logical operators
+        index (`GuildIndex`): The index of the guild to search in.
+        expression (RoleExpression): The parsed role expression.
     Returns:
         str: A string containing final parsed message.
     """
-    members_set_or_message_str = role_searching_core(ctx, message_core_str)
+    members_set_or_message_str = role_searching_core(index, expression)
     if isinstance(members_set_or_message_str, str):
-        final_converted_str = members_set_or_message_str
-    else:
-        members = members_set_or_message_str
-        num_members = len(members)
-        final_converted_str = str(num_members)
-    return final_converted_str
+        return members_set_or_message_str
+    return str(len(members_set_or_message_str))
+
+
+def list_members(index: GuildIndex, expression: RoleExpression) -> str:
+    """Gets a role expression. Returns either a string with members names
+    or a message.
+
+    Args:
+        index (`GuildIndex`): The index of the guild to search in.
+        expression (RoleExpression): The parsed role expression.
+    Returns:
+        str: A string containing final parsed message.
+    """
+    members_set_or_message_str = role_searching_core(index, expression)
+    if isinstance(members_set_or_message_str, str):
+        return members_set_or_message_str
+    mentions = index.mentions
+    members_list = [mentions[slot] for slot in sorted(members_set_or_message_str)]
+    return ", ".join(members_list)
 
 
-def list_members(ctx, message_core_str: str) -> str:
-    """Gets a string. Returns either a string with members names or a message.
+def count_trend(index: GuildIndex, expression: RoleExpression) -> str:
+    """Gets a role expression. Returns the number of members with its change over
+    the last week and a sparkline, e.g. `412 (+7 this week) ▁▂▃▅▇`.
 
-    Calls a subfunction. Checks whether the returned variable is a string or a list.
-    If it's the latter, it combines the list's items into one string.
-    Finally, it returns the resulting string.
+    The count is recorded in the history when the token is rendered by the auto
+    update; other renders, e.g. previews, only show it as the latest point. It is
+    taken from the same cached lookup as `count_members`, so recording costs no
+    extra scan.
 
     Args:
-        ctx (`discord.ext.commands.context.Context`): necessary parameter when
-        accesing discord server data; used by discord.ext.commands.
-        message_core_str (str): A string that may contain roles and logical operators
+        index (`GuildIndex`): The index of the guild to search in.
+        expression (RoleExpression): The parsed role expression.
     Returns:
         str: A string containing final parsed message.
     """
-    members_set_or_message_str = role_searching_core(ctx, message_core_str)
+    count = count_members(index, expression)
+    if not count.isdigit():
+        return count
+    now = time.time()
+    series = HISTORY.get(index.guild_id, expression.text)
+    if RECORDING.get():
+        series.record(int(count), now)
+    week = series.week(hour=int(now // 3600))
+    week[-1:] = [int(count)]
+    change = int(week[-1] - week[0])
+    return f"{count} ({change:+d} this week) {sparkline(week)}"
+
+
+def online_members_set(index: GuildIndex, expression: RoleExpression) -> set | str:
+    """Returns the online members matching a role expression.
+
+    Args:
+        index (`GuildIndex`): The index of the guild to search in.
+        expression (RoleExpression): The parsed role expression.
+    Returns:
+        set: A set of member slots in the guild index.
+        str: A string containing final parsed message.
+    """
+    if not index.presence_tracking:
+        return "[None]"
+    members_set_or_message_str = role_searching_core(index, expression)
     if isinstance(members_set_or_message_str, str):
-        final_converted_str = members_set_or_message_str
+        return members_set_or_message_str
+    start = time.perf_counter()
+    online = index.online
+    members = {slot for slot in members_set_or_message_str if online[slot]}
+    trace_step("online", "", len(members), start)
+    return members
+
+
+def count_online(index: GuildIndex, expression: RoleExpression) -> str:
+    """Gets a role expression. Returns the number of online members or a message.
+
+    A single role is answered from the online counter of the role, other
+    expressions filter the members of the expression by their online flag.
+    Without presence tracking the result is "[None]".
+
+    Args:
+        index (`GuildIndex`): The index of the guild to search in.
+        expression (RoleExpression): The parsed role expression.
+    Returns:
+        str: A string containing final parsed message.
+    """
+    if (
+        index.presence_tracking
+        and expression.not_role_names is None
+        and len(expression.role_names) == 1
+    ):
+        start = time.perf_counter()
+        role_id = index.find_role(expression.role_names[0])
+        if role_id is None:
+            trace_step("resolve", expression.role_names[0], 0, start)
+            return "[None]"
+        count = index.online_count(role_id)
+        trace_step("online counter", role_id, count, start)
+        return str(count)
+    members_set_or_message_str = online_members_set(index, expression)
+    if isinstance(members_set_or_message_str, str):
+        return members_set_or_message_str
+    return str(len(members_set_or_message_str))
+
+
+def online_members(index: GuildIndex, expression: RoleExpression) -> str:
+    """Gets a role expression. Returns the names of online members or a message.
+
+    Args:
+        index (`GuildIndex`): The index of the guild to search in.
+        expression (RoleExpression): The parsed role expression.
+    Returns:
+        str: A string containing final parsed message.
+    """
+    members_set_or_message_str = online_members_set(index, expression)
+    if isinstance(members_set_or_message_str, str):
+        return members_set_or_message_str
+    mentions = index.mentions
+    members_list = [mentions[slot] for slot in sorted(members_set_or_message_str)]
+    return ", ".join(members_list)
+
+
+class RoleCountsQuery(NamedTuple):
+    """The parsed argument of the `role_counts` token.
+
+    Attributes:
+        role_names (list): Names of the roles to count, in the given order.
+        prefix (str): If not `None`, all roles starting with it are counted instead.
+        by_count (bool): Whether to sort the rows by count, largest first.
+    """
+
+    role_names: list
+    prefix: Optional[str]
+    by_count: bool
+
+
+def parse_role_counts(message_core_str: str) -> RoleCountsQuery:
+    """Parses `Role A, Role B` or `prefix:Team`, optionally followed by `by count`.
+
+    Args:
+        message_core_str (str): The argument of the `role_counts` token.
+    Returns:
+        RoleCountsQuery: The roles to count and the requested order.
+    """
+    by_count = message_core_str.endswith(" by count")
+    message_core_str = message_core_str.removesuffix(" by count")
+    if message_core_str.startswith("prefix:"):
+        return RoleCountsQuery([], message_core_str.removeprefix("prefix:"), by_count)
+    role_names = [name.strip() for name in message_core_str.split(",")]
+    return RoleCountsQuery(role_names, None, by_count)
+
+
+def role_counts(index: GuildIndex, query: RoleCountsQuery) -> str:
+    """Returns a table with the number of members of each role.
+
+    All counts are read from the role membership arrays of the guild index,
+    which are built in a single pass over the members, so the table costs
+    the same as one `count_members` no matter how many roles it lists.
+    The table is a code block so its columns stay aligned.
+
+    Args:
+        index (`GuildIndex`): The index of the guild to search in.
+        query (RoleCountsQuery): The parsed argument of the token.
+    Returns:
+        str: A string containing final parsed message.
+    """
+    if query.prefix is not None:
+        roles = [
+            role_id
+            for role_id, name in index.role_names.items()
+            if name.startswith(query.prefix) and role_id != index.guild_id
+        ]
     else:
-        members_set = members_set_or_message_str
-        members_list = []
-        for member in members_set:
-            members_list.append(member.mention)
-        member_names = ", ".join(member for member in members_list)
-        final_converted_str = member_names
-    return final_converted_str
+        roles = search_for_roles(index, query.role_names, [])
+    if not roles:
+        return "[None]"
+    rows = [(index.role_names[role_id], index.role_count(role_id)) for role_id in roles]
+    if query.by_count:
+        rows.sort(key=lambda row: row[1], reverse=True)
+    name_width = max(len(name) for name, _ in rows)
+    count_width = max(len(str(count)) for _, count in rows)
+    lines = [f"{name:<{name_width}}  {count:>{count_width}}" for name, count in rows]
+    return "```\n" + "\n".join(lines) + "\n```"
+
+
+class TokenType(NamedTuple):
+    """A token type usable inside curly brackets.
+
+    Attributes:
+        name (str): The first word of the token, e.g. `count_members`.
+        evaluator (Callable): Called with the guild index and the parsed argument,
+        returns the rendered text.
+        parser (Callable): Turns the argument text into the value passed to the
+        evaluator. It must not read the guild, as its result is cached.
+        depends_on (frozenset): Parts of the guild state the result depends on,
+        e.g. `members`, `roles` or `channels`.
+        cost (float): Relative evaluation cost; 1 is a role expression scan.
+        takes_argument (bool): Whether the name is followed by an argument.
+        references (Callable): Returns the (kind, name) pairs of the member, role
+        and channel names in the parsed argument, used for suggestions.
+        fetcher (Callable): For tokens that need REST data, an async function
+        called with the guild and the parsed argument. The evaluator then only
+        reads its last result, see `bot.rest_tokens`.
+        ttl (float): Seconds the result of the fetcher is reused for.
+    """
 
+    name: str
+    evaluator: Callable[[GuildIndex, Any], str]
+    parser: Callable[[str], Any]
+    depends_on: frozenset
+    cost: float
+    takes_argument: bool
+    references: Optional[Callable[[Any], list[tuple[str, str]]]] = None
+    fetcher: Optional[Callable[[Any, Any], Awaitable[str]]] = None
+    ttl: float = 0.0
+
+
+TOKEN_TYPES: dict[str, TokenType] = {}
+
+
+def register_token(  # pylint: disable=too-many-arguments
+    name: str,
+    *,
+    parser: Callable[[str], Any] = str,
+    depends_on: Iterable[str] = (),
+    cost: float = 1.0,
+    takes_argument: bool = True,
+    references: Optional[Callable[[Any], list[tuple[str, str]]]] = None,
+    fetcher: Optional[Callable[[Any, Any], Awaitable[str]]] = None,
+    ttl: float = 60.0,
+) -> Callable:
+    """Decorator registering the decorated function as the evaluator of a token.
 
-def convert_string(ctx, input_string: str) -> str:
-    """Searches for the functional field in a string and based on the condition,
-    passes it to the other functions.
+    Args:
+        name (str): The first word of the token.
+        parser (Callable, optional): Parses the argument text. Default keeps the text.
+        depends_on (Iterable, optional): Parts of the guild state the token reads.
+        cost (float, optional): Relative evaluation cost. Default is 1.
+        takes_argument (bool, optional): Whether the token has an argument.
+        references (Callable, optional): Lists the names in the parsed argument.
+        fetcher (Callable, optional): Fetches the REST data of the token.
+        ttl (float, optional): Seconds a fetched result is reused. Default is 60.
+    Returns:
+        Callable: The decorator, returning the function unchanged.
+    """
+
+    def decorator(evaluator: Callable[[GuildIndex, Any], str]) -> Callable:
+        TOKEN_TYPES[name] = TokenType(
+            name,
+            evaluator,
+            parser,
+            frozenset(depends_on),
+            cost,
+            takes_argument,
+            references,
+            fetcher,
+            ttl,
+        )
+        compile_template.cache_clear()
+        return evaluator
+
+    return decorator
+
+
+class CompiledToken(NamedTuple):
+    """A token of a compiled template with its argument already parsed."""
+
+    token_type: TokenType
+    argument: str
+    parsed: Any
+
+
+# Compiled templates restored from the on-disk cache (see `bot.template_cache`),
+# keyed by `template_digest`. Tokens are stored as (name, argument, parsed).
+PRECOMPILED: dict[bytes, tuple] = {}
+
+
+def template_digest(input_string: str) -> bytes:
+    """Returns the digest identifying a template in the compiled cache."""
+    return hashlib.blake2b(input_string.encode(), digest_size=16).digest()
+
+
+def restore_compiled(stored: tuple) -> Optional[tuple[str | CompiledToken, ...]]:
+    """Turns a stored compiled template back into segments, or returns `None`
+    if one of its tokens is no longer registered."""
+    segments: list[str | CompiledToken] = []
+    for segment in stored:
+        if isinstance(segment, str):
+            segments.append(segment)
+            continue
+        name, argument, parsed = segment
+        token_type = TOKEN_TYPES.get(name)
+        if token_type is None:
+            return None
+        segments.append(CompiledToken(token_type, argument, parsed))
+    return tuple(segments)
 
-    Gets a message string. Searches for "{" and "}" each representing the beginning
-    and end of the text to be parsed. Everything inside the braces ("{}")
-    is assigned to the new variable. In the next step, the text inside the variable
-    is checked to see if it starts with the correct string. If so, the text inside
-    the variable is shortened by the length of the part being checked and assigned
-    to the next variable, and the appropriate function is called. Finally, the function
-    returns the result of the subfunction, which is text.
+
+@lru_cache(maxsize=256)
+def split_template(input_string: str) -> tuple[tuple[bool, str], ...]:
+    """Splits a message into plain text and the stripped contents of curly brackets.
+
+    The result depends only on the message, so it is cached and templates
+    re-rendered by the auto update are scanned only once.
 
     Args:
-        ctx (`discord.ext.commands.context.Context`): necessary parameter when
-        accesing discord server data; used by discord.ext.commands.
         input_string (str): A string that may contain curly brackets (`{}`)
     Returns:
-        str: A string containing final parsed message.
+        tuple: Pairs of (is_token, text) in the order they appear in the message.
     """
-    output_string = ""
-    start_index = 0
+    segments = []
     end_index = 0
-    while start_index < len(input_string):
+    while True:
         start_index = input_string.find("{", end_index)
         if start_index == -1:
-            output_string += input_string[end_index:]
+            segments.append((False, input_string[end_index:]))
             break
-        output_string += input_string[end_index:start_index]
+        segments.append((False, input_string[end_index:start_index]))
         end_index = input_string.find("}", start_index)
         if end_index == -1:
-            output_string += input_string[start_index:]
+            segments.append((False, input_string[start_index:]))
             break
         edited_string = input_string[start_index + 1 : end_index]  # noqa: E203
-        function_string = edited_string.strip()
-        if function_string.startswith("list_members "):
-            message_core_str = function_string[13:]
-            final_converted_str = list_members(ctx, message_core_str)
-        elif function_string.startswith("count_members "):
-            message_core_str = function_string[14:]
-            final_converted_str = count_members(ctx, message_core_str)
-        elif function_string.startswith("role "):
-            message_core_str = function_string[5:]
-            final_converted_str = find_single_role(ctx, message_core_str)
-        elif function_string.startswith("member "):
-            message_core_str = function_string[7:]
-            final_converted_str = find_single_member(ctx, message_core_str)
-        elif function_string.startswith("text_channel "):
-            message_core_str = function_string[13:]
-            final_converted_str = find_single_text_channel(ctx, message_core_str)
-        elif function_string.startswith("voice_channel "):
-            message_core_str = function_string[14:]
-            final_converted_str = find_single_voice_channel(ctx, message_core_str)
-        else:
-            final_converted_str = "{" + function_string + "}"
-        output_string += final_converted_str
+        segments.append((True, edited_string.strip()))
         end_index += 1
-    return output_string
+    return tuple(segment for segment in segments if segment[0] or segment[1])
+
+
+@lru_cache(maxsize=256)
+def compile_template(input_string: str) -> tuple[str | CompiledToken, ...]:
+    """Splits a message and looks up and parses all of its tokens.
+
+    Dispatch is a single dictionary lookup on the first word of each token.
+    Tokens that are not registered, or lack their argument, are kept as text.
+    Registering a token clears this cache. Templates found in the compiled
+    cache loaded at startup are not parsed again.
+
+    Args:
+        input_string (str): A string that may contain curly brackets (`{}`)
+    Returns:
+        tuple: Plain text and `CompiledToken` segments in message order.
+    """
+    if PRECOMPILED:
+        stored = PRECOMPILED.get(template_digest(input_string))
+        restored = restore_compiled(stored) if stored is not None else None
+        if restored is not None:
+            return restored
+    segments: list[str | CompiledToken] = []
+    for is_token, text in split_template(input_string):
+        if not is_token:
+            segments.append(text)
+            continue
+        name, separator, argument = text.partition(" ")
+        token_type = TOKEN_TYPES.get(name)
+        if token_type is None or bool(separator) != token_type.takes_argument:
+            segments.append("{" + text + "}")
+            continue
+        segments.append(
+            CompiledToken(token_type, argument, token_type.parser(argument))
+        )
+    return tuple(segments)
+
+
+def template_dependencies(templates: Iterable[str]) -> frozenset:
+    """Returns the parts of the guild state the tokens of the templates read."""
+    dependencies: set[str] = set()
+    for template in templates:
+        for segment in compile_template(template):
+            if not isinstance(segment, str):
+                dependencies.update(segment.token_type.depends_on)
+    return frozenset(dependencies)
+
+
+def rest_tokens(templates: Iterable[str]) -> list[CompiledToken]:
+    """Returns the distinct tokens of the templates that need REST data."""
+    tokens: dict[tuple, CompiledToken] = {}
+    for template in templates:
+        for segment in compile_template(template):
+            if not isinstance(segment, str) and segment.token_type.fetcher:
+                tokens[(segment.token_type.name, segment.argument)] = segment
+    return list(tokens.values())
+
+
+def single_reference(argument: str, kind: str) -> list[tuple[str, str]]:
+    """Returns the argument of a token as a single name of the given kind."""
+    return [(kind, argument)]
+
+
+def role_expression_references(expression: RoleExpression) -> list[tuple[str, str]]:
+    """Returns the role names of a parsed role expression."""
+    names = expression.role_names + (expression.not_role_names or [])
+    return [("roles", name) for name in names]
+
+
+def role_counts_references(query: RoleCountsQuery) -> list[tuple[str, str]]:
+    """Returns the role names listed in a `role_counts` token."""
+    return [("roles", name) for name in query.role_names]
+
+
+def suggest_corrections(ctx, input_string: str) -> list[str]:
+    """Lists the names in a message that do not exist in the discord server,
+    each with the most similar existing names.
+
+    Args:
+        ctx (`discord.ext.commands.context.Context`): necessary parameter when
+        accesing discord server data; used by discord.ext.commands.
+        input_string (str): A string that may contain curly brackets (`{}`)
+    Returns:
+        list: One line per unknown name, e.g. "`Moderatr` → Moderator".
+    """
+    guild = getattr(ctx, "guild", None)
+    if not guild:
+        return []
+    index = get_guild_index(guild)
+    hints: list[str] = []
+    for segment in compile_template(input_string):
+        if isinstance(segment, str) or segment.token_type.references is None:
+            continue
+        for kind, name in segment.token_type.references(segment.parsed):
+            if index.has_name(kind, name):
+                continue
+            suggestions = index.suggest(kind, name)
+            hint = f"`{name}` → " + (
+                ", ".join(suggestions) if suggestions else "no similar names"
+            )
+            if hint not in hints:
+                hints.append(hint)
+    return hints
+
+
+def render_template(
+    index: Optional[GuildIndex],
+    input_string: str,
+    timings: Optional[list[tuple[CompiledToken, float]]] = None,
+) -> str:
+    """Renders a message against a guild index.
+
+    Args:
+        index (`GuildIndex`): The index of the guild, or `None` outside a guild,
+        in which case every token renders as "[None]".
+        input_string (str): A string that may contain curly brackets (`{}`)
+        timings (list, optional): If given, a (token, seconds) pair is appended
+        for every token rendered.
+    Returns:
+        str: A string containing final parsed message.
+    """
+    output = []
+    for segment in compile_template(input_string):
+        if isinstance(segment, str):
+            output.append(segment)
+            continue
+        token_start = time.perf_counter()
+        if index is None:
+            output.append("[None]")
+        else:
+            output.append(segment.token_type.evaluator(index, segment.parsed))
+        token_time = time.perf_counter() - token_start
+        TOKEN_SECONDS.observe(token_time, token=segment.token_type.name)
+        if timings is not None:
+            timings.append((segment, token_time))
+    return "".join(output)
+
+
+def convert_string(ctx, input_string: str) -> str:
+    """Searches for the functional fields in a string and replaces them with
+    the data of the discord server.
+
+    Args:
+        ctx (`discord.ext.commands.context.Context`): necessary parameter when
+        accesing discord server data; used by discord.ext.commands.
+        input_string (str): A string that may contain curly brackets (`{}`)
+    Returns:
+        str: A string containing final parsed message.
+    """
+    guild = getattr(ctx, "guild", None)
+    index = get_guild_index(guild) if guild else None
+    return render_template(index, input_string)
+
+
+register_token(
+    "list_members",
+    parser=parse_role_expression,
+    depends_on=("members", "roles"),
+    references=role_expression_references,
+)(list_members)
+register_token(
+    "count_members",
+    parser=parse_role_expression,
+    depends_on=("members", "roles"),
+    references=role_expression_references,
+)(count_members)
+register_token(
+    "count_trend",
+    parser=parse_role_expression,
+    depends_on=("members", "roles", "hour"),
+    references=role_expression_references,
+)(count_trend)
+register_token(
+    "online_members",
+    parser=parse_role_expression,
+    depends_on=("members", "roles", "presence"),
+    references=role_expression_references,
+)(online_members)
+register_token(
+    "count_online",
+    parser=parse_role_expression,
+    depends_on=("members", "roles", "presence"),
+    references=role_expression_references,
+)(count_online)
+register_token(
+    "role_counts",
+    parser=parse_role_counts,
+    depends_on=("members", "roles"),
+    references=role_counts_references,
+)(role_counts)
+register_token(
+    "role",
+    depends_on=("roles",),
+    cost=0.05,
+    references=partial(single_reference, kind="roles"),
+)(find_single_role)
+register_token(
+    "member",
+    depends_on=("members",),
+    cost=0.05,
+    references=partial(single_reference, kind="members"),
+)(find_single_member)
+register_token(
+    "text_channel",
+    depends_on=("channels",),
+    cost=0.05,
+    references=partial(single_reference, kind="text_channels"),
+)(find_single_text_channel)
+register_token(
+    "voice_channel",
+    depends_on=("channels",),
+    cost=0.05,
+    references=partial(single_reference, kind="voice_channels"),
+)(find_single_voice_channel)
+register_token(
+    "voice_occupancy",
+    depends_on=("channels", "voice"),
+    cost=0.05,
+    references=partial(single_reference, kind="voice_channels"),
+)(voice_occupancy)
+register_token("voice_total", depends_on=("voice",), cost=0.05, takes_argument=False)(
+    voice_total
+)
+register_token(
+    "messages_1h",
+    depends_on=("channels", "activity", "minute"),
+    cost=0.05,
+    references=partial(single_reference, kind="text_channels"),
+)(partial(channel_messages, window="1h"))
+register_token(
+    "messages_24h",
+    depends_on=("channels", "activity", "hour"),
+    cost=0.05,
+    references=partial(single_reference, kind="text_channels"),
+)(partial(channel_messages, window="24h"))
+register_token(
+    "messages_7d",
+    depends_on=("channels", "activity", "hour"),
+    cost=0.05,
+    references=partial(single_reference, kind="text_channels"),
+)(partial(channel_messages, window="7d"))
+register_token(
+    "active_posters_24h",
+    depends_on=("channels", "activity", "hour"),
+    cost=0.1,
+    references=partial(single_reference, kind="text_channels"),
+)(partial(channel_posters, window="24h"))
+register_token(
+    "active_posters_7d",
+    depends_on=("channels", "activity", "hour"),
+    cost=0.1,
+    references=partial(single_reference, kind="text_channels"),
+)(partial(channel_posters, window="7d"))
+register_token(
+    "pinned_count",
+    depends_on=("channels", "rest"),
+    cost=0.05,
+    references=partial(single_reference, kind="text_channels"),
+    fetcher=fetch_pinned_count,
+    ttl=300.0,
+)(partial(rest_value, token="pinned_count"))
+register_token(
+    "last_message_time",
+    depends_on=("channels", "rest"),
+    cost=0.05,
+    references=partial(single_reference, kind="text_channels"),
+    fetcher=fetch_last_message_time,
+    ttl=60.0,
+)(partial(rest_value, token="last_message_time"))
+register_token(
+    "event_attendees",
+    depends_on=("rest",),
+    cost=0.05,
+    fetcher=fetch_event_attendees,
+    ttl=120.0,
+)(partial(rest_value, token="event_attendees"))
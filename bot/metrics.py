@@ -0,0 +1,371 @@
+"""Module containing the instrumentation layer of the bot: counters, histograms and
+a local HTTP endpoint exposing them in the Prometheus text format."""
+
+import asyncio
+import functools
+import logging
+import time
+from bisect import bisect_left
+from typing import Callable, Optional
+
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+REGISTRY: list = []
+
+
+class Counter:
+    """
+    A monotonically increasing value, optionally split by labels.
+
+    Args:
+        name (str): The metric name.
+        description (str): The help text of the metric.
+    """
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.values: dict[tuple, float] = {}
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """Increases the counter with the given labels by `amount`."""
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def total(self) -> float:
+        """Returns the sum of the counter over all labels."""
+        return sum(self.values.values())
+
+    def expose(self) -> list[str]:
+        """Returns the metric in the Prometheus text format."""
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} counter",
+        ]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """
+    A distribution of observed values with fixed bucket boundaries.
+
+    Args:
+        name (str): The metric name.
+        description (str): The help text of the metric.
+        buckets (tuple, optional): Upper bounds of the buckets, in ascending order.
+    """
+
+    def __init__(
+        self, name: str, description: str, buckets: tuple = DEFAULT_BUCKETS
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.values: dict[tuple, list] = {}
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Records a single value with the given labels."""
+        key = tuple(sorted(labels.items()))
+        series = self.values.get(key)
+        if series is None:
+            series = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def mean(self, **labels: str) -> Optional[float]:
+        """Returns the mean of the values observed with the given labels, or
+        `None` if there are none."""
+        series = self.values.get(tuple(sorted(labels.items())))
+        return series[1] / series[2] if series else None
+
+    def expose(self) -> list[str]:
+        """Returns the metric in the Prometheus text format."""
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                labels = _format_labels(key + (("le", f"{bound}"),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Gauge:
+    """
+    A single value that can go up and down.
+
+    Args:
+        name (str): The metric name.
+        description (str): The help text of the metric.
+    """
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.value = 0.0
+        REGISTRY.append(self)
+
+    def set(self, value: float) -> None:
+        """Sets the gauge to `value`."""
+        self.value = value
+
+    def expose(self) -> list[str]:
+        """Returns the metric in the Prometheus text format."""
+        return [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {self.value:g}",
+        ]
+
+
+class RollingHistogram:
+    """
+    Bucket counts of the values observed in the last `window` minutes.
+
+    Values are counted per minute in a ring of per-minute bucket arrays. The totals
+    over the whole window are kept up to date when a minute is added or expires,
+    so reading a percentile never touches the ring.
+
+    Args:
+        buckets (tuple, optional): Upper bounds of the buckets, in ascending order.
+        window (int, optional): Length of the window in minutes. Default is 60.
+    """
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS, window: int = 60):
+        self.buckets = buckets
+        self.window = window
+        self.ring = [[0] * (len(buckets) + 1) for _ in range(window)]
+        self.totals = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.minute = int(time.monotonic() // 60)
+
+    def _advance(self) -> None:
+        """Expires the minutes that fell out of the window."""
+        minute = int(time.monotonic() // 60)
+        for expired in range(
+            self.minute + 1, min(minute, self.minute + self.window) + 1
+        ):
+            counts = self.ring[expired % self.window]
+            for i, count in enumerate(counts):
+                self.totals[i] -= count
+                self.count -= count
+                counts[i] = 0
+        self.minute = minute
+
+    def observe(self, value: float) -> None:
+        """Records a single value."""
+        self._advance()
+        bucket = bisect_left(self.buckets, value)
+        self.ring[self.minute % self.window][bucket] += 1
+        self.totals[bucket] += 1
+        self.count += 1
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        """Returns the estimated percentile (e.g. `0.95`) of the window, linearly
+        interpolated inside the matching bucket, or `None` without observations."""
+        self._advance()
+        if self.count == 0:
+            return None
+        rank = fraction * self.count
+        cumulative = 0
+        for i, count in enumerate(self.totals):
+            if count and cumulative + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+
+class RollingCounter:
+    """
+    A sum of the values added in the last `window` minutes.
+
+    Args:
+        window (int, optional): Length of the window in minutes. Default is 60.
+    """
+
+    def __init__(self, window: int = 60):
+        self.window = window
+        self.ring = [0.0] * window
+        self.total = 0.0
+        self.minute = int(time.monotonic() // 60)
+
+    def _advance(self) -> None:
+        """Expires the minutes that fell out of the window."""
+        minute = int(time.monotonic() // 60)
+        for expired in range(
+            self.minute + 1, min(minute, self.minute + self.window) + 1
+        ):
+            self.total -= self.ring[expired % self.window]
+            self.ring[expired % self.window] = 0.0
+        self.minute = minute
+
+    def add(self, value: float) -> None:
+        """Adds `value` to the current minute."""
+        self._advance()
+        self.ring[self.minute % self.window] += value
+        self.total += value
+
+    def sum(self) -> float:
+        """Returns the sum over the window."""
+        self._advance()
+        return self.total
+
+
+def _format_labels(key: tuple) -> str:
+    """Formats label pairs as `{name="value",...}`."""
+    if not key:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in key)
+    return "{" + pairs + "}"
+
+
+TOKEN_SECONDS = Histogram(
+    "bot_token_render_seconds", "Time spent converting a single syntax token."
+)
+EMBED_RENDER_SECONDS = Histogram(
+    "bot_embed_render_seconds", "Time spent rendering a whole embed, per guild."
+)
+EMBED_EDITS = Counter("bot_embed_edits_total", "Embed edits sent or skipped.")
+RATE_LIMITS = Counter("bot_rate_limits_total", "HTTP 429 responses received.")
+RATE_LIMIT_SECONDS = Counter(
+    "bot_rate_limit_retry_after_seconds_total", "Total retry-after of HTTP 429s."
+)
+SCHEDULER_LAG_SECONDS = Histogram(
+    "bot_scheduler_lag_seconds", "Delay of the auto update against its schedule."
+)
+CONFIG_IO_SECONDS = Histogram(
+    "bot_config_io_seconds", "Time spent reading or writing config.ini."
+)
+LAST_TICK_SECONDS = Gauge(
+    "bot_last_tick_seconds", "Duration of the last auto update tick."
+)
+LOOKUP_CACHE = Counter(
+    "bot_lookup_cache_total", "Role expression lookups answered from the cache."
+)
+INTERACTION_RESPONSE_SECONDS = Histogram(
+    "bot_interaction_first_response_seconds",
+    "Time from an interaction to its first response.",
+)
+INTERACTION_DEFERS = Counter(
+    "bot_interaction_defers_total", "Interactions deferred to meet the deadline."
+)
+RENDER_WINDOW = RollingHistogram()
+RATE_LIMIT_WINDOW = RollingCounter()
+
+
+def timed(histogram: Histogram) -> Callable:
+    """Decorator recording the duration of every call in the histogram,
+    labelled with the name of the decorated function."""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, operation=func.__name__)
+
+        return wrapper
+
+    return decorator
+
+
+class RateLimitHandler(logging.Handler):
+    """
+    A logging handler counting the 429 responses reported by `discord.http`.
+
+    discord.py retries rate limited requests on its own and only logs a warning,
+    so the warning is the one place where the retry-after value can be read.
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if "responded with 429" not in str(record.msg) or not record.args:
+            return
+        retry_after = float(record.args[-1])  # type: ignore
+        RATE_LIMITS.inc()
+        RATE_LIMIT_SECONDS.inc(retry_after)
+        RATE_LIMIT_WINDOW.add(retry_after)
+
+
+def install_rate_limit_hook() -> None:
+    """Attaches `RateLimitHandler` to the `discord.http` logger."""
+    logger = logging.getLogger("discord.http")
+    if not any(isinstance(h, RateLimitHandler) for h in logger.handlers):
+        logger.addHandler(RateLimitHandler(logging.WARNING))
+
+
+def render_prometheus() -> str:
+    """Returns all registered metrics in the Prometheus text format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
+
+
+async def _handle_request(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    """Answers a single HTTP request with the metrics page."""
+    request_line = await reader.readline()
+    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+        pass
+    parts = request_line.decode("latin-1").split()
+    if len(parts) >= 2 and parts[0] == "GET" and parts[1] in ("/", "/metrics"):
+        body = render_prometheus().encode()
+        status = "200 OK"
+    else:
+        body = b"Not Found\n"
+        status = "404 Not Found"
+    writer.write(
+        f"HTTP/1.1 {status}\r\n"
+        "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    writer.close()
+
+
+async def start_metrics_server(
+    port: int, host: str = "127.0.0.1"
+) -> Optional[asyncio.AbstractServer]:
+    """Starts the metrics endpoint on the given local port.
+
+    Args:
+        port (int): The port to listen on. `0` keeps the endpoint disabled.
+        host (str, optional): The address to bind to. Defaults to localhost.
+    Returns:
+        asyncio.AbstractServer: The running server, or `None` when disabled.
+    """
+    if port <= 0:
+        return None
+    return await asyncio.start_server(_handle_request, host, port)
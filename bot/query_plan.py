@@ -0,0 +1,47 @@
+"""Module recording the steps of evaluating role expressions for `/syntax_explain`.
+
+The role expression functions report every step with `trace_step`. Outside an
+explanation `QUERY_PLAN` is unset and a step costs a single context variable
+lookup."""
+
+import time
+from contextvars import ContextVar
+from typing import Any, NamedTuple, Optional
+
+
+class PlanStep(NamedTuple):
+    """A step of evaluating a role expression, recorded for `/syntax_explain`.
+
+    Attributes:
+        operation (str): What the step did, e.g. `resolve`, `and` or `not`.
+        operand (str): The role name or id the step worked on.
+        size (int): The number of members after the step, or of resolved roles.
+        seconds (float): The time the step took.
+    """
+
+    operation: str
+    operand: str
+    size: int
+    seconds: float
+
+
+# The steps of the render being explained, or `None` while rendering normally.
+QUERY_PLAN: ContextVar[Optional[list[PlanStep]]] = ContextVar(
+    "QUERY_PLAN", default=None
+)
+
+
+def trace_step(operation: str, operand: Any, size: int, start: float) -> None:
+    """Records a step of the render being explained, if any.
+
+    Args:
+        operation (str): What the step did.
+        operand: The role name or id the step worked on.
+        size (int): The number of members after the step.
+        start (float): The `time.perf_counter()` the step started at.
+    """
+    plan = QUERY_PLAN.get()
+    if plan is not None:
+        plan.append(
+            PlanStep(operation, str(operand), size, time.perf_counter() - start)
+        )
@@ -0,0 +1,105 @@
+"""Offline renderer of templates against a guild snapshot.
+
+Renders a template with the same engine as the Embed Creator, without connecting
+to Discord, and prints the result, the time taken by every token and the length
+of the result against the embed limits. Snapshots are described in
+`bot.snapshot`; `/guild_snapshot` exports one from a live server.
+
+Usage:
+    python -m bot.render guild.json "{count_members Member}"
+    python -m bot.render guild.json --file template.txt --field --repeat 100
+    echo "{list_members Lead}" | python -m bot.render guild.json -
+"""
+
+import argparse
+import sys
+from bot.guild_index import GuildIndex
+from bot.message_syntax_functions import CompiledToken, render_template
+from bot.snapshot import load_snapshot
+
+# Maximum lengths of embed parts, in characters.
+DESCRIPTION_LIMIT = 4096
+FIELD_VALUE_LIMIT = 1024
+EMBED_LIMIT = 6000
+
+
+def token_statistics(
+    timings: list[tuple[CompiledToken, float]],
+) -> list[tuple[str, int, float]]:
+    """Sums the timings of every token.
+
+    Returns:
+        list: (token text, renders, total seconds) rows, slowest first.
+    """
+    totals: dict[str, list] = {}
+    for token, seconds in timings:
+        text = f"{token.token_type.name} {token.argument}".strip()
+        row = totals.setdefault(text, [0, 0.0])
+        row[0] += 1
+        row[1] += seconds
+    rows = [(text, count, total) for text, (count, total) in totals.items()]
+    return sorted(rows, key=lambda row: row[2], reverse=True)
+
+
+def format_report(output: str, timings: list, limit: int, part: str) -> str:
+    """Formats the token timings and the size of the output."""
+    lines = []
+    rows = token_statistics(timings)
+    if rows:
+        width = max(len("token"), *(len(text) for text, _, _ in rows))
+        lines.append(f"{'token':<{width}}  renders  total ms  mean ms")
+        for text, count, total in rows:
+            lines.append(
+                f"{text:<{width}}  {count:>7}  {total * 1000:>8.3f}"
+                f"  {total * 1000 / count:>7.3f}"
+            )
+        lines.append("")
+    size = len(output)
+    status = "ok" if size <= limit else f"over the limit by {size - limit}"
+    lines.append(f"size: {size} / {limit} characters ({part}), {status}")
+    if size > EMBED_LIMIT:
+        lines.append(f"the whole embed can have at most {EMBED_LIMIT} characters")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    """Parses command line arguments and renders the template."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("snapshot", help="a JSON or gzip-compressed snapshot file")
+    parser.add_argument("template", nargs="?", help="the template, or - for stdin")
+    parser.add_argument("--file", help="read the template from a file")
+    parser.add_argument(
+        "--field", action="store_true", help="check against the field value limit"
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="renders to time")
+    parser.add_argument(
+        "--fuzzy", action="store_true", help="resolve names like fuzzy_lookup"
+    )
+    args = parser.parse_intermixed_args()
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as template_file:
+            template = template_file.read()
+    elif args.template in (None, "-"):
+        template = sys.stdin.read()
+    else:
+        template = args.template
+    GuildIndex.fuzzy_lookup = args.fuzzy
+    index = GuildIndex.from_guild(load_snapshot(args.snapshot))  # type: ignore
+    timings: list[tuple[CompiledToken, float]] = []
+    output = ""
+    for _ in range(max(args.repeat, 1)):
+        output = render_template(index, template, timings)
+    limit, part = (
+        (FIELD_VALUE_LIMIT, "field value")
+        if args.field
+        else (DESCRIPTION_LIMIT, "description")
+    )
+    print(output)
+    print()
+    print(format_report(output, timings, limit, part))
+    sys.exit(0 if len(output) <= limit else 1)
+
+
+if __name__ == "__main__":
+    main()
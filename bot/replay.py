@@ -0,0 +1,315 @@
+"""Offline load test of the auto update pipeline.
+
+Replays a recorded or synthetic stream of gateway events (member joins and
+removals, role changes, channel renames) against a fake guild cache, feeding them
+to the same handlers the bot uses and running `refresh_message` on a simulated
+15 second schedule. Edits go to a recording stand-in instead of Discord.
+
+Usage:
+    python -m bot.replay --members 5000 --events 20000
+    python -m bot.replay --record events.jsonl --events 1000
+    python -m bot.replay --input events.jsonl
+    python -m bot.replay --snapshot guild.json --events 1000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+from typing import Iterable, Iterator, Optional
+import discord
+from bot.embed_updates import AUTO_UPDATE_SECONDS, refresh_message
+from bot.snapshot import (
+    FakeChannel,
+    FakeContext,
+    FakeGuild,
+    FakeMember,
+    FakeRole,
+    load_snapshot,
+)
+from bot.guild_index import (
+    handle_channels_change,
+    handle_member_join,
+    handle_member_remove,
+    handle_member_update,
+    rebuild_guild_index,
+)
+
+DEFAULT_TEMPLATE = (
+    "Members: {count_members Member}\n"
+    "Team 0: {count_members Team 0 and Member}\n"
+    "Without a team: {count_members Member not Team 0 not Team 1}\n"
+    "Leads: {list_members Lead}\n"
+    "Channel: {text_channel general}"
+)
+
+
+class RecordingMessage:  # pylint: disable=too-few-public-methods
+    """
+    A stand-in for the message managed by the auto update, recording every edit
+    payload instead of sending it.
+
+    Args:
+        message_id (int): The id of the fake message.
+    """
+
+    def __init__(self, message_id: int):
+        self.id = message_id
+        self.edits: list[tuple[float, dict]] = []
+
+    async def edit(self, *, embed: discord.Embed) -> "RecordingMessage":
+        """Records the payload of the edit with the wall-clock time."""
+        self.edits.append((time.perf_counter(), {"embed": embed.to_dict()}))
+        return self
+
+
+def create_synthetic_guild(
+    members: int, teams: int, seed: int = 0, guild_id: int = 1
+) -> FakeGuild:
+    """Creates a fake guild with `Member`, `Lead` and `Team N` roles."""
+    rng = random.Random(seed)
+    guild = FakeGuild(guild_id)
+    member_role = FakeRole(10, "Member", guild)
+    lead_role = FakeRole(11, "Lead", guild)
+    team_roles = [FakeRole(100 + i, f"Team {i}", guild) for i in range(teams)]
+    guild.roles.extend([member_role, lead_role, *team_roles])
+    guild.text_channels.append(FakeChannel(20, "general", guild))
+    guild.voice_channels.append(FakeChannel(21, "lab", guild))
+    for i in range(members):
+        roles = [guild.default_role, member_role, rng.choice(team_roles)]
+        if rng.random() < 0.02:
+            roles.append(lead_role)
+        member_id = 1000 + i
+        guild.members_by_id[member_id] = FakeMember(
+            member_id, f"user{member_id}", guild, roles
+        )
+    return guild
+
+
+def generate_events(
+    guild: FakeGuild, count: int, rate: float, seed: int = 0
+) -> Iterator[dict]:
+    """Generates a synthetic event stream with exponentially distributed gaps.
+
+    Joining members get the `Member` role, if the guild has one, and members
+    move between the `Team N` roles, or between all roles of a guild without
+    teams, e.g. one loaded from a snapshot.
+
+    Args:
+        guild (FakeGuild): The guild the events refer to.
+        count (int): Number of events.
+        rate (float): Average number of events per simulated second.
+        seed (int, optional): Seed of the random generator.
+    Yields:
+        dict: Events in the same format as the recorded JSON lines.
+
+    Raises:
+        ValueError: If the guild has no roles besides @everyone.
+    """
+    rng = random.Random(seed)
+    role_ids = [role.id for role in guild.roles if role is not guild.default_role]
+    if not role_ids:
+        raise ValueError("The guild has no roles to assign besides @everyone.")
+    team_ids = [
+        role.id for role in guild.roles if role.name.startswith("Team ")
+    ] or role_ids
+    base_roles = [role.id for role in guild.roles if role.name == "Member"][:1]
+    channel = guild.text_channels[0] if guild.text_channels else None
+    member_ids = list(guild.members_by_id)
+    next_member_id = max(member_ids, default=1000) + 1
+    now = 0.0
+    for _ in range(count):
+        now += rng.expovariate(rate)
+        kind = rng.random()
+        if kind < 0.2 or not member_ids:
+            member_ids.append(next_member_id)
+            yield {
+                "t": now,
+                "type": "member_join",
+                "member": next_member_id,
+                "name": f"user{next_member_id}",
+                "roles": base_roles + [rng.choice(team_ids)],
+            }
+            next_member_id += 1
+        elif kind < 0.35:
+            member_id = member_ids.pop(rng.randrange(len(member_ids)))
+            yield {"t": now, "type": "member_remove", "member": member_id}
+        elif kind < 0.95 or channel is None:
+            yield {
+                "t": now,
+                "type": "role_change",
+                "member": rng.choice(member_ids),
+                "add": [rng.choice(team_ids)],
+                "remove": [rng.choice(team_ids)],
+            }
+        else:
+            yield {
+                "t": now,
+                "type": "channel_rename",
+                "channel": channel.id,
+                "name": rng.choice([channel.name, f"{channel.name}-chat"]),
+            }
+
+
+def load_events(path: str) -> Iterator[dict]:
+    """Reads events stored as JSON lines."""
+    with open(path, encoding="utf-8") as events_file:
+        for line in events_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def apply_event(guild: FakeGuild, event: dict) -> None:
+    """Applies an event to the fake cache and passes it to the bot's handler."""
+    kind = event["type"]
+    if kind == "member_join":
+        roles = [guild.default_role] + [
+            role for role in map(guild.role, event["roles"]) if role is not None
+        ]
+        member = FakeMember(event["member"], event["name"], guild, roles)
+        guild.members_by_id[member.id] = member
+        handle_member_join(member)  # type: ignore
+    elif kind == "member_remove":
+        member = guild.members_by_id.pop(event["member"], None)
+        if member is not None:
+            handle_member_remove(member)  # type: ignore
+    elif kind == "role_change":
+        member = guild.members_by_id.get(event["member"])
+        if member is not None:
+            removed = set(event["remove"]) - set(event["add"])
+            roles = [role for role in member.roles if role.id not in removed]
+            for role_id in event["add"]:
+                role = guild.role(role_id)
+                if role is not None and role not in roles:
+                    roles.append(role)
+            member.roles = roles
+            handle_member_update(member)  # type: ignore
+    elif kind == "channel_rename":
+        for channel in guild.text_channels + guild.voice_channels:
+            if channel.id == event["channel"]:
+                channel.name = event["name"]
+        handle_channels_change(guild)  # type: ignore
+
+
+class Replayer:  # pylint: disable=too-many-instance-attributes
+    """
+    Replays events against a fake guild and runs the auto update every `interval`
+    simulated seconds, collecting latency, CPU and edit statistics.
+
+    Args:
+        guild (FakeGuild): The fake guild cache.
+        template (str): The template of the embed description.
+        interval (float): Simulated seconds between two auto updates.
+    """
+
+    def __init__(self, guild: FakeGuild, template: str, interval: float):
+        self.guild = guild
+        self.template = template
+        self.interval = interval
+        self.message = RecordingMessage(1)
+        self.embed = discord.Embed(title="Replay")
+        self.latencies: list[float] = []
+        self.pending: list[float] = []
+        self.cpu_time = 0.0
+        self.event_count = 0
+
+    async def tick(self, simulated_now: float) -> None:
+        """Runs one auto update; events applied before it count as delivered
+        if it sent an edit."""
+        ctx = FakeContext(self.guild)
+        started = time.perf_counter()
+        result = await refresh_message(
+            self.message, self.embed, ctx, self.template, []  # type: ignore
+        )
+        if result == "sent":
+            elapsed = time.perf_counter() - started
+            self.latencies.extend(simulated_now - t + elapsed for t in self.pending)
+        self.pending.clear()
+
+    async def run(self, events: Iterable[dict]) -> dict:
+        """Replays the events.
+
+        Returns:
+            dict: The measured statistics.
+        """
+        rebuild_guild_index(self.guild)  # type: ignore
+        tracemalloc.start()
+        memory_start = tracemalloc.get_traced_memory()[0]
+        tick_at = self.interval
+        await self.tick(0.0)
+        for event in events:
+            while event["t"] >= tick_at:
+                await self.tick(tick_at)
+                tick_at += self.interval
+            cpu_start = time.process_time()
+            apply_event(self.guild, event)
+            self.cpu_time += time.process_time() - cpu_start
+            self.pending.append(event["t"])
+            self.event_count += 1
+        await self.tick(tick_at)
+        memory_end, memory_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.latencies.sort()
+        minutes = max(tick_at / 60, 1 / 60)
+        edits = len(self.message.edits)
+        return {
+            "events": self.event_count,
+            "simulated_minutes": round(minutes, 2),
+            "edits": edits,
+            "edits_per_minute": round(edits / minutes, 2),
+            "latency_p50_s": _percentile(self.latencies, 0.5),
+            "latency_p95_s": _percentile(self.latencies, 0.95),
+            "cpu_per_event_us": round(
+                self.cpu_time / max(self.event_count, 1) * 1e6, 2
+            ),
+            "memory_growth_kib": round((memory_end - memory_start) / 1024, 1),
+            "memory_peak_kib": round(memory_peak / 1024, 1),
+        }
+
+
+def _percentile(values: list[float], fraction: float) -> Optional[float]:
+    """Returns the percentile of sorted values, or `None` if there are none."""
+    if not values:
+        return None
+    return round(values[min(int(fraction * len(values)), len(values) - 1)], 3)
+
+
+def main() -> None:
+    """Parses command line arguments and runs the replay."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=2000)
+    parser.add_argument("--teams", type=int, default=30)
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--rate", type=float, default=5.0, help="events/second")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--input", help="replay events from a JSON lines file")
+    parser.add_argument("--record", help="write the generated events to a file")
+    parser.add_argument("--template", default=DEFAULT_TEMPLATE)
+    parser.add_argument("--snapshot", help="use the guild of a snapshot file")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        guild = load_snapshot(args.snapshot)
+    else:
+        guild = create_synthetic_guild(args.members, args.teams, args.seed)
+    if args.input:
+        events: Iterable[dict] = load_events(args.input)
+    else:
+        if all(role is guild.default_role for role in guild.roles):
+            parser.error("the guild has no roles to assign besides @everyone")
+        events = generate_events(guild, args.events, args.rate, args.seed)
+        if args.record:
+            events = list(events)
+            with open(args.record, "w", encoding="utf-8") as record_file:
+                record_file.writelines(json.dumps(event) + "\n" for event in events)
+    replayer = Replayer(guild, args.template, AUTO_UPDATE_SECONDS)
+    stats = asyncio.run(replayer.run(events))
+    for key, value in stats.items():
+        print(f"{key:>20}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+"""Local stand-in for the subset of the Discord REST API used by the bot.
+
+Implements login, channel and message fetches, message sends, edits and deletes,
+interaction responses and command sync, with Discord-like rate limit headers and
+429 responses. Point the bot at it with the `api_base_url` setting, or run the
+bundled benchmark, which talks to it through the same discord.py HTTP client and
+the same `refresh_message` the auto update uses.
+
+The stand-in does not implement the gateway websocket, so a full `main.py` run
+can't log in against it; the benchmark uses a REST-only client instead.
+
+Usage:
+    python -m bot.rest_stub serve --port 8750
+    python -m bot.rest_stub bench --edits 50 --channels 5
+    python -m bot.rest_stub bench --no-limits
+"""
+
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import time
+from typing import Optional
+import discord
+from aiohttp import web
+from bot.embed_updates import refresh_message
+from bot.metrics import RATE_LIMITS, RATE_LIMIT_SECONDS, install_rate_limit_hook
+
+API_PREFIX = "/api/v10"
+BOT_USER = {
+    "id": "1",
+    "username": "stub-bot",
+    "discriminator": "0",
+    "global_name": None,
+    "avatar": None,
+    "bot": True,
+}
+# (limit, window in seconds) per route group, close to what Discord applies.
+ROUTE_LIMITS = {
+    "message_send": (5, 5.0),
+    "message_edit": (5, 5.0),
+    "message_delete": (5, 1.0),
+    "default": (50, 1.0),
+}
+
+
+def _json_response(data, status: int = 200) -> web.Response:
+    """Creates a JSON response with a bare `application/json` content type,
+    which is what discord.py checks for before decoding the body."""
+    return web.Response(
+        body=json.dumps(data).encode(),
+        status=status,
+        headers={"Content-Type": "application/json"},
+    )
+
+
+class RateLimiter:  # pylint: disable=too-few-public-methods
+    """
+    Fixed-window rate limiter producing Discord's rate limit headers.
+
+    Args:
+        enabled (bool, optional): `False` lets every request through. Default True.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.windows: dict[tuple[str, str], tuple[float, int]] = {}
+        self.limited = 0
+
+    def check(self, group: str, major: str) -> tuple[Optional[float], dict]:
+        """Counts a request against its bucket.
+
+        Returns:
+            tuple: The retry-after in seconds (or `None` if allowed) and headers.
+        """
+        limit, window = ROUTE_LIMITS.get(group, ROUTE_LIMITS["default"])
+        now = time.monotonic()
+        started, used = self.windows.get((group, major), (now, 0))
+        if now - started >= window:
+            started, used = now, 0
+        reset_after = max(window - (now - started), 0.0)
+        headers = {
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Reset": f"{time.time() + reset_after:.3f}",
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            "X-RateLimit-Bucket": f"{group}-{major}",
+        }
+        if not self.enabled:
+            headers["X-RateLimit-Remaining"] = str(limit)
+            return None, headers
+        if used >= limit:
+            self.limited += 1
+            headers["X-RateLimit-Remaining"] = "0"
+            headers["X-RateLimit-Scope"] = "user"
+            headers["Retry-After"] = f"{reset_after:.3f}"
+            return reset_after, headers
+        self.windows[(group, major)] = (started, used + 1)
+        headers["X-RateLimit-Remaining"] = str(max(limit - used - 1, 0))
+        return None, headers
+
+
+class RestStub:
+    """
+    In-memory Discord REST stand-in.
+
+    Args:
+        rate_limits (bool, optional): Whether to enforce rate limits. Default True.
+    """
+
+    def __init__(self, rate_limits: bool = True):
+        self.limiter = RateLimiter(rate_limits)
+        self.messages: dict[int, dict] = {}
+        self.ids = itertools.count(10_000)
+        self.requests = 0
+        self.handling_seconds = 0.0
+        self.edit_payloads: list[dict] = []
+
+    def create_app(self) -> web.Application:
+        """Creates the aiohttp application serving the API under `/api/v10`."""
+        app = web.Application()
+        routes = [
+            ("GET", "/users/@me", "default", self.get_user),
+            ("GET", "/oauth2/applications/@me", "default", self.get_application),
+            ("GET", "/gateway/bot", "default", self.get_gateway),
+            ("GET", "/channels/{channel_id}", "default", self.get_channel),
+            (
+                "GET",
+                "/channels/{channel_id}/messages/{message_id}",
+                "default",
+                self.get_message,
+            ),
+            ("POST", "/channels/{channel_id}/messages", "message_send", self.send),
+            (
+                "PATCH",
+                "/channels/{channel_id}/messages/{message_id}",
+                "message_edit",
+                self.edit,
+            ),
+            (
+                "DELETE",
+                "/channels/{channel_id}/messages/{message_id}",
+                "message_delete",
+                self.delete,
+            ),
+            (
+                "PUT",
+                "/applications/{app_id}/guilds/{guild_id}/commands",
+                "default",
+                self.sync_commands,
+            ),
+            (
+                "POST",
+                "/interactions/{interaction_id}/{token}/callback",
+                "default",
+                self.no_content,
+            ),
+            ("*", "/webhooks/{app_id}/{token}{tail:.*}", "default", self.no_content),
+        ]
+        for method, path, group, handler in routes:
+            app.router.add_route(
+                method, API_PREFIX + path, self._limited(group, handler)
+            )
+        return app
+
+    def _limited(self, group: str, handler):
+        """Wraps a handler with rate limiting and timing."""
+
+        async def wrapper(request: web.Request) -> web.StreamResponse:
+            started = time.perf_counter()
+            self.requests += 1
+            major = request.match_info.get("channel_id", "")
+            retry_after, headers = self.limiter.check(group, major)
+            if retry_after is not None:
+                response: web.StreamResponse = _json_response(
+                    {
+                        "message": "You are being rate limited.",
+                        "retry_after": round(retry_after, 3),
+                        "global": False,
+                    },
+                    status=429,
+                )
+            else:
+                response = await handler(request)
+            response.headers.update(headers)
+            response.headers["Via"] = "1.1 google"
+            self.handling_seconds += time.perf_counter() - started
+            return response
+
+        return wrapper
+
+    def _message(self, channel_id: str, message_id: int, payload: dict) -> dict:
+        """Creates a message object in the shape returned by Discord."""
+        return {
+            "id": str(message_id),
+            "channel_id": channel_id,
+            "author": BOT_USER,
+            "content": payload.get("content") or "",
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": payload.get("embeds") or [],
+            "pinned": False,
+            "type": 0,
+            "flags": 0,
+        }
+
+    async def get_user(self, _: web.Request) -> web.Response:
+        """GET /users/@me"""
+        return _json_response(BOT_USER)
+
+    async def get_application(self, _: web.Request) -> web.Response:
+        """GET /oauth2/applications/@me"""
+        return _json_response(
+            {
+                "id": BOT_USER["id"],
+                "name": "stub-bot",
+                "description": "",
+                "icon": None,
+                "rpc_origins": [],
+                "bot_public": True,
+                "bot_require_code_grant": False,
+                "owner": BOT_USER,
+                "verify_key": "",
+                "flags": 0,
+            }
+        )
+
+    async def get_gateway(self, request: web.Request) -> web.Response:
+        """GET /gateway/bot (the websocket itself is not implemented)."""
+        return _json_response(
+            {
+                "url": f"ws://{request.host}/gateway",
+                "shards": 1,
+                "session_start_limit": {
+                    "total": 1000,
+                    "remaining": 1000,
+                    "reset_after": 0,
+                    "max_concurrency": 1,
+                },
+            }
+        )
+
+    async def get_channel(self, request: web.Request) -> web.Response:
+        """GET /channels/{channel_id}"""
+        channel_id = request.match_info["channel_id"]
+        return _json_response(
+            {
+                "id": channel_id,
+                "type": 0,
+                "guild_id": "2",
+                "name": f"channel-{channel_id}",
+                "position": 0,
+                "permission_overwrites": [],
+                "nsfw": False,
+                "parent_id": None,
+            }
+        )
+
+    async def get_message(self, request: web.Request) -> web.Response:
+        """GET /channels/{channel_id}/messages/{message_id}"""
+        message = self.messages.get(int(request.match_info["message_id"]))
+        if message is None:
+            return _json_response(
+                {"message": "Unknown Message", "code": 10008}, status=404
+            )
+        return _json_response(message)
+
+    async def send(self, request: web.Request) -> web.Response:
+        """POST /channels/{channel_id}/messages"""
+        message_id = next(self.ids)
+        message = self._message(
+            request.match_info["channel_id"], message_id, await request.json()
+        )
+        self.messages[message_id] = message
+        return _json_response(message)
+
+    async def edit(self, request: web.Request) -> web.Response:
+        """PATCH /channels/{channel_id}/messages/{message_id}"""
+        message_id = int(request.match_info["message_id"])
+        payload = await request.json()
+        self.edit_payloads.append(payload)
+        message = self.messages.setdefault(
+            message_id, self._message(request.match_info["channel_id"], message_id, {})
+        )
+        if "embeds" in payload:
+            message["embeds"] = payload["embeds"]
+        message["edited_timestamp"] = datetime.datetime.now(
+            datetime.timezone.utc
+        ).isoformat()
+        return _json_response(message)
+
+    async def delete(self, request: web.Request) -> web.Response:
+        """DELETE /channels/{channel_id}/messages/{message_id}"""
+        self.messages.pop(int(request.match_info["message_id"]), None)
+        return web.Response(status=204)
+
+    async def sync_commands(self, request: web.Request) -> web.Response:
+        """PUT /applications/{app_id}/guilds/{guild_id}/commands"""
+        return _json_response(await request.json())
+
+    async def no_content(self, _: web.Request) -> web.Response:
+        """Interaction responses and webhook followups."""
+        return web.Response(status=204)
+
+
+async def start_stub(
+    stub: RestStub, host: str = "127.0.0.1", port: int = 8750
+) -> web.AppRunner:
+    """Starts serving the stand-in and returns the runner to clean it up."""
+    runner = web.AppRunner(stub.create_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    """Returns the percentile of the values in milliseconds."""
+    ordered = sorted(values)
+    return round(ordered[min(int(fraction * len(ordered)), len(ordered) - 1)] * 1000, 2)
+
+
+async def restore_messages(
+    client: discord.Client, channels: int
+) -> list[discord.Message]:
+    """Logs in and fetches one message per channel, like `Bot.setup` does on
+    startup; the messages are sent first so that they exist."""
+    await client.login("stub-token")
+    messages = []
+    for channel_number in range(channels):
+        channel: discord.TextChannel = await client.fetch_channel(  # type: ignore
+            100 + channel_number
+        )
+        sent = await channel.send(embed=discord.Embed(title="Benchmark"))
+        messages.append(await channel.fetch_message(sent.id))
+    return messages
+
+
+async def edit_repeatedly(
+    message: discord.Message, edits: int, latencies: list[float]
+) -> None:
+    """Edits the message `edits` times through `refresh_message`, each time with
+    new content, appending the duration of every edit to `latencies`."""
+    embed = discord.Embed(title="Benchmark")
+    for number in range(edits):
+        started = time.perf_counter()
+        await refresh_message(
+            message, embed, None, f"Edit {number}", []  # type: ignore
+        )
+        latencies.append(time.perf_counter() - started)
+
+
+async def benchmark(stub: RestStub, port: int, edits: int, channels: int) -> dict:
+    """Measures startup restore time and edit throughput against the stand-in.
+
+    Args:
+        stub (RestStub): The running stand-in (used for server-side timings).
+        port (int): The port it listens on.
+        edits (int): Number of edits per message.
+        channels (int): Number of messages in separate channels edited concurrently.
+    Returns:
+        dict: The measured statistics.
+    """
+    discord.http.Route.BASE = f"http://127.0.0.1:{port}{API_PREFIX}"
+    install_rate_limit_hook()
+    client = discord.Client(intents=discord.Intents.none())
+    started = time.perf_counter()
+    messages = await restore_messages(client, channels)
+    restore_time = time.perf_counter() - started
+
+    latencies: list[float] = []
+    handling_before, limited_before = stub.handling_seconds, stub.limiter.limited
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(edit_repeatedly(message, edits, latencies) for message in messages)
+    )
+    edit_time = time.perf_counter() - started
+    await client.close()
+
+    return {
+        "restore_ms": round(restore_time * 1000, 2),
+        "edits": len(latencies),
+        "edits_per_second": round(len(latencies) / edit_time, 2),
+        "edit_p50_ms": _percentile(latencies, 0.5),
+        "edit_p95_ms": _percentile(latencies, 0.95),
+        "server_429s": stub.limiter.limited - limited_before,
+        "client_429s": int(RATE_LIMITS.total()),
+        "retry_after_total_s": round(RATE_LIMIT_SECONDS.total(), 2),
+        "server_handling_ms": round(
+            (stub.handling_seconds - handling_before) * 1000, 2
+        ),
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+    """Serves the stand-in, or benchmarks against it."""
+    stub = RestStub(rate_limits=not args.no_limits)
+    runner = await start_stub(stub, args.host, args.port)
+    try:
+        if args.command == "serve":
+            print(f"Serving http://{args.host}:{args.port}{API_PREFIX}")
+            await asyncio.Event().wait()
+        else:
+            stats = await benchmark(stub, args.port, args.edits, args.channels)
+            print(json.dumps(stats, indent=2))
+    finally:
+        await runner.cleanup()
+
+
+def main() -> None:
+    """Parses command line arguments and runs the selected command."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["serve", "bench"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8750)
+    parser.add_argument("--no-limits", action="store_true", help="disable 429s")
+    parser.add_argument("--edits", type=int, default=20, help="edits per message")
+    parser.add_argument("--channels", type=int, default=3)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
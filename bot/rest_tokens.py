@@ -0,0 +1,146 @@
+"""Module keeping the results of tokens that need REST calls, e.g.
+`{pinned_count channel}`, which the gateway cache cannot answer.
+
+Rendering stays synchronous and never waits for Discord: a token shows the last
+value fetched for it, or a placeholder until its first fetch finished. Before
+rendering, the auto update fetches the values older than their time to live,
+concurrently and each with a timeout, so one slow request cannot hold back the
+embed."""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, NamedTuple
+import discord
+from bot.guild_index import get_guild_index
+
+logger = logging.getLogger(__name__)
+
+
+class RestValue(NamedTuple):
+    """A fetched token result and the `time.monotonic()` it was fetched at."""
+
+    value: str
+    fetched: float
+
+
+class RestValues:
+    """
+    The last results of tokens that need REST calls, keyed by
+    (guild id, token name, argument).
+
+    Args:
+        placeholder (str, optional): Shown by a token that was not fetched yet.
+        timeout (float, optional): Maximum number of seconds a fetch may take.
+    """
+
+    def __init__(self, placeholder: str = "...", timeout: float = 3.0):
+        self.placeholder = placeholder
+        self.timeout = timeout
+        self.values: dict[tuple, RestValue] = {}
+
+    def get(self, key: tuple) -> str:
+        """Returns the last fetched value of a token, or the placeholder."""
+        value = self.values.get(key)
+        return self.placeholder if value is None else value.value
+
+    def is_fresh(self, key: tuple, ttl: float) -> bool:
+        """Returns whether the value of a token was fetched in the last `ttl`
+        seconds."""
+        value = self.values.get(key)
+        return value is not None and time.monotonic() - value.fetched < ttl
+
+    async def fetch(self, key: tuple, call: Awaitable[str]) -> bool:
+        """
+        Awaits a fetch of a token value, at most `timeout` seconds, and stores
+        the result.
+
+        A fetch that timed out is retried by the next auto update. A request
+        Discord refused keeps the last value (or `[None]`) until the time to
+        live passes, so it is not repeated every tick.
+
+        Args:
+            key (tuple): The (guild id, token name, argument) of the token.
+            call (Awaitable[str]): The fetch.
+        Returns:
+            bool: Whether the shown value changed.
+        """
+        previous = self.values.get(key)
+        try:
+            value = await asyncio.wait_for(call, self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Fetching {%s %s} timed out.",
+                key[1],
+                key[2],
+                extra={"event": "rest_token", "guild_id": key[0]},
+            )
+            return False
+        except discord.HTTPException as error:
+            logger.warning(
+                "Fetching {%s %s} failed: %s",
+                key[1],
+                key[2],
+                error,
+                extra={"event": "rest_token", "guild_id": key[0]},
+            )
+            value = "[None]" if previous is None else previous.value
+        self.values[key] = RestValue(value, time.monotonic())
+        return previous is None or previous.value != value
+
+
+REST_VALUES = RestValues()
+
+
+async def fetch_pinned_count(guild: discord.Guild, channel_name: str) -> str:
+    """Returns the number of pinned messages in a text channel.
+
+    Args:
+        guild (`discord.Guild`): The guild to search in.
+        channel_name (str): A string representing a text channel name.
+    Returns:
+        str: A string containing final parsed message.
+    """
+    channel_id = get_guild_index(guild).find_text_channel(channel_name)
+    channel = guild.get_channel(channel_id) if channel_id is not None else None
+    if not isinstance(channel, discord.TextChannel):
+        return "[None]"
+    count = 0
+    async for _ in channel.pins(limit=None):
+        count += 1
+    return str(count)
+
+
+async def fetch_last_message_time(guild: discord.Guild, channel_name: str) -> str:
+    """Returns the time of the last message in a text channel, shown relative
+    to the reader's clock, e.g. "5 minutes ago".
+
+    Args:
+        guild (`discord.Guild`): The guild to search in.
+        channel_name (str): A string representing a text channel name.
+    Returns:
+        str: A string containing final parsed message.
+    """
+    channel_id = get_guild_index(guild).find_text_channel(channel_name)
+    channel = guild.get_channel(channel_id) if channel_id is not None else None
+    if not isinstance(channel, discord.TextChannel):
+        return "[None]"
+    async for message in channel.history(limit=1):
+        return discord.utils.format_dt(message.created_at, "R")
+    return "[None]"
+
+
+async def fetch_event_attendees(guild: discord.Guild, event_name: str) -> str:
+    """Returns the number of members interested in a scheduled event.
+
+    Args:
+        guild (`discord.Guild`): The guild to search in.
+        event_name (str): The name of the scheduled event.
+    Returns:
+        str: A string containing final parsed message.
+    """
+    events = await guild.fetch_scheduled_events(with_counts=True)
+    event = discord.utils.get(events, name=event_name)
+    if event is None or event.user_count is None:
+        return "[None]"
+    return str(event.user_count)
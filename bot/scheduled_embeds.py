@@ -0,0 +1,59 @@
+"""Module containing the scheduled job handlers publishing and expiring embeds
+prepared in the Embed Creator."""
+
+import time
+import discord
+from bot.embed_updates import render_embed
+from bot.scheduler import SCHEDULER, Job
+
+
+async def _get_channel(client: discord.Client, channel_id: int):
+    """Returns a channel from the cache, fetching it if needed."""
+    return client.get_channel(channel_id) or await client.fetch_channel(channel_id)
+
+
+async def publish_embed(client: discord.Client, job: Job) -> None:
+    """Renders and sends a scheduled embed and schedules its expiry.
+
+    The templates are rendered when the embed is published, not when it was
+    scheduled.
+    """
+    channel = await _get_channel(client, job.data["channel_id"])
+    embed = discord.Embed.from_dict(job.data["embed"])
+    # The channel stands in for the context; rendering only reads its guild.
+    render_embed(embed, channel, job.data["description"], job.data["field_values"])
+    message = await channel.send(embed=embed)
+    if job.data.get("expire_at"):
+        SCHEDULER.add(
+            job.data["expire_at"],
+            "expire",
+            job.data["guild_id"],
+            channel_id=channel.id,
+            message_id=message.id,
+            mode=job.data.get("on_expiry", "delete"),
+        )
+
+
+async def expire_embed(client: discord.Client, job: Job) -> None:
+    """Deletes a published embed, or marks it as archived."""
+    channel = await _get_channel(client, job.data["channel_id"])
+    message = await channel.fetch_message(job.data["message_id"])
+    if job.data["mode"] == "archive":
+        embed = message.embeds[0]
+        embed.colour = discord.Colour.light_grey()
+        embed.set_footer(text=f"Archived: {time.strftime('%d.%m.%Y - %H:%M')}")
+        await message.edit(embed=embed)
+    else:
+        await message.delete()
+
+
+def install_handlers(client: discord.Client) -> None:
+    """Registers the embed publishing and expiry handlers."""
+
+    async def publish(job: Job) -> None:
+        await publish_embed(client, job)
+
+    async def expire(job: Job) -> None:
+        await expire_embed(client, job)
+
+    SCHEDULER.handlers.update(publish=publish, expire=expire)
@@ -0,0 +1,179 @@
+"""Module containing the scheduler of delayed jobs, e.g. embeds published later.
+
+Pending jobs are kept in a heap ordered by due time and run by a single task that
+sleeps until the earliest one is due, so thousands of jobs need no task each.
+Every job records the guild it belongs to, so the jobs of a guild can be listed
+and cancelled together. The jobs are saved to a JSON file whenever they change.
+After a restart, jobs that became due while the bot was down are run first,
+oldest first."""
+
+import asyncio
+import heapq
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Job(NamedTuple):
+    """A pending job.
+
+    Attributes:
+        job_id (int): The id of the job.
+        due (float): The Unix time the job should run at.
+        action (str): The name of the handler running the job.
+        data (dict): JSON-serializable arguments of the handler, including
+        the `guild_id` of the guild the job belongs to.
+    """
+
+    job_id: int
+    due: float
+    action: str
+    data: dict
+
+
+class JobScheduler:
+    """
+    Runs jobs at their due time. Jobs are removed from the file before they run,
+    so a job interrupted by a crash is not repeated.
+
+    Args:
+        path (str): The file pending jobs are saved to. Empty keeps them in memory.
+    """
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self.jobs: dict[int, Job] = {}
+        self.heap: list[tuple[float, int]] = []
+        self.handlers: dict[str, Callable[[Job], Awaitable[None]]] = {}
+        self.next_id = 1
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def load(self) -> None:
+        """Reads the pending jobs from the file."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as jobs_file:
+            for job_id, due, action, data in json.load(jobs_file):
+                self.jobs[job_id] = Job(job_id, due, action, data)
+                heapq.heappush(self.heap, (due, job_id))
+                self.next_id = max(self.next_id, job_id + 1)
+
+    def save(self) -> None:
+        """Writes the pending jobs to the file, replacing it atomically."""
+        if not self.path:
+            return
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as jobs_file:
+            json.dump([list(job) for job in self.jobs.values()], jobs_file)
+        os.replace(temporary_path, self.path)
+
+    def add(self, due: float, action: str, guild_id: int, **data) -> Job:
+        """Schedules a job.
+
+        Args:
+            due (float): The Unix time the job should run at.
+            action (str): The name of the handler running the job.
+            guild_id (int): The guild the job belongs to.
+            **data: JSON-serializable arguments of the handler.
+        Returns:
+            Job: The scheduled job.
+        """
+        job = Job(self.next_id, due, action, {"guild_id": guild_id, **data})
+        self.next_id += 1
+        self.jobs[job.job_id] = job
+        heapq.heappush(self.heap, (due, job.job_id))
+        self.save()
+        if self.wakeup is not None:
+            self.wakeup.set()
+        return job
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancels a pending job. Its heap entry is dropped when it reaches the top.
+
+        Returns:
+            bool: Whether the job was pending.
+        """
+        if self.jobs.pop(job_id, None) is None:
+            return False
+        self.save()
+        return True
+
+    def guild_jobs(self, guild_id: int) -> list[Job]:
+        """Returns the pending jobs of a guild."""
+        return [
+            job for job in self.jobs.values() if job.data.get("guild_id") == guild_id
+        ]
+
+    def cancel_guild(self, guild_id: int) -> int:
+        """Cancels all pending jobs of a guild, e.g. one the bot was removed from.
+
+        Returns:
+            int: The number of jobs cancelled.
+        """
+        jobs = self.guild_jobs(guild_id)
+        for job in jobs:
+            del self.jobs[job.job_id]
+        if jobs:
+            self.save()
+        return len(jobs)
+
+    def pop_due(self, now: float) -> list[Job]:
+        """Removes and returns all jobs due at `now`, oldest first."""
+        due_jobs = []
+        while self.heap and self.heap[0][0] <= now:
+            _, job_id = heapq.heappop(self.heap)
+            job = self.jobs.pop(job_id, None)
+            if job is not None:
+                due_jobs.append(job)
+        if due_jobs:
+            self.save()
+        return due_jobs
+
+    async def run(self) -> None:
+        """Runs due jobs until cancelled."""
+        self.wakeup = asyncio.Event()
+        while True:
+            now = time.time()
+            for job in self.pop_due(now):
+                await self.run_job(job, now)
+            while self.heap and self.heap[0][1] not in self.jobs:
+                heapq.heappop(self.heap)
+            delay = self.heap[0][0] - time.time() if self.heap else None
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    async def run_job(self, job: Job, now: float) -> None:
+        """Runs a single job with its handler, logging failures."""
+        extra = {
+            "event": "scheduled_job",
+            "job_id": job.job_id,
+            "guild_id": job.data.get("guild_id"),
+            "action": job.action,
+            "late_s": round(now - job.due, 1),
+        }
+        handler = self.handlers.get(job.action)
+        if handler is None:
+            logger.warning("No handler for scheduled job.", extra=extra)
+            return
+        try:
+            await handler(job)
+        except Exception:  # pylint: disable=broad-exception-caught
+            logger.exception("Scheduled job failed.", extra=extra)
+        else:
+            logger.info("Scheduled job finished.", extra=extra)
+
+    def start(self) -> None:
+        """Starts running jobs, beginning with the ones missed while stopped."""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+
+SCHEDULER = JobScheduler()
@@ -0,0 +1,202 @@
+"""Module containing stand-ins for the discord.py guild cache and loading them
+from snapshot files, so templates can be rendered without connecting to Discord.
+
+A snapshot is a JSON object, optionally gzip-compressed (`.json.gz`):
+
+    {
+        "id": 1,
+        "roles": [{"id": 10, "name": "Member"}],
+        "text_channels": [{"id": 20, "name": "general"}],
+        "voice_channels": [{"id": 21, "name": "lab"}],
+        "members": [
+            {"id": 1000, "name": "user", "roles": [10],
+             "status": "online", "voice_channel": 21}
+        ]
+    }
+
+The `@everyone` role is added automatically; `status` and `voice_channel` are
+optional."""
+
+import gzip
+import json
+from typing import Optional
+import discord
+
+
+class FakeRole:  # pylint: disable=too-few-public-methods
+    """A stand-in for `discord.Role`."""
+
+    def __init__(self, role_id: int, name: str, guild: "FakeGuild"):
+        self.id = role_id
+        self.name = name
+        self.guild = guild
+
+
+class FakeChannel:  # pylint: disable=too-few-public-methods
+    """A stand-in for `discord.TextChannel` and `discord.VoiceChannel`."""
+
+    def __init__(self, channel_id: int, name: str, guild: "FakeGuild"):
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.members: list["FakeMember"] = []
+
+
+class FakeMember:  # pylint: disable=too-few-public-methods
+    """A stand-in for `discord.Member`."""
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        member_id: int,
+        name: str,
+        guild: "FakeGuild",
+        roles: list,
+        status: discord.Status = discord.Status.offline,
+    ):
+        self.id = member_id
+        self.name = name
+        self.guild = guild
+        self.roles = roles
+        self.mention = f"<@{member_id}>"
+        self.display_name = name
+        self.status = status
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class FakeGuild:  # pylint: disable=too-few-public-methods
+    """
+    A stand-in for `discord.Guild` holding the fake cache.
+
+    Args:
+        guild_id (int): The id of the guild; also the id of its default role.
+    """
+
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.default_role = FakeRole(guild_id, "@everyone", self)
+        self.roles: list[FakeRole] = [self.default_role]
+        self.members_by_id: dict[int, FakeMember] = {}
+        self.text_channels: list[FakeChannel] = []
+        self.voice_channels: list[FakeChannel] = []
+        self.chunked = True
+
+    @property
+    def members(self) -> list[FakeMember]:
+        """Returns all cached members."""
+        return list(self.members_by_id.values())
+
+    def get_member(self, member_id: int) -> Optional[FakeMember]:
+        """Returns the cached member with the given id."""
+        return self.members_by_id.get(member_id)
+
+    def role(self, role_id: int) -> Optional[FakeRole]:
+        """Returns the role with the given id."""
+        return next((role for role in self.roles if role.id == role_id), None)
+
+
+class FakeContext:  # pylint: disable=too-few-public-methods
+    """A stand-in for `discord.ext.commands.Context`."""
+
+    def __init__(self, guild: FakeGuild):
+        self.guild = guild
+
+
+def guild_from_snapshot(snapshot: dict) -> FakeGuild:
+    """Builds a fake guild from a snapshot object.
+
+    Args:
+        snapshot (dict): The snapshot, as described in the module docstring.
+    Returns:
+        FakeGuild: The guild.
+    """
+    guild = FakeGuild(snapshot.get("id", 1))
+    guild.roles.extend(
+        FakeRole(role["id"], role["name"], guild) for role in snapshot.get("roles", [])
+    )
+    roles = {role.id: role for role in guild.roles}
+    guild.text_channels.extend(
+        FakeChannel(channel["id"], channel["name"], guild)
+        for channel in snapshot.get("text_channels", [])
+    )
+    guild.voice_channels.extend(
+        FakeChannel(channel["id"], channel["name"], guild)
+        for channel in snapshot.get("voice_channels", [])
+    )
+    voice_channels = {channel.id: channel for channel in guild.voice_channels}
+    for data in snapshot.get("members", []):
+        member = FakeMember(
+            data["id"],
+            data["name"],
+            guild,
+            [guild.default_role, *(roles[role_id] for role_id in data["roles"])],
+            discord.Status(data.get("status", "offline")),
+        )
+        guild.members_by_id[member.id] = member
+        if data.get("voice_channel") in voice_channels:
+            voice_channels[data["voice_channel"]].members.append(member)
+    return guild
+
+
+def snapshot_from_guild(guild: discord.Guild | FakeGuild) -> dict:
+    """Creates a snapshot object of a guild cache.
+
+    Args:
+        guild (`discord.Guild`): The guild, or a fake guild.
+    Returns:
+        dict: The snapshot.
+    """
+    voice_channel_of = {
+        member.id: channel.id
+        for channel in guild.voice_channels
+        for member in channel.members
+    }
+    members = []
+    for member in guild.members:
+        data = {
+            "id": member.id,
+            "name": str(member),
+            "roles": [role.id for role in member.roles if role.id != guild.id],
+            "status": str(getattr(member, "status", "offline")),
+        }
+        if member.id in voice_channel_of:
+            data["voice_channel"] = voice_channel_of[member.id]
+        members.append(data)
+    return {
+        "id": guild.id,
+        "roles": [
+            {"id": role.id, "name": role.name}
+            for role in guild.roles
+            if role.id != guild.id
+        ],
+        "text_channels": [
+            {"id": channel.id, "name": channel.name} for channel in guild.text_channels
+        ],
+        "voice_channels": [
+            {"id": channel.id, "name": channel.name} for channel in guild.voice_channels
+        ],
+        "members": members,
+    }
+
+
+def dump_snapshot(guild: discord.Guild | FakeGuild, compress: bool = False) -> bytes:
+    """Returns the snapshot of a guild as a JSON file, gzip-compressed if
+    `compress` is set."""
+    data = json.dumps(snapshot_from_guild(guild), ensure_ascii=False).encode()
+    return gzip.compress(data) if compress else data
+
+
+def load_snapshot(path: str) -> FakeGuild:
+    """Loads a fake guild from a JSON or gzip-compressed JSON snapshot file.
+
+    Args:
+        path (str): The snapshot file.
+    Returns:
+        FakeGuild: The guild.
+    """
+    with open(path, "rb") as snapshot_file:
+        data = snapshot_file.read()
+    if data[:2] == b"\x1f\x8b":
+        data = gzip.decompress(data)
+    return guild_from_snapshot(json.loads(data))
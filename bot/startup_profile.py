@@ -0,0 +1,117 @@
+"""Module measuring the startup of the bot, enabled with `--profile-startup`.
+
+    python main.py --profile-startup
+
+When enabled, every module imported by `import` statements is timed, and the
+time since `main.py` started is recorded at each startup phase: config
+load, login, gateway ready, tree sync, restore and first render. The report is
+logged once the last phase finished.
+
+This module only uses the standard library and is imported by `main.py` before
+anything else, so the imports of discord.py and of the bot are measured too."""
+
+import builtins
+import importlib.util
+import logging
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# Number of slowest modules listed in the report.
+REPORTED_IMPORTS = 20
+
+
+class StartupProfile:
+    """Import times and the times of the startup phases.
+
+    Args:
+        enabled (bool, optional): Whether anything is recorded.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        # Module name -> (self seconds, cumulative seconds).
+        self.imports: dict[str, tuple[float, float]] = {}
+        self.reported = False
+
+    def install_import_timer(self) -> None:
+        """Wraps `builtins.__import__` to time the first import of every module.
+
+        Like `python -X importtime`, the self time of a module excludes the
+        modules it imports itself."""
+        original_import = builtins.__import__
+        # The time spent in nested imports of the modules being imported.
+        nested: list[float] = []
+
+        def timed_import(name, globals_=None, locals_=None, fromlist=(), level=0):
+            module = name
+            if level and name:
+                package = (globals_ or {}).get("__package__")
+                module = importlib.util.resolve_name("." * level + name, package)
+            if not module or module in sys.modules:
+                return original_import(name, globals_, locals_, fromlist, level)
+            start = time.perf_counter()
+            nested.append(0.0)
+            try:
+                return original_import(name, globals_, locals_, fromlist, level)
+            finally:
+                total = time.perf_counter() - start
+                children = nested.pop()
+                if nested:
+                    nested[-1] += total
+                self.imports.setdefault(module, (total - children, total))
+
+        builtins.__import__ = timed_import
+
+    def mark(self, phase: str, final: bool = False) -> None:
+        """Records the time of the first occurrence of a phase.
+
+        Args:
+            phase (str): The name of the phase, e.g. `gateway_ready`.
+            final (bool, optional): Whether this is the last phase, after which
+            the report is logged.
+        """
+        if not self.enabled or self.reported:
+            return
+        self.phases.setdefault(phase, time.perf_counter() - self.started)
+        if final:
+            self.report()
+
+    def report(self) -> None:
+        """Logs the phases and the slowest imports."""
+        self.reported = True
+        previous = 0.0
+        for phase, elapsed in self.phases.items():
+            logger.info(
+                "Startup phase %s finished after %.0f ms.",
+                phase,
+                elapsed * 1000,
+                extra={
+                    "event": "startup_profile",
+                    "phase": phase,
+                    "elapsed_ms": round(elapsed * 1000, 1),
+                    "duration_ms": round((elapsed - previous) * 1000, 1),
+                },
+            )
+            previous = elapsed
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][0])
+        for module, (self_time, total) in reversed(slowest[-REPORTED_IMPORTS:]):
+            logger.info(
+                "Importing %s took %.1f ms.",
+                module,
+                self_time * 1000,
+                extra={
+                    "event": "startup_profile",
+                    "import": module,
+                    "self_ms": round(self_time * 1000, 2),
+                    "cumulative_ms": round(total * 1000, 2),
+                },
+            )
+
+
+PROFILE = StartupProfile("--profile-startup" in sys.argv)
+if PROFILE.enabled:
+    PROFILE.install_import_timer()
@@ -0,0 +1,75 @@
+"""Module creating the embed shown by the `bot_stats` command."""
+
+import math
+from typing import Optional
+import discord
+from discord.ext import commands
+from bot.embed_updates import running_auto_updates
+from bot.creator_sessions import SESSIONS
+from bot.guild_index import indexes_memory_usage
+from bot.message_syntax_functions import compile_template
+from bot.metrics import (
+    LAST_TICK_SECONDS,
+    LOOKUP_CACHE,
+    RATE_LIMIT_WINDOW,
+    RENDER_WINDOW,
+)
+
+
+def format_ms(seconds: Optional[float]) -> str:
+    """Formats a duration in seconds as milliseconds, or `-` when unknown."""
+    if seconds is None:
+        return "-"
+    return f"{seconds * 1000:.1f} ms"
+
+
+def format_hit_rate(hits: float, misses: float) -> str:
+    """Formats a cache hit rate with the number of lookups."""
+    lookups = hits + misses
+    if not lookups:
+        return "-"
+    return f"{hits / lookups:.0%} of {int(lookups)}"
+
+
+def create_stats_embed(client: commands.Bot) -> discord.Embed:
+    """Creates an embed with the current hot-path timings and cache statistics.
+
+    All values are read from counters and rolling windows maintained while
+    the bot runs, nothing is measured when the command is called.
+
+    Args:
+        client (`discord.ext.commands.Bot`): The running bot.
+    Returns:
+        discord.Embed: The statistics embed.
+    """
+    template_cache = compile_template.cache_info()
+    lookup_hits = LOOKUP_CACHE.values.get((("result", "hit"),), 0.0)
+    lookup_misses = LOOKUP_CACHE.values.get((("result", "miss"),), 0.0)
+    embed = discord.Embed(title="Bot statistics")
+    embed.add_field(
+        name="Render latency (1h)",
+        value=f"p50 {format_ms(RENDER_WINDOW.percentile(0.5))}\n"
+        f"p95 {format_ms(RENDER_WINDOW.percentile(0.95))}",
+    )
+    embed.add_field(name="Last tick", value=format_ms(LAST_TICK_SECONDS.value))
+    embed.add_field(name="Managed embeds", value=str(running_auto_updates()))
+    embed.add_field(
+        name="Cache hit rate",
+        value=f"Lookups: {format_hit_rate(lookup_hits, lookup_misses)}\n"
+        "Templates: "
+        f"{format_hit_rate(template_cache.hits, template_cache.misses)}",
+    )
+    embed.add_field(
+        name="Guild indexes", value=f"{indexes_memory_usage() / 1024:.1f} KiB"
+    )
+    embed.add_field(
+        name="Creator sessions",
+        value=f"{len(SESSIONS)} in {len(SESSIONS.guilds)} servers "
+        f"({SESSIONS.memory_usage() / 1024:.1f} KiB)",
+    )
+    latency = client.latency if math.isfinite(client.latency) else None
+    embed.add_field(name="Gateway latency", value=format_ms(latency))
+    embed.add_field(
+        name="Rate limit waits (1h)", value=f"{RATE_LIMIT_WINDOW.sum():.1f} s"
+    )
+    return embed
@@ -0,0 +1,218 @@
+"""Module explaining how templates are rendered, used by `/syntax_explain` and
+the Explain button of the Embed Creator.
+
+For every token the explanation shows how it was parsed, what its names resolve
+to, the steps of evaluating its role expression with the number of members
+after each step and their times, and the rendered text. Every part of the embed
+is checked against its length limit.
+
+Tokens are rendered with `render_template`, like the auto update does, against
+a snapshot of the guild index with an empty query cache, so the whole plan is
+evaluated instead of answered from the cache."""
+
+import io
+import time
+from typing import Iterable, Optional
+import discord
+from bot.guild_index import GuildIndex, get_guild_index
+from bot.message_syntax_functions import (
+    CompiledToken,
+    RoleCountsQuery,
+    RoleExpression,
+    compile_template,
+    render_template,
+)
+from bot.query_plan import QUERY_PLAN, PlanStep
+from bot.render import EMBED_LIMIT, format_report
+
+# Longest explanation sent as a message; longer ones are sent as a file.
+MESSAGE_LIMIT = 1900
+# Characters of a rendered token shown in the explanation.
+PREVIEW_LENGTH = 60
+
+
+def describe_argument(token: CompiledToken) -> str:
+    """Describes how the argument of a token was parsed."""
+    parsed = token.parsed
+    if isinstance(parsed, RoleExpression):
+        if parsed.only_nots:
+            plan = "all members"
+        elif len(parsed.role_names) == 1:
+            plan = f"role {parsed.role_names[0]}"
+        else:
+            operator = " and " if " and " in parsed.message_core_str else " or "
+            plan = operator.join(parsed.role_names)
+        if parsed.not_role_names:
+            plan += " not " + " not ".join(parsed.not_role_names)
+        return f"expression: {plan}"
+    if isinstance(parsed, RoleCountsQuery):
+        return "roles: " + ", ".join(parsed.role_names)
+    return f"argument: {token.argument}" if token.argument else "no argument"
+
+
+def describe_references(index: Optional[GuildIndex], token: CompiledToken) -> list:
+    """Describes what the names in the argument of a token resolve to."""
+    if index is None or token.token_type.references is None:
+        return []
+    finders = {
+        "members": index.find_member,
+        "roles": index.find_role,
+        "text_channels": index.find_text_channel,
+        "voice_channels": index.find_voice_channel,
+    }
+    lines = []
+    for kind, name in token.token_type.references(token.parsed):
+        key = finders[kind](name)
+        if key is not None and index.has_name(kind, name):
+            object_id = index.member_ids[key] if kind == "members" else key
+            lines.append(f"{name} → {kind[:-1].replace('_', ' ')} {object_id}")
+        elif key is not None:
+            match = index.trigram_index(kind).names[key]
+            lines.append(f"{name} → fuzzy match {match}")
+        else:
+            suggestions = index.suggest(kind, name)
+            lines.append(
+                f"{name} → not found"
+                + (f", similar: {', '.join(suggestions)}" if suggestions else "")
+            )
+    return lines
+
+
+def format_plan(index: Optional[GuildIndex], plan: list[PlanStep]) -> list[str]:
+    """Formats the evaluation steps of a token with role names."""
+    if not plan or index is None:
+        return []
+    rows = []
+    for step in plan:
+        operand = step.operand
+        if step.operation != "resolve" and operand.isdigit():
+            operand = index.role_names.get(int(operand), operand)
+        rows.append((step.operation, operand, step.size, step.seconds))
+    width = max(len("operand"), *(len(operand) for _, operand, _, _ in rows))
+    lines = [f"{'step':<14}  {'operand':<{width}}  {'size':>7}  {'ms':>7}"]
+    for operation, operand, size, seconds in rows:
+        lines.append(
+            f"{operation:<14}  {operand:<{width}}  {size:>7}  {seconds * 1000:>7.3f}"
+        )
+    return lines
+
+
+def explain_token(
+    index: Optional[GuildIndex],
+    token: CompiledToken,
+    timings: list[tuple[CompiledToken, float]],
+) -> tuple[str, list[str]]:
+    """Renders a single token, recording the steps of its evaluation.
+
+    Args:
+        index (`GuildIndex`): The index to render against, or `None` outside
+        a guild.
+        token (`CompiledToken`): The token.
+        timings (list): The (token, seconds) pairs of the part, appended to.
+    Returns:
+        tuple: The rendered text and the lines of the explanation.
+    """
+    text = f"{token.token_type.name} {token.argument}".strip()
+    plan: list[PlanStep] = []
+    reset = QUERY_PLAN.set(plan)
+    try:
+        start = time.perf_counter()
+        rendered = render_template(index, "{" + text + "}", timings)
+        seconds = time.perf_counter() - start
+    finally:
+        QUERY_PLAN.reset(reset)
+    depends_on = ", ".join(sorted(token.token_type.depends_on)) or "nothing"
+    lines = [
+        f"  {{{text}}}",
+        f"    {describe_argument(token)}; depends on {depends_on}; "
+        f"cost {token.token_type.cost:g}",
+    ]
+    lines.extend(f"    {line}" for line in describe_references(index, token))
+    lines.extend(f"    {line}" for line in format_plan(index, plan))
+    preview = rendered.replace("\n", " ")
+    if len(preview) > PREVIEW_LENGTH:
+        preview = preview[: PREVIEW_LENGTH - 1] + "…"
+    lines.append(
+        f"    → {preview!r}, {len(rendered)} characters in {seconds * 1000:.3f} ms"
+    )
+    return rendered, lines
+
+
+def explain_template(
+    index: Optional[GuildIndex], template: str, limit: int, part: str
+) -> tuple[str, list[str]]:
+    """Renders a template token by token and explains every token.
+
+    Args:
+        index (`GuildIndex`): The index to render against, or `None` outside
+        a guild.
+        template (str): The template.
+        limit (int): The maximum length of the rendered part.
+        part (str): The name of the part, e.g. "description".
+    Returns:
+        tuple: The rendered text and the lines of the explanation.
+    """
+    output = []
+    timings: list[tuple[CompiledToken, float]] = []
+    lines = [f"{part}:"]
+    for segment in compile_template(template):
+        if isinstance(segment, str):
+            output.append(segment)
+            continue
+        rendered, token_lines = explain_token(index, segment, timings)
+        output.append(rendered)
+        lines.extend(token_lines)
+    rendered_part = "".join(output)
+    lines.append("")
+    lines.append(format_report(rendered_part, timings, limit, part))
+    return rendered_part, lines
+
+
+def explain_templates(
+    index: Optional[GuildIndex], parts: Iterable[tuple[str, str, int]]
+) -> str:
+    """Explains the templates of an embed.
+
+    Args:
+        index (`GuildIndex`): The index to render against, or `None` outside
+        a guild.
+        parts (Iterable): (part name, template, length limit) of every part.
+    Returns:
+        str: The explanation.
+    """
+    lines: list[str] = []
+    total = 0
+    for part, template, limit in parts:
+        rendered, part_lines = explain_template(index, template, limit, part)
+        total += len(rendered)
+        lines.extend(part_lines)
+        lines.append("")
+    status = (
+        "ok" if total <= EMBED_LIMIT else f"over the limit by {total - EMBED_LIMIT}"
+    )
+    lines.append(f"embed: {total} / {EMBED_LIMIT} characters, {status}")
+    return "\n".join(lines)
+
+
+def explain_for_guild(
+    guild: Optional[discord.Guild], parts: Iterable[tuple[str, str, int]]
+) -> str:
+    """Explains the templates of an embed against a snapshot of the index of
+    a guild, see `explain_templates`."""
+    if guild is None:
+        return explain_templates(None, parts)
+    live = get_guild_index(guild)
+    index = live.snapshot()
+    index.query_cache = {}
+    try:
+        return explain_templates(index, parts)
+    finally:
+        live.release()
+
+
+def explanation_message(explanation: str) -> dict:
+    """Returns the arguments sending an explanation: as a code block, or as
+    a file if it is too long for a message."""
+    if len(explanation) <= MESSAGE_LIMIT:
+        return {"content": f"```\n{explanation}\n```"}
+    return {"file": discord.File(io.BytesIO(explanation.encode()), "explanation.txt")}
@@ -0,0 +1,113 @@
+"""Module saving compiled templates to disk, so they are not parsed again after
+a restart.
+
+The cache file starts with a magic number, a format version and a fingerprint
+of the registered tokens. A file written by another version, or for other
+tokens, is ignored as a whole. Each template is stored under the digest of its
+text, so a template changed in `config.ini` simply misses the cache. Names are
+not stored resolved: they are looked up in the guild index at render time, which
+is rebuilt from the gateway on startup."""
+
+import hashlib
+import logging
+import os
+import pickle
+import struct
+from typing import Iterable
+from bot.message_syntax_functions import (
+    PRECOMPILED,
+    TOKEN_TYPES,
+    compile_template,
+    template_digest,
+)
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAGIC = b"BTC1"
+# Increase when the parsed form of a token changes.
+CACHE_VERSION = 1
+_HEADER = struct.Struct("<4sH16s")
+
+
+def registry_fingerprint() -> bytes:
+    """Returns a digest of the registered tokens and their parsers."""
+    description = sorted(
+        (
+            name,
+            token_type.takes_argument,
+            getattr(
+                token_type.parser,
+                "__qualname__",
+                type(token_type.parser).__qualname__,
+            ),
+        )
+        for name, token_type in TOKEN_TYPES.items()
+    )
+    return hashlib.blake2b(repr(description).encode(), digest_size=16).digest()
+
+
+def save_compiled_cache(path: str, templates: Iterable[str]) -> int:
+    """Compiles the templates and writes them to the cache, replacing it atomically.
+
+    Args:
+        path (str): The cache file.
+        templates (Iterable[str]): The templates to store.
+    Returns:
+        int: The number of templates stored.
+    """
+    entries = {}
+    for template in templates:
+        entries[template_digest(template)] = tuple(
+            (
+                segment
+                if isinstance(segment, str)
+                else (segment.token_type.name, segment.argument, segment.parsed)
+            )
+            for segment in compile_template(template)
+        )
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as cache_file:
+        cache_file.write(
+            _HEADER.pack(CACHE_MAGIC, CACHE_VERSION, registry_fingerprint())
+        )
+        pickle.dump(entries, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, path)
+    return len(entries)
+
+
+def load_compiled_cache(path: str) -> int:
+    """Restores the compiled templates written by `save_compiled_cache`.
+
+    Args:
+        path (str): The cache file.
+    Returns:
+        int: The number of templates restored; 0 if the file is missing, stale
+        or corrupt, e.g. truncated by a crash while it was written.
+    """
+    try:
+        with open(path, "rb") as cache_file:
+            header = cache_file.read(_HEADER.size)
+            if len(header) != _HEADER.size or _HEADER.unpack(header) != (
+                CACHE_MAGIC,
+                CACHE_VERSION,
+                registry_fingerprint(),
+            ):
+                logger.info(
+                    "Ignoring stale compiled template cache %s.",
+                    path,
+                    extra={"event": "template_cache"},
+                )
+                return 0
+            entries = pickle.load(cache_file)
+    except FileNotFoundError:
+        return 0
+    except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, ValueError):
+        logger.warning(
+            "Ignoring unreadable compiled template cache %s.",
+            path,
+            extra={"event": "template_cache"},
+        )
+        return 0
+    PRECOMPILED.update(entries)
+    compile_template.cache_clear()
+    return len(entries)
@@ -0,0 +1,144 @@
+"""Module containing the libraries of named templates shared by all Embed Creator
+sessions of a guild.
+
+The library of a guild is a JSON object mapping template names to template texts.
+It can be exported and imported as a file, so snippets can be moved between
+servers."""
+
+import json
+import os
+from typing import Iterator, Optional
+
+# Select menu options can show at most 25 names of up to 100 characters.
+MAX_TEMPLATES = 25
+MAX_NAME_LENGTH = 100
+
+
+class TemplateLibrary:
+    """
+    Named templates of every guild, saved to a JSON file whenever they change.
+    The file maps guild ids to the templates of the guild, so guilds do not see
+    each other's templates. It is read on first use, so it does not delay the
+    startup.
+
+    Args:
+        path (str): The file of the library. Empty keeps it in memory only.
+    """
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self._guilds: Optional[dict[str, dict[str, str]]] = None
+
+    @property
+    def guilds(self) -> dict[str, dict[str, str]]:
+        """The templates by name of every guild, by guild id, read from the file
+        on first use."""
+        if self._guilds is None:
+            self.load()
+        return self._guilds  # type: ignore
+
+    def load(self) -> None:
+        """Reads the templates from the file."""
+        self._guilds = {}
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as library_file:
+            self._guilds = json.load(library_file)
+
+    def save(self) -> None:
+        """Writes the templates to the file, replacing it atomically."""
+        if not self.path:
+            return
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as library_file:
+            json.dump(self.guilds, library_file, indent=2, ensure_ascii=False)
+        os.replace(temporary_path, self.path)
+
+    def templates(self, guild_id: int) -> dict[str, str]:
+        """Returns the templates of a guild by name."""
+        return self.guilds.get(str(guild_id), {})
+
+    def all_templates(self) -> Iterator[str]:
+        """Yields the templates of all guilds."""
+        for templates in self.guilds.values():
+            yield from templates.values()
+
+    def names(self, guild_id: int) -> list[str]:
+        """Returns the names of all templates of a guild, sorted."""
+        return sorted(self.templates(guild_id))
+
+    def get(self, guild_id: int, name: str) -> Optional[str]:
+        """Returns the template of a guild with the given name, or `None`."""
+        return self.templates(guild_id).get(name)
+
+    def store(self, guild_id: int, name: str, template: str) -> None:
+        """Adds a template to the library of a guild, or replaces the template
+        with the same name.
+
+        Raises:
+            ValueError: If the name is empty or too long, or the library is full.
+        """
+        name = name.strip()
+        if not name or len(name) > MAX_NAME_LENGTH:
+            raise ValueError(
+                f"Template names must have 1 to {MAX_NAME_LENGTH} characters."
+            )
+        templates = self.guilds.setdefault(str(guild_id), {})
+        if name not in templates and len(templates) >= MAX_TEMPLATES:
+            raise ValueError(f"The library can hold at most {MAX_TEMPLATES} templates.")
+        templates[name] = template
+        self.save()
+
+    def delete(self, guild_id: int, name: str) -> bool:
+        """Removes a template of a guild.
+
+        Returns:
+            bool: Whether the template existed.
+        """
+        templates = self.templates(guild_id)
+        if templates.pop(name, None) is None:
+            return False
+        if not templates:
+            del self.guilds[str(guild_id)]
+        self.save()
+        return True
+
+    def export(self, guild_id: int) -> bytes:
+        """Returns the library of a guild as a JSON file."""
+        return json.dumps(
+            self.templates(guild_id), indent=2, ensure_ascii=False
+        ).encode()
+
+    def import_templates(self, guild_id: int, data: bytes) -> int:
+        """Adds the templates of an exported library to the library of a guild,
+        replacing templates with the same names.
+
+        Returns:
+            int: The number of templates imported.
+
+        Raises:
+            ValueError: If the file is not an exported library, or the library
+            would be too large.
+        """
+        try:
+            imported = json.loads(data)
+        except (UnicodeDecodeError, json.JSONDecodeError) as error:
+            raise ValueError("The file is not a template library.") from error
+        if not isinstance(imported, dict) or not all(
+            isinstance(name, str) and isinstance(template, str)
+            for name, template in imported.items()
+        ):
+            raise ValueError("The file is not a template library.")
+        templates = self.templates(guild_id)
+        if len(templates.keys() | imported.keys()) > MAX_TEMPLATES:
+            raise ValueError(f"The library can hold at most {MAX_TEMPLATES} templates.")
+        for name in imported:
+            if not name.strip() or len(name) > MAX_NAME_LENGTH:
+                raise ValueError(f"Invalid template name: {name[:MAX_NAME_LENGTH]}")
+        if imported:
+            self.guilds[str(guild_id)] = {**templates, **imported}
+            self.save()
+        return len(imported)
+
+
+LIBRARY = TemplateLibrary()
@@ -2,96 +2,405 @@
 # *_* coding: utf-8 *_*
 """This module deploys discord bot using discord.py library."""
 
-import time
+import asyncio
+import io
+import logging
 import os
 from typing import Optional
+
+# Imported before the other packages, so `--profile-startup` times their imports.
+# pylint: disable=wrong-import-order,ungrouped-imports
+from bot.startup_profile import PROFILE
 import discord
 from discord import app_commands
 from discord.ext import commands
 from dotenv import load_dotenv
+from bot.creator_sessions import SESSIONS
 from bot.config_creator import (
     check_for_config_file,
     create_config_ram,
+    guild_config,
+    guild_config_path,
     read_from_config,
+    read_saved_templates,
+    read_setting,
     save_values_from_ram_to_memory,
+    use_guild_config,
+)
+from bot.bot_logging import setup_logging, stop_logging
+from bot.but_gui import HelpMenu, open_creator
+from bot.embed_updates import (
+    fetch_embed_group,
+    running_auto_updates,
+    start_auto_update,
+)
+from bot.channel_activity import TRACKER, checkpoint_activity, handle_message
+from bot.history import HISTORY
+from bot.interaction_deadline import record_response
+from bot.scheduled_embeds import install_handlers
+from bot.scheduler import SCHEDULER
+from bot.guild_index import (
+    GuildIndex,
+    handle_channels_change,
+    handle_member_join,
+    handle_member_remove,
+    handle_member_update,
+    handle_presence_update,
+    handle_roles_change,
+    handle_user_update,
+    handle_voice_state_update,
+    rebuild_guild_index,
+    guild_indexes,
+    reconcile_guild_index,
+    register_guild_index,
 )
-from bot.but_gui import EmbedCreator, HelpMenu, auto_update
+from bot.index_snapshot import (
+    checkpoint_indexes,
+    load_index_snapshots,
+    save_index_snapshots,
+)
+from bot.rest_tokens import REST_VALUES
+from bot.metrics import install_rate_limit_hook, start_metrics_server
+from bot.render import DESCRIPTION_LIMIT, FIELD_VALUE_LIMIT
+from bot.snapshot import dump_snapshot
+from bot.stats_embed import create_stats_embed
+from bot.syntax_explain import explain_for_guild, explanation_message
+from bot.template_cache import load_compiled_cache, save_compiled_cache
+from bot.template_library import LIBRARY
+
+# pylint: enable=wrong-import-order,ungrouped-imports
 
 load_dotenv()  # loads your local .env file with the discord token
 DISCORD_TOKEN: Optional[str] = os.getenv("DISCORD_TOKEN")
+# Guilds the slash commands are registered in; `GUILD_ID` holds a single guild.
+GUILD_IDS = [
+    int(guild_id)
+    for guild_id in (os.getenv("GUILD_IDS") or os.getenv("GUILD_ID") or "").split(",")
+    if guild_id.strip()
+]
+
+logger = logging.getLogger(__name__)
+
+
+def command_guilds(command):
+    """Decorator registering a slash command in the guilds of `GUILD_IDS`,
+    or globally if there are none."""
+    if not GUILD_IDS:
+        return command
+    return app_commands.guilds(*GUILD_IDS)(command)
+
 
+def shard_options() -> dict:
+    """Returns the sharding arguments of the bot from `config.ini`.
 
-class Bot(commands.Bot):
+    Without `shard_count` Discord recommends the number of shards. With
+    `shard_ids`, several processes, each started with its own `config.ini`,
+    can split the shards between them."""
+    options: dict = {}
+    if read_setting("shard_count"):
+        options["shard_count"] = int(read_setting("shard_count"))
+        if read_setting("shard_ids"):
+            options["shard_ids"] = [
+                int(shard_id) for shard_id in read_setting("shard_ids").split(",")
+            ]
+    return options
+
+
+class Bot(commands.AutoShardedBot):
     """
-    A subclass of the `commands.Bot` class.
-    The main class that initializes and operates the bot on the server.
+    A subclass of the `commands.AutoShardedBot` class.
+    The main class that initializes and operates the bot on the servers.
     """
 
     def __init__(self):
         intents = discord.Intents.default()
         intents.guilds = True
         intents.members = True
+        # Presences are a privileged intent, so the online tokens are opt-in.
+        intents.presences = read_setting("presence_intent").lower() == "true"
+        GuildIndex.presence_tracking = intents.presences
         intents.messages = True
         intents.message_content = True
-        super().__init__(command_prefix="!", intents=intents)
+        # With index snapshots, members are requested in the background after
+        # the bot is ready instead of delaying it.
+        super().__init__(
+            command_prefix="!",
+            intents=intents,
+            chunk_guilds_at_startup=not read_setting("index_snapshot_directory"),
+            **shard_options(),
+        )
+        api_base_url = read_setting("api_base_url")
+        if api_base_url:
+            discord.http.Route.BASE = api_base_url.rstrip("/")
+        self.metrics_server: Optional[asyncio.AbstractServer] = None
+        self.reconcile_tasks: set[asyncio.Task] = set()
 
-    async def on_ready(self):
-        """Sends notification message when connected to the server."""
-        print(f"\nLogged in as {self.user} (ID: {self.user.id})")
-        print(f"Logging time {time.strftime('%X')}")
-        print("-----------------------------------")
-        try:
-            synced = await self.tree.sync(
-                guild=discord.Object(id=os.getenv("GUILD_ID"))
+    async def setup_hook(self):
+        """Restores the channel activity from its checkpoint and loads scheduled
+        jobs, the compiled templates and the guild index snapshots. The template
+        library is read on first use."""
+        PROFILE.mark("login")
+        install_rate_limit_hook()
+        GuildIndex.fuzzy_lookup = read_setting("fuzzy_lookup").lower() == "true"
+        HISTORY.directory = read_setting("history_directory")
+        SCHEDULER.path = read_setting("schedule_file")
+        SCHEDULER.load()
+        SESSIONS.max_sessions = int(read_setting("creator_sessions"))
+        SESSIONS.max_bytes = int(read_setting("creator_session_memory_kib")) * 1024
+        REST_VALUES.placeholder = read_setting("rest_token_placeholder")
+        REST_VALUES.timeout = float(read_setting("rest_token_timeout"))
+        LIBRARY.path = read_setting("template_library")
+        compiled_cache = read_setting("compiled_cache")
+        if compiled_cache:
+            restored = load_compiled_cache(compiled_cache)
+            logger.info(
+                "Restored %s compiled templates.",
+                restored,
+                extra={"event": "template_cache"},
             )
-            print(f"Synced {len(synced)} slash commands for {self.user}.")
-        except Exception as errors:  # pylint: disable=broad-exception-caught
-            print(errors)
+        index_directory = read_setting("index_snapshot_directory")
+        if index_directory:
+            for index in load_index_snapshots(index_directory):
+                register_guild_index(index)
+            checkpoint_indexes.start(index_directory)
+        activity_checkpoint = read_setting("activity_checkpoint")
+        if activity_checkpoint:
+            TRACKER.load(activity_checkpoint)
+            checkpoint_activity.start(activity_checkpoint)
+
+    async def start_metrics(self):
+        """Starts the metrics endpoint if `metrics_port` is set in `config.ini`."""
+        port = int(read_setting("metrics_port"))
+        self.metrics_server = await start_metrics_server(port)
+        if self.metrics_server is not None:
+            logger.info(
+                "Metrics available at http://127.0.0.1:%s/metrics",
+                port,
+                extra={"event": "metrics_server"},
+            )
+
+    async def on_ready(self):
+        """Sends notification message when connected to the server. The metrics
+        endpoint is started only now, so it does not delay the connection."""
+        PROFILE.mark("gateway_ready")
+        logger.info(
+            "Logged in as %s (ID: %s)",
+            self.user,
+            self.user.id,
+            extra={"event": "ready"},
+        )
+        for guild in [discord.Object(id=guild_id) for guild_id in GUILD_IDS] or [None]:
+            try:
+                synced = await self.tree.sync(guild=guild)
+                logger.info(
+                    "Synced %s slash commands for %s.",
+                    len(synced),
+                    self.user,
+                    extra={
+                        "event": "tree_sync",
+                        "guild_id": guild.id if guild else None,
+                    },
+                )
+            except Exception:  # pylint: disable=broad-exception-caught
+                logger.exception(
+                    "Syncing slash commands failed.", extra={"event": "tree_sync"}
+                )
+        PROFILE.mark("tree_sync")
+        for guild in self.guilds:
+            if read_setting("index_snapshot_directory"):
+                # Keeps a reference, so the task is not garbage collected.
+                task = asyncio.create_task(reconcile_guild_index(guild))
+                self.reconcile_tasks.add(task)
+                task.add_done_callback(self.reconcile_tasks.discard)
+            else:
+                rebuild_guild_index(guild)
+        install_handlers(self)
+        SCHEDULER.start()
+        if self.metrics_server is None:
+            await self.start_metrics()
         await self.setup()
 
+    async def close(self):
+        """Writes the channel activity checkpoint, the current hour of the
+        history, the compiled templates and the guild index snapshots before
+        disconnecting."""
+        HISTORY.flush()
+        if checkpoint_indexes.is_running():
+            checkpoint_indexes.cancel()
+            save_index_snapshots(
+                read_setting("index_snapshot_directory"), guild_indexes()
+            )
+        compiled_cache = read_setting("compiled_cache")
+        if compiled_cache:
+            templates = set(LIBRARY.all_templates())
+            for guild_id in self.guild_configs():
+                with guild_config(guild_id):
+                    templates.update(read_saved_templates())
+            for job in SCHEDULER.jobs.values():
+                if job.action == "publish":
+                    templates.add(job.data["description"])
+                    templates.update(job.data["field_values"])
+            save_compiled_cache(compiled_cache, templates)
+        if checkpoint_activity.is_running():
+            checkpoint_activity.cancel()
+            TRACKER.save(read_setting("activity_checkpoint"))
+        await super().close()
+
+    async def on_message(self, message: discord.Message, /):
+        """Counts the message in the channel activity and processes commands."""
+        handle_message(message)
+        await self.process_commands(message)
+
+    async def on_member_join(self, member: discord.Member):
+        """Adds a new member to the guild index."""
+        handle_member_join(member)
+
+    async def on_member_remove(self, member: discord.Member):
+        """Removes a member from the guild index."""
+        handle_member_remove(member)
+
+    async def on_member_update(self, _: discord.Member, after: discord.Member):
+        """Updates nickname and roles of a member in the guild index."""
+        handle_member_update(after)
+
+    async def on_presence_update(self, _: discord.Member, after: discord.Member):
+        """Updates the online counters of the guild index."""
+        handle_presence_update(after)
+
+    async def on_user_update(self, _: discord.User, after: discord.User):
+        """Updates the username of a member in the guild index."""
+        handle_user_update(after)
+
+    async def on_voice_state_update(self, member: discord.Member, *_):
+        """Updates the voice occupancy in the guild index."""
+        handle_voice_state_update(member)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        """Cancels the scheduled jobs of a guild the bot was removed from."""
+        SCHEDULER.cancel_guild(guild.id)
+
+    async def on_guild_role_create(self, role: discord.Role):
+        """Updates roles in the guild index."""
+        handle_roles_change(role.guild)
+
+    async def on_guild_role_delete(self, role: discord.Role):
+        """Updates roles in the guild index."""
+        handle_roles_change(role.guild)
+
+    async def on_guild_role_update(self, _: discord.Role, after: discord.Role):
+        """Updates roles in the guild index."""
+        handle_roles_change(after.guild)
+
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel):
+        """Updates channels in the guild index."""
+        handle_channels_change(channel.guild)
+
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        """Updates channels in the guild index."""
+        handle_channels_change(channel.guild)
+
+    async def on_guild_channel_update(
+        self, _: discord.abc.GuildChannel, after: discord.abc.GuildChannel
+    ):
+        """Updates channels in the guild index."""
+        handle_channels_change(after.guild)
+
+    def guild_configs(self) -> list[int]:
+        """Returns one guild for every distinct file of embed variables."""
+        configs = {guild_config_path(guild.id): guild.id for guild in self.guilds}
+        return list(configs.values())
+
     async def setup(self):
+        """Restores the last sent embed of every guild."""
+        await self.wait_until_ready()
+        for guild_id in self.guild_configs():
+            with guild_config(guild_id):
+                await self.restore_embed()
+        # With an embed restored, the profile ends with its first render.
+        PROFILE.mark("restore", final=not running_auto_updates())
+
+    async def restore_embed(self):
         """
         Reads data from the `config.ini`, recalls the last sent message,
         runs `auto_update`.
 
         Checks if `config.ini` contains data to retrieve
         the last message sent by the bot.
-        Recalls the message from this data and runs `auto_update`.
+        Recalls the message, and the other messages of its embed group,
+        from this data and runs `auto_update`.
         In case of failure, it informs about the reason of the problem
         and overwrites the `False` value with all data from the `config.ini` file.
         """
-        print("\nAttempting to retrieve last message.")
-        await self.wait_until_ready()
+        logger.info("Attempting to retrieve last message.", extra={"event": "restore"})
         try:
             embed_channel_id = read_from_config("embed_channel_id")
             embed_message_id = read_from_config("embed_message_id")
             channel = await self.fetch_channel(embed_channel_id)
         except (discord.NotFound, discord.HTTPException):
-            print("\nChannel Not Found. Resetting values in config.ini.")
+            logger.warning(
+                "Channel Not Found. Resetting values in config.ini.",
+                extra={"event": "restore"},
+            )
             save_values_from_ram_to_memory()
             return
         try:
             last_message = await channel.fetch_message(embed_message_id)
             embed = last_message.embeds[0]
             ctx = await self.get_context(last_message)
-            auto_update.start(last_message, embed, ctx)
+            group = await fetch_embed_group(self)
+            start_auto_update(last_message, embed, ctx, group)
         except (discord.NotFound, discord.HTTPException):
-            print("\nMessage not Found. Resetting values in config.ini.")
+            logger.warning(
+                "Message not Found. Resetting values in config.ini.",
+                extra={"event": "restore"},
+            )
             save_values_from_ram_to_memory()
             return
-        print("\nLast message found successfully. Automatic refresh started.")
+        logger.info(
+            "Last message found successfully. Automatic refresh started.",
+            extra={"event": "restore", "embed_id": last_message.id},
+        )
 
 
+log_listener = setup_logging(
+    read_setting("log_level"),
+    read_setting("log_levels"),
+    float(read_setting("log_repeat_interval")),
+)
 check_for_config_file()
+PROFILE.mark("config_load")
 
 bot = Bot()
 bot.remove_command("help")
 
 
+@bot.before_invoke
+async def use_invoking_guild_config(ctx: commands.Context):
+    """Makes the command read and write the embed variables of its guild."""
+    if ctx.guild:
+        use_guild_config(ctx.guild.id)
+
+
+@bot.after_invoke
+async def record_command_response(ctx: commands.Context):
+    """Records the time to the first response of a slash command. Commands
+    answer when they finish, so it is measured after the command."""
+    if ctx.interaction is not None and ctx.command is not None:
+        record_response(ctx.interaction, ctx.command.qualified_name)
+
+
 @bot.event
 async def on_command_error(ctx: commands.Context, error: Exception):
     """Replies with an error message if one occured."""
-    print(str(error))
+    logger.warning(
+        str(error),
+        extra={
+            "event": "command_error",
+            "command": ctx.command.qualified_name if ctx.command else None,
+            "guild_id": ctx.guild.id if ctx.guild else None,
+            "throttle": True,
+        },
+    )
     await ctx.reply(str(error), ephemeral=True)
 
 
@@ -100,7 +409,7 @@ async def on_command_error(ctx: commands.Context, error: Exception):
     with_app_command=True,
     description="Create your own embed with Embed Creator",
 )
-@app_commands.guilds(discord.Object(id=os.getenv("GUILD_ID")))
+@command_guilds
 @commands.check_any(
     commands.has_guild_permissions(manage_roles=True),
     commands.has_guild_permissions(view_audit_log=True),
@@ -115,8 +424,7 @@ async def embed_creator(ctx: commands.Context):
     """
     new_embed = discord.Embed(title="Title", description="None")
     new_embed.set_thumbnail(url="https://knr.edu.pl/images/KNR_log.png")
-    view = EmbedCreator(new_embed, ctx)
-    await ctx.send(content="**Preview of the embed:**", view=view, embed=new_embed)
+    await open_creator(ctx, new_embed)
 
 
 @bot.hybrid_command(
@@ -124,7 +432,7 @@ async def embed_creator(ctx: commands.Context):
     with_app_command=True,
     description="Edit previously deployed embed",
 )
-@app_commands.guilds(discord.Object(id=os.getenv("GUILD_ID")))
+@command_guilds
 @commands.check_any(
     commands.has_guild_permissions(manage_roles=True),
     commands.has_guild_permissions(view_audit_log=True),
@@ -150,20 +458,126 @@ async def embed_update(ctx: commands.Context):
                 create_config_ram()
                 last_embed = last_message.embeds[0]
                 update_flag = True
-                view = EmbedCreator(last_embed, ctx, last_message, update_flag)
-                await ctx.send(
-                    content="**Preview of the embed:**", view=view, embed=last_embed
-                )
+                await open_creator(ctx, last_embed, last_message, update_flag)
     except (AttributeError, ValueError):
         await ctx.send("Could not find last embed.")
 
 
+@bot.hybrid_command(
+    name="template_export",
+    with_app_command=True,
+    description="Export the template library of this server as a file",
+)
+@command_guilds
+@commands.check_any(
+    commands.has_guild_permissions(manage_roles=True),
+    commands.has_guild_permissions(view_audit_log=True),
+)
+async def template_export(ctx: commands.Context):
+    """Sends the template library of the guild as a JSON file.
+
+    Args:
+        ctx (`discord.ext.commands.Context`): necessary parameter when accesing
+        some discord server data. Used by internal methods.
+
+    """
+    if ctx.guild is None:
+        return
+    library_file = discord.File(
+        io.BytesIO(LIBRARY.export(ctx.guild.id)), "templates.json"
+    )
+    await ctx.send(file=library_file, ephemeral=True)
+
+
+@bot.hybrid_command(
+    name="template_import",
+    with_app_command=True,
+    description="Import templates from an exported library file into this server",
+)
+@command_guilds
+@commands.check_any(
+    commands.has_guild_permissions(manage_roles=True),
+    commands.has_guild_permissions(view_audit_log=True),
+)
+async def template_import(ctx: commands.Context, file: discord.Attachment):
+    """Adds the templates of an exported library file to the library of the guild.
+
+    Args:
+        ctx (`discord.ext.commands.Context`): necessary parameter when accesing
+        some discord server data. Used by internal methods.
+        file (`discord.Attachment`): The file exported by `template_export`.
+
+    """
+    if ctx.guild is None:
+        return
+    try:
+        imported = LIBRARY.import_templates(ctx.guild.id, await file.read())
+    except ValueError as error:
+        await ctx.send(str(error), ephemeral=True)
+    else:
+        await ctx.send(f"Imported {imported} templates.", ephemeral=True)
+
+
+@bot.hybrid_command(
+    name="template_delete",
+    with_app_command=True,
+    description="Delete a template from the library of this server",
+)
+@command_guilds
+@commands.check_any(
+    commands.has_guild_permissions(manage_roles=True),
+    commands.has_guild_permissions(view_audit_log=True),
+)
+async def template_delete(ctx: commands.Context, *, name: str):
+    """Removes a template from the library of the guild.
+
+    Args:
+        ctx (`discord.ext.commands.Context`): necessary parameter when accesing
+        some discord server data. Used by internal methods.
+        name (str): The name of the template.
+
+    """
+    if ctx.guild is None:
+        return
+    if LIBRARY.delete(ctx.guild.id, name):
+        await ctx.send(f"Deleted template `{name}`.", ephemeral=True)
+    else:
+        await ctx.send(f"There is no template `{name}`.", ephemeral=True)
+
+
+@bot.hybrid_command(
+    name="guild_snapshot",
+    with_app_command=True,
+    description="Export the members, roles and channels for offline rendering",
+)
+@command_guilds
+@commands.check_any(
+    commands.has_guild_permissions(manage_roles=True),
+    commands.has_guild_permissions(view_audit_log=True),
+)
+async def guild_snapshot(ctx: commands.Context):
+    """Sends a snapshot of the server to be used with `python -m bot.render`.
+
+    Args:
+        ctx (`discord.ext.commands.Context`): necessary parameter when accesing
+        some discord server data. Used by internal methods.
+
+    """
+    if ctx.guild is None:
+        return
+    snapshot_file = discord.File(
+        io.BytesIO(dump_snapshot(ctx.guild, compress=True)),
+        f"{ctx.guild.id}.json.gz",
+    )
+    await ctx.send(file=snapshot_file, ephemeral=True)
+
+
 @bot.hybrid_command(
     name="help",
     with_app_command=True,
     description="Read how to use this bot.",
 )
-@app_commands.guilds(discord.Object(id=os.getenv("GUILD_ID")))
+@command_guilds
 @commands.check_any(
     commands.has_guild_permissions(manage_roles=True),
     commands.has_guild_permissions(view_audit_log=True),
@@ -180,7 +594,66 @@ async def bot_help(ctx: commands.Context):
     await ctx.send(view=view)
 
 
+@bot.hybrid_command(
+    name="bot_stats",
+    with_app_command=True,
+    description="Show render timings and cache statistics of the bot.",
+)
+@command_guilds
+@commands.check_any(
+    commands.has_guild_permissions(manage_roles=True),
+    commands.has_guild_permissions(view_audit_log=True),
+)
+async def bot_stats(ctx: commands.Context):
+    """Shows hot-path timings and cache statistics of the bot.
+
+    Args:
+        ctx (`discord.ext.commands.Context`): necessary parameter when accesing
+        some discord server data. Used by internal methods.
+
+    """
+    await ctx.send(embed=create_stats_embed(bot), ephemeral=True)
+
+
+@bot.hybrid_command(
+    name="syntax_explain",
+    with_app_command=True,
+    description="Show how a template is parsed, evaluated and rendered.",
+)
+@command_guilds
+@commands.check_any(
+    commands.has_guild_permissions(manage_roles=True),
+    commands.has_guild_permissions(view_audit_log=True),
+)
+async def syntax_explain(
+    ctx: commands.Context, field: Optional[bool] = False, *, template: str
+):
+    """Shows the tokens of a template, the names they resolve to, the evaluation
+    steps of role expressions with their sizes and times, and the length of
+    the result against the embed limits.
+
+    Args:
+        ctx (`discord.ext.commands.Context`): necessary parameter when accesing
+        some discord server data. Used by internal methods.
+        field (bool, optional): Whether the template is a field value instead of
+        the description.
+        template (str): The template to explain.
+
+    """
+    part, limit = (
+        ("field value", FIELD_VALUE_LIMIT)
+        if field
+        else ("description", DESCRIPTION_LIMIT)
+    )
+    explanation = explain_for_guild(ctx.guild, [(part, template, limit)])
+    await ctx.send(ephemeral=True, **explanation_message(explanation))
+
+
 if DISCORD_TOKEN:
-    bot.run(DISCORD_TOKEN)
+    try:
+        bot.run(DISCORD_TOKEN, log_handler=None)
+    finally:
+        stop_logging(log_listener)
 else:
-    print("Can't find token to access the bot.")
+    logger.error("Can't find token to access the bot.", extra={"event": "startup"})
+    stop_logging(log_listener)
@@ -0,0 +1,27 @@
+"""A small guild shared by the tests."""
+
+from bot.snapshot import guild_from_snapshot
+
+
+def build_guild(guild_id: int = 1):
+    """Returns a small guild with every kind of name the tokens look up."""
+    roles = [(10, "Member"), (11, "Lead"), (12, "Alumni")]
+    members = [
+        {
+            "id": 1000 + number,
+            "name": name,
+            "roles": [10] + ([11] if number % 3 == 0 else []) + [12] * (number == 4),
+            "status": "online" if number % 2 else "offline",
+            "voice_channel": 21 if number < 2 else None,
+        }
+        for number, name in enumerate(["ana", "bo", "cy", "dee", "eli", "fay", "gus"])
+    ]
+    return guild_from_snapshot(
+        {
+            "id": guild_id,
+            "roles": [{"id": role_id, "name": name} for role_id, name in roles],
+            "text_channels": [{"id": 20, "name": "general"}],
+            "voice_channels": [{"id": 21, "name": "lab"}],
+            "members": members,
+        }
+    )
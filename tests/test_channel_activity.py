@@ -0,0 +1,79 @@
+"""Tests the rolling channel activity statistics and their checkpoints."""
+
+import pytest
+from bot.channel_activity import ActivityRing, ActivityTracker
+
+NOW = 1_700_000_000.0
+
+
+@pytest.fixture(name="tracker")
+def fixture_tracker():
+    """A tracker with a day of messages in one channel, by 300 authors."""
+    tracker = ActivityTracker()
+    for message in range(3000):
+        tracker.record(7, 1000 + message % 300, NOW - message * 25)
+    return tracker
+
+
+def test_messages_are_counted_per_window(tracker, monkeypatch):
+    """Messages older than the window are left out."""
+    monkeypatch.setattr("time.time", lambda: NOW)
+
+    assert tracker.messages(7, "1h") == 143  # the minutes since NOW - 3560
+    assert tracker.messages(7, "24h") == 3000
+    assert tracker.messages(7, "7d") == 3000
+    assert tracker.messages(8, "1h") == 0
+
+
+def test_posters_are_estimated(tracker, monkeypatch):
+    """Distinct authors are estimated within the error of the sketches."""
+    monkeypatch.setattr("time.time", lambda: NOW)
+
+    assert tracker.posters(7, "24h") == pytest.approx(300, rel=0.15)
+    assert tracker.posters(7, "7d") == pytest.approx(300, rel=0.15)
+
+
+def test_reused_slots_are_reset():
+    """A slot reused for a later period forgets the earlier one."""
+    ring = ActivityRing(3, 60)
+    ring.add(0, 1 << 63)
+    ring.add(180, 1 << 62)
+
+    assert ring.messages(180) == 1
+    assert ring.posters(180) == 1
+    assert ring.messages(600) == 0
+
+
+def test_checkpoint_round_trip(tracker, tmp_path, monkeypatch):
+    """A loaded checkpoint has the same counts and sketches."""
+    monkeypatch.setattr("time.time", lambda: NOW)
+    path = str(tmp_path / "activity.bin")
+    tracker.save(path)
+
+    loaded = ActivityTracker()
+
+    assert loaded.load(path)
+    for window in ("1h", "24h", "7d"):
+        assert loaded.messages(7, window) == tracker.messages(7, window)
+    assert loaded.posters(7, "24h") == tracker.posters(7, "24h")
+
+
+@pytest.mark.parametrize("change", ["truncate", "extend", "magic", "typecodes"])
+def test_unreadable_checkpoints_are_ignored(tracker, tmp_path, change):
+    """Checkpoints cut short, too long or of another format load nothing."""
+    path = tmp_path / "activity.bin"
+    tracker.save(str(path))
+    data = path.read_bytes()
+    path.write_bytes(
+        {
+            "truncate": data[:-100],
+            "extend": data + bytes(8),
+            "magic": b"BCA1" + data[4:],
+            "typecodes": data[:8] + b"qL" + data[10:],
+        }[change]
+    )
+
+    loaded = ActivityTracker()
+
+    assert not loaded.load(str(path))
+    assert not loaded.channels
@@ -0,0 +1,89 @@
+"""Tests the registry of open Embed Creator sessions."""
+
+import asyncio
+from bot.creator_sessions import SessionRegistry
+
+
+class FakeSession:
+    """A session of a fixed size that remembers being closed."""
+
+    def __init__(self, size: int = 100):
+        self.size = size
+        self.closed = False
+
+    def memory_usage(self) -> int:
+        """Returns the size of the session."""
+        return self.size
+
+    async def close(self) -> None:
+        """Marks the session as closed."""
+        self.closed = True
+
+
+def test_least_recently_used_sessions_are_closed():
+    """Over the session limit, the sessions used longest ago are closed first."""
+    registry = SessionRegistry(max_sessions=2)
+    first, second, third = FakeSession(), FakeSession(), FakeSession()
+
+    async def open_sessions():
+        await registry.add(first, 1)
+        await registry.add(second, 1)
+        registry.touch(first)
+        await registry.add(third, 1)
+
+    asyncio.run(open_sessions())
+
+    assert second.closed
+    assert not first.closed and not third.closed
+    assert registry.sessions(1) == [first, third]
+
+
+def test_sessions_over_the_memory_cap_are_closed():
+    """Sessions are closed until their memory fits, but the newest is kept."""
+    registry = SessionRegistry(max_sessions=10, max_bytes=250)
+    small, large = FakeSession(100), FakeSession(1000)
+
+    async def open_sessions():
+        await registry.add(small, 1)
+        await registry.add(FakeSession(100), 1)
+        await registry.add(large, 1)
+
+    asyncio.run(open_sessions())
+
+    assert small.closed
+    assert registry.sessions(1) == [large]
+    assert registry.memory_usage() == 1000
+
+
+def test_discarded_sessions_are_forgotten():
+    """Finished sessions no longer count towards the limits."""
+    registry = SessionRegistry(max_sessions=1)
+    session = FakeSession()
+    asyncio.run(registry.add(session, 1))
+
+    registry.discard(session)
+    registry.touch(session)
+
+    assert not registry
+    assert not registry.guilds
+    assert not session.closed
+
+
+def test_guilds_have_separate_limits():
+    """Sessions of one guild do not close the sessions of another."""
+    registry = SessionRegistry(max_sessions=1)
+    other, first, second = FakeSession(), FakeSession(), FakeSession()
+
+    async def open_sessions():
+        await registry.add(other, 2)
+        await registry.add(first, 1)
+        await registry.add(second, 1)
+
+    asyncio.run(open_sessions())
+
+    assert first.closed
+    assert not other.closed
+    assert registry.sessions(2) == [other]
+    assert len(registry) == 2
+    assert registry.memory_usage() == 200
+    assert registry.memory_usage(1) == 100
@@ -0,0 +1,109 @@
+"""Tests the guild index and its lookups."""
+
+import pytest
+from bot.fuzzy import TrigramIndex
+from bot.guild_index import GuildIndex
+from bot.message_syntax_functions import render_template
+from tests.guilds import build_guild
+
+
+@pytest.fixture(name="index")
+def fixture_index():
+    """An index of the test guild."""
+    return GuildIndex.from_guild(build_guild())  # type: ignore
+
+
+def test_trigram_search_ranks_similar_names_first():
+    """Search is case-insensitive and ranks by similarity."""
+    trigram_index = TrigramIndex()
+    for key, name in enumerate(["Electronics", "Electrical Team", "Mechanics"]):
+        trigram_index.add(key, name)
+
+    assert [key for _, key in trigram_index.search("ELECTRONIC", 3, 0.2)] == [0, 1]
+    assert trigram_index.search("zzz") == []
+
+
+def test_trigram_index_follows_changes():
+    """Replaced and removed names are no longer found."""
+    trigram_index = TrigramIndex()
+    trigram_index.add(1, "Mechanics")
+    trigram_index.add(1, "Software")
+    trigram_index.add(2, "Hardware")
+    trigram_index.remove(2)
+
+    assert [key for _, key in trigram_index.search("software")] == [1]
+    assert not trigram_index.search("mechanics")
+    assert not trigram_index.search("hardware", min_score=0.5)
+
+
+def test_suggestions(index):
+    """Names that are not found get the most similar names as suggestions."""
+    assert index.find_role("lead") is None
+    assert index.suggest("roles", "lead") == ["Lead"]
+    assert index.suggest("members", "anna") == ["ana"]
+
+
+def test_fuzzy_lookup(index, monkeypatch):
+    """With fuzzy lookup enabled, close names resolve to the most similar one."""
+    monkeypatch.setattr(GuildIndex, "fuzzy_lookup", True)
+
+    assert index.find_role("Leads") == 11
+    assert index.find_text_channel("genral") == 20
+    assert index.find_role("Robotics") is None
+    assert index.find_member("gus") == index.slot_by_id[1006]
+
+
+def test_fuzzy_lookup_follows_renames(index, monkeypatch):
+    """The member trigram index is updated in place when names change."""
+    monkeypatch.setattr(GuildIndex, "fuzzy_lookup", True)
+    slot = index.slot_by_id[1006]
+    index.find_member("gus")  # builds the trigram indexes
+
+    index.rename_member(slot, "augustus")
+
+    assert index.find_member("augustas") == slot
+    assert "gus" not in index.trigram_index("members").names.values()
+
+
+def test_snapshot_is_not_changed_by_later_events(index):
+    """A snapshot keeps rendering the state it was taken in."""
+    templates = [
+        "{count_members Lead}",
+        "{list_members Lead}",
+        "{count_online Member}",
+        "{member gus}",
+        "{voice_occupancy lab}",
+    ]
+    before = [render_template(index, template) for template in templates]
+    snapshot = index.snapshot()
+
+    index.remove_member(1000)
+    index.set_presence(1002, True)
+    index.set_voice_channel(1003, 21)
+    index.rename_member(index.slot_by_id[1006], "augustus")
+
+    assert [render_template(snapshot, template) for template in templates] == before
+    assert [render_template(index, template) for template in templates] == [
+        "2",
+        "<@1003>, <@1006>",
+        "4",
+        "[None]",
+        "2",
+    ]
+
+
+def test_release_stops_copying(index):
+    """Containers are copied once while a snapshot is in use, then changed in
+    place again after it is released."""
+    snapshot = index.snapshot()
+    index.set_presence(1000, True)
+    copied = index.online
+    index.set_presence(1002, True)
+
+    assert copied is not snapshot.online
+    assert index.online is copied
+
+    index.release()
+    assert not index.shared
+    index.set_presence(1004, True)
+    assert index.online is copied
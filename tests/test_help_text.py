@@ -0,0 +1,25 @@
+"""Tests the text of the help menu."""
+
+import pytest
+from bot.help_text import SECTIONS, SYNTAX, help_fields
+from bot.message_syntax_functions import TOKEN_TYPES
+from bot.render import EMBED_LIMIT, FIELD_VALUE_LIMIT
+
+
+@pytest.mark.parametrize("section", SECTIONS)
+def test_sections_fit_in_an_embed(section):
+    """Every field and the whole section are within the limits of Discord."""
+    fields = help_fields(section)
+
+    assert all(len(value) <= FIELD_VALUE_LIMIT for _, value in fields)
+    assert sum(len(name) + len(value) for name, value in fields) <= EMBED_LIMIT
+    assert "\n\n".join(value for _, value in fields) == "\n\n".join(
+        SECTIONS[section][1]
+    )
+
+
+def test_every_token_is_described():
+    """The syntax section mentions every registered token."""
+    text = "\n".join(SYNTAX)
+
+    assert [name for name in TOKEN_TYPES if "{" + name not in text] == []
@@ -0,0 +1,78 @@
+"""Tests the hourly history of rendered values."""
+
+import os
+from bot.history import RECORD, SLOTS, WEEK_HOURS, Series, sparkline
+
+HOUR = 3600
+START = 500_000
+
+
+def record_hours(series: Series, values: list[float], first_hour: int = START):
+    """Records one value per hour, starting at `first_hour`."""
+    for offset, value in enumerate(values):
+        series.record(value, (first_hour + offset) * HOUR + 1)
+
+
+def test_finished_hours_are_written_and_read_back(tmp_path):
+    """Each hour is appended once the next one starts, and a restarted series
+    reads them back."""
+    path = str(tmp_path / "series.bin")
+    series = Series(path)
+    record_hours(series, [1, 2, 3])
+    series.record(4, (START + 2) * HOUR + 60)  # last value of the hour wins
+
+    assert os.path.getsize(path) == 2 * RECORD.size
+    series.flush()
+    restarted = Series(path)
+
+    assert restarted.written_hour == START + 2
+    assert [restarted.value_at(START + hour) for hour in range(3)] == [1, 2, 4]
+
+
+def test_flushing_an_hour_again_does_not_repeat_it(tmp_path):
+    """An hour flushed on shutdown and again after a restart within the same hour
+    is stored once, with its last value."""
+    path = str(tmp_path / "series.bin")
+    series = Series(path)
+    record_hours(series, [1, 2])
+    series.flush()
+    series.flush()
+
+    restarted = Series(path)
+    restarted.record(5, (START + 1) * HOUR + 120)
+    restarted.flush()
+
+    with open(path, "rb") as series_file:
+        records = list(RECORD.iter_unpack(series_file.read()))
+    assert records == [(START, 1.0), (START + 1, 5.0)]
+
+
+def test_only_the_last_week_is_loaded(tmp_path):
+    """Loading a long series reads only the records of the last week."""
+    path = str(tmp_path / "series.bin")
+    with open(path, "wb") as series_file:
+        for hour in range(START, START + 3 * SLOTS):
+            series_file.write(RECORD.pack(hour, hour - START))
+        series_file.write(b"\0\0\0")  # a record cut short by a crash
+
+    series = Series(path)
+    last_hour = START + 3 * SLOTS - 1
+    series.current_hour = last_hour
+
+    assert series.written_hour == last_hour
+    assert series.value_at(last_hour) == 3 * SLOTS - 1
+    assert series.value_at(last_hour - WEEK_HOURS) == 2 * SLOTS
+    assert series.value_at(last_hour - SLOTS, oldest=0) is None
+
+
+def test_week_leaves_out_hours_before_the_first_sample():
+    """A series younger than a week has fewer points."""
+    series = Series(None)
+    record_hours(series, [float(hour) for hour in range(WEEK_HOURS // 2 + 1)])
+
+    week = series.week(8)
+
+    assert week == [12.0, 36.0, 60.0, 84.0]
+    assert sparkline(week) == "▁▃▆█"
+    assert sparkline([3.0, 3.0]) == "▁▁"
+    assert sparkline([]) == ""
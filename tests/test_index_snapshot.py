@@ -0,0 +1,61 @@
+"""Tests saving guild indexes to snapshots and rendering from the loaded copies."""
+
+from bot.guild_index import GuildIndex
+from bot.index_snapshot import load_index_snapshots, save_index_snapshots
+from bot.message_syntax_functions import render_template
+from tests.guilds import build_guild
+
+TEMPLATES = [
+    "{count_members Member}",
+    "{list_members Member and Lead not Alumni}",
+    "{count_online Member or Lead}",
+    "{count_members not Alumni}",
+    "{member ana} {role Lead} {text_channel general} {voice_channel lab}",
+    "{voice_occupancy lab} / {voice_total}",
+    "{role_counts Member, Lead, Alumni}",
+]
+
+
+def test_round_trip_renders_the_same(tmp_path):
+    """A loaded snapshot renders every template like the index it was saved from."""
+    original = GuildIndex.from_guild(build_guild())  # type: ignore
+    original.remove_member(1005)  # leaves a free slot in the snapshot
+
+    assert save_index_snapshots(str(tmp_path), [original]) == 1
+    (loaded,) = load_index_snapshots(str(tmp_path))
+
+    assert loaded.guild_id == original.guild_id
+    assert not loaded.authoritative
+    for template in TEMPLATES:
+        assert render_template(loaded, template) == render_template(
+            original, template
+        ), template
+
+
+def test_only_authoritative_indexes_are_saved(tmp_path):
+    """Indexes not reconciled since they were loaded are not written back."""
+    index = GuildIndex.from_guild(build_guild())  # type: ignore
+    index.authoritative = False
+
+    assert save_index_snapshots(str(tmp_path), [index]) == 0
+    assert not load_index_snapshots(str(tmp_path))
+
+
+def test_unreadable_snapshots_are_skipped(tmp_path):
+    """A corrupt file does not keep the other snapshots from loading."""
+    save_index_snapshots(str(tmp_path), [GuildIndex.from_guild(build_guild())])
+    (tmp_path / "2.index").write_bytes(b"not a snapshot")
+
+    assert [index.guild_id for index in load_index_snapshots(str(tmp_path))] == [1]
+
+
+def test_truncated_snapshots_are_skipped(tmp_path):
+    """A snapshot cut short anywhere is skipped instead of loaded partially."""
+    save_index_snapshots(str(tmp_path), [GuildIndex.from_guild(build_guild())])
+    data = (tmp_path / "1.index").read_bytes()
+    (tmp_path / "1.index").unlink()
+    for size in (40, 48, len(data) // 2, len(data) - 1):
+        (tmp_path / f"{size}.index").write_bytes(data[:size])
+    (tmp_path / "trailing.index").write_bytes(data + b"\0")
+
+    assert not load_index_snapshots(str(tmp_path))
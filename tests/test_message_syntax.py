@@ -0,0 +1,105 @@
+"""Tests rendering message syntax through the token registry."""
+
+import pytest
+from bot.guild_index import GuildIndex, get_guild_index, register_guild_index
+from bot.message_syntax_functions import (
+    TOKEN_TYPES,
+    compile_template,
+    convert_string,
+    register_token,
+)
+from bot.snapshot import FakeContext
+from tests.guilds import build_guild
+
+
+@pytest.fixture(name="ctx")
+def fixture_ctx():
+    """A context in the test guild, with a freshly built index."""
+    guild = build_guild(32)
+    register_guild_index(GuildIndex.from_guild(guild))  # type: ignore
+    return FakeContext(guild)
+
+
+@pytest.mark.parametrize(
+    "template, rendered",
+    [
+        ("{count_members Member}", "7"),
+        ("{list_members Lead}", "<@1000>, <@1003>, <@1006>"),
+        ("{count_members Member and Lead not Alumni}", "3"),
+        ("{member bo}", "<@1001>"),
+        ("{role Lead}", "<@&11>"),
+        ("{text_channel general}", "<#20>"),
+        ("{voice_channel lab}", "<#21>"),
+        ("a {count_members Lead} b", "a 3 b"),
+    ],
+)
+def test_registered_tokens_render(ctx, template, rendered):
+    """Every built-in token is dispatched to its evaluator."""
+    assert convert_string(ctx, template) == rendered
+
+
+@pytest.mark.parametrize("template", ["{nonsense x}", "{count_members}", "{}"])
+def test_unknown_tokens_are_kept_as_text(ctx, template):
+    """Unregistered tokens and tokens missing their argument are not replaced."""
+    assert convert_string(ctx, template) == template
+
+
+def test_tokens_render_none_outside_a_guild():
+    """Without a guild every token renders as a placeholder."""
+    assert convert_string(None, "{count_members Member}") == "[None]"
+
+
+def test_registering_a_token_makes_it_available(ctx):
+    """A token registered later is dispatched, also in templates compiled before."""
+    assert convert_string(ctx, "{shout hi}") == "{shout hi}"
+    register_token("shout", parser=str.upper)(lambda index, argument: argument)
+    try:
+        assert convert_string(ctx, "{shout hi}") == "HI"
+    finally:
+        del TOKEN_TYPES["shout"]
+        compile_template.cache_clear()
+
+
+@pytest.mark.parametrize(
+    "argument, rows",
+    [
+        ("Lead, Member, Alumni", ["Lead    3", "Member  7", "Alumni  1"]),
+        ("Lead, Member, Alumni by count", ["Member  7", "Lead    3", "Alumni  1"]),
+        ("prefix:L", ["Lead  3"]),
+    ],
+)
+def test_role_counts(ctx, argument, rows):
+    """Role counts are listed in the given order, or by count, in aligned rows."""
+    rendered = convert_string(ctx, f"{{role_counts {argument}}}")
+
+    assert rendered == "```\n" + "\n".join(rows) + "\n```"
+
+
+def test_role_counts_follow_member_changes(ctx):
+    """The counts follow members leaving the guild."""
+    del ctx.guild.members_by_id[1003]
+    get_guild_index(ctx.guild).remove_member(1003)
+
+    assert convert_string(ctx, "{role_counts Lead}") == "```\nLead  2\n```"
+
+
+def test_role_counts_of_unknown_roles(ctx):
+    """Like the other role tokens, an unknown role name renders a placeholder."""
+    assert convert_string(ctx, "{role_counts Lead, Nobody}") == "[None]"
+
+
+@pytest.mark.parametrize(
+    "template, rendered",
+    [
+        ("{count_online Member}", "3"),
+        ("{count_online Member not Lead}", "2"),
+        ("{online_members Lead}", "<@1003>"),
+    ],
+)
+def test_online_tokens(ctx, monkeypatch, template, rendered):
+    """Online tokens count members with a status, but only while presences are
+    tracked."""
+    assert convert_string(ctx, template) == rendered
+
+    monkeypatch.setattr(GuildIndex, "presence_tracking", False)
+    assert convert_string(ctx, template) == "[None]"
@@ -0,0 +1,79 @@
+"""Tests the scheduler of delayed jobs."""
+
+import asyncio
+import time
+from bot.scheduler import JobScheduler
+
+
+def test_missed_jobs_run_oldest_first_after_a_restart(tmp_path):
+    """Jobs due while the bot was down are loaded from the file and run in order
+    of their due time, not of scheduling."""
+    path = str(tmp_path / "jobs.json")
+    scheduler = JobScheduler(path)
+    now = time.time()
+    scheduler.add(now - 10, "publish", 1, name="second")
+    cancelled = scheduler.add(now - 30, "publish", 1, name="cancelled")
+    scheduler.add(now - 20, "publish", 2, name="first")
+    scheduler.add(now + 3600, "publish", 2, name="later")
+    scheduler.cancel(cancelled.job_id)
+
+    restarted = JobScheduler(path)
+    restarted.load()
+    ran = []
+
+    async def publish(job):
+        ran.append(job.data["name"])
+
+    async def run_due():
+        restarted.handlers["publish"] = publish
+        restarted.start()
+        await asyncio.sleep(0.05)
+        restarted.task.cancel()
+
+    asyncio.run(run_due())
+
+    assert ran == ["first", "second"]
+    assert [job.data["name"] for job in restarted.jobs.values()] == ["later"]
+    reloaded = JobScheduler(path)
+    reloaded.load()
+    assert list(reloaded.jobs) == list(restarted.jobs)
+    assert reloaded.next_id == scheduler.next_id
+
+
+def test_jobs_added_while_running_wake_the_scheduler():
+    """A job due before the earliest pending one runs without waiting for it."""
+    scheduler = JobScheduler()
+    ran = []
+
+    async def publish(job):
+        ran.append(job.job_id)
+
+    async def run_jobs():
+        scheduler.handlers["publish"] = publish
+        scheduler.add(time.time() + 3600, "publish", 1)
+        scheduler.start()
+        await asyncio.sleep(0.01)
+        soon = scheduler.add(time.time() + 0.01, "publish", 1)
+        await asyncio.sleep(0.1)
+        scheduler.task.cancel()
+        return soon
+
+    soon = asyncio.run(run_jobs())
+
+    assert ran == [soon.job_id]
+
+
+def test_jobs_of_a_guild_are_cancelled_together(tmp_path):
+    """Cancelling the jobs of a guild leaves the jobs of other guilds pending."""
+    path = str(tmp_path / "jobs.json")
+    scheduler = JobScheduler(path)
+    kept = scheduler.add(time.time() + 60, "publish", 2)
+    scheduler.add(time.time() + 60, "publish", 1)
+    scheduler.add(time.time() + 120, "expire", 1)
+
+    assert scheduler.cancel_guild(1) == 2
+    assert scheduler.cancel_guild(1) == 0
+    reloaded = JobScheduler(path)
+    reloaded.load()
+    assert reloaded.guild_jobs(2) == [kept]
+    assert not reloaded.guild_jobs(1)
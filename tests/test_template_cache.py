@@ -0,0 +1,79 @@
+"""Tests the on-disk cache of compiled templates."""
+
+import pytest
+from bot import template_cache
+from bot.message_syntax_functions import (
+    PRECOMPILED,
+    TOKEN_TYPES,
+    compile_template,
+    template_digest,
+)
+from bot.template_cache import load_compiled_cache, save_compiled_cache
+
+TEMPLATES = [
+    "Members: {count_members Member and Lead not Alumni}",
+    "{role_counts Member, Lead by count} in {text_channel general}",
+]
+
+
+@pytest.fixture(name="path")
+def fixture_path(tmp_path):
+    """A cache file holding the test templates. The restored templates are
+    dropped after the test."""
+    path = str(tmp_path / "compiled.cache")
+    save_compiled_cache(path, TEMPLATES)
+    yield path
+    PRECOMPILED.clear()
+    compile_template.cache_clear()
+
+
+def test_restored_templates_compile_the_same(path):
+    """Templates restored from the cache equal freshly compiled ones."""
+    compiled = [compile_template(template) for template in TEMPLATES]
+    compile_template.cache_clear()
+
+    assert load_compiled_cache(path) == len(TEMPLATES)
+    assert set(PRECOMPILED) == {template_digest(template) for template in TEMPLATES}
+    assert [compile_template(template) for template in TEMPLATES] == compiled
+
+
+def test_cache_of_other_tokens_is_ignored(path, monkeypatch):
+    """A cache written before the registered tokens changed is not used."""
+    monkeypatch.setitem(TOKEN_TYPES, "extra", TOKEN_TYPES["member"])
+
+    assert load_compiled_cache(path) == 0
+    assert not PRECOMPILED
+
+
+def test_cache_of_another_version_is_ignored(path, monkeypatch):
+    """A cache written by another format version is not used."""
+    monkeypatch.setattr(
+        template_cache, "CACHE_VERSION", template_cache.CACHE_VERSION + 1
+    )
+
+    assert load_compiled_cache(path) == 0
+
+
+def test_changed_templates_miss_the_cache(path):
+    """A template edited since the cache was written is compiled again."""
+    load_compiled_cache(path)
+
+    assert template_digest(TEMPLATES[0] + "!") not in PRECOMPILED
+    assert compile_template(TEMPLATES[0] + "!")[-1] == "!"
+
+
+@pytest.mark.parametrize("size", [0, 10, 22, 30, -1])
+def test_corrupt_cache_is_ignored(path, size):
+    """A truncated cache file, e.g. after a crash while writing it, is ignored."""
+    with open(path, "rb") as cache_file:
+        data = cache_file.read()
+    with open(path, "wb") as cache_file:
+        cache_file.write(data[:size])
+
+    assert load_compiled_cache(path) == 0
+    assert not PRECOMPILED
+
+
+def test_missing_cache_is_ignored(tmp_path):
+    """Nothing is restored before the cache is first written."""
+    assert load_compiled_cache(str(tmp_path / "missing.cache")) == 0
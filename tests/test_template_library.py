@@ -0,0 +1,76 @@
+"""Tests the template libraries of the guilds."""
+
+import json
+import pytest
+from bot.template_library import MAX_TEMPLATES, TemplateLibrary
+
+
+def test_guilds_only_see_their_own_templates(tmp_path):
+    """Templates are stored per guild and read back from the file."""
+    path = str(tmp_path / "templates.json")
+    library = TemplateLibrary(path)
+    library.store(1, "members", "{count_members Member}")
+    library.store(2, "members", "{count_members Student}")
+    library.store(2, "leads", "{list_members Lead}")
+
+    reloaded = TemplateLibrary(path)
+
+    assert reloaded.names(1) == ["members"]
+    assert reloaded.names(2) == ["leads", "members"]
+    assert reloaded.get(2, "members") == "{count_members Student}"
+    assert reloaded.get(3, "members") is None
+    assert sorted(reloaded.all_templates()) == [
+        "{count_members Member}",
+        "{count_members Student}",
+        "{list_members Lead}",
+    ]
+
+
+def test_deleting_a_template_leaves_other_guilds(tmp_path):
+    """A guild cannot delete the template of another guild with the same name."""
+    library = TemplateLibrary(str(tmp_path / "templates.json"))
+    library.store(1, "members", "a")
+    library.store(2, "members", "b")
+
+    assert library.delete(1, "members")
+    assert not library.delete(1, "members")
+    assert library.get(2, "members") == "b"
+    assert "1" not in library.guilds
+
+
+def test_export_and_import_move_templates_between_guilds():
+    """An exported library is imported into another guild only."""
+    library = TemplateLibrary()
+    library.store(1, "members", "{count_members Member}")
+    library.store(2, "leads", "{list_members Lead}")
+
+    assert library.import_templates(3, library.export(1)) == 1
+    assert library.templates(3) == {"members": "{count_members Member}"}
+    assert json.loads(library.export(2)) == {"leads": "{list_members Lead}"}
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b"not json", b"[]", b'{"name": 1}', json.dumps({" ": "x"}).encode()],
+)
+def test_invalid_imports_change_nothing(data):
+    """Files that are not exported libraries are rejected as a whole."""
+    library = TemplateLibrary()
+    library.store(1, "members", "x")
+
+    with pytest.raises(ValueError):
+        library.import_templates(1, data)
+    assert library.templates(1) == {"members": "x"}
+
+
+def test_library_size_is_limited_per_guild():
+    """Every guild can hold `MAX_TEMPLATES` templates."""
+    library = TemplateLibrary()
+    for number in range(MAX_TEMPLATES):
+        library.store(1, str(number), "x")
+    library.store(2, "other", "x")
+
+    with pytest.raises(ValueError):
+        library.store(1, "one more", "x")
+    with pytest.raises(ValueError):
+        library.import_templates(1, json.dumps({"one more": "x"}).encode())